@@ -5,24 +5,28 @@ import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from app.services.tenancy import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 
 
-def create_app(config_name='development'):
-    """Application factory"""
+def create_app(config_name='development', overrides=None):
+    """Application factory (`overrides` are applied on top of the named config, e.g. by tests)"""
     app = Flask(__name__)
     
     # Load configuration
     from config import config
     app.config.from_object(config[config_name])
+    app.config.update(overrides or {})
     
     # Ensure upload directories exist
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     os.makedirs(app.config['FACE_ENCODINGS_FOLDER'], exist_ok=True)
     
-    # Initialize extensions
+    # Initialize extensions (one bind per tenant database)
+    from app.services import tenancy
+    tenancy.configure_binds(app.config)
     db.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
@@ -31,8 +35,18 @@ def create_app(config_name='development'):
     from app.models.user import User
     @login_manager.user_loader
     def load_user(user_id):
+        from flask import session
+        if not tenancy.session_matches(session.get('tenant'), tenancy.current_tenant()):
+            return None
         return User.query.get(int(user_id))
     
+    # Per-request tenant selection; must run before anything loads the user
+    tenancy.init_app(app)
+    
+    # gzip/brotli for large pages; registered first so it runs after every other after_request hook
+    from app.services import compression
+    compression.init_app(app)
+    
     # Register blueprints
     from app.routes.auth import auth_bp
     app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -56,9 +70,51 @@ def create_app(config_name='development'):
     app.register_blueprint(face_api_bp)
     from app.routes.api.vote_api import vote_api_bp
     app.register_blueprint(vote_api_bp)
+    from app.routes.api.admission_api import admission_api_bp
+    app.register_blueprint(admission_api_bp)
+    
+    # Admission control for the face endpoints (rate limits + waiting room)
+    from app.services import admission
+    admission.init_app(app)
+    
+    # Metrics: request hooks + /metrics endpoint
+    from app.services import metrics
+    metrics.init_app(app)
+    if app.config.get('METRICS_ENABLED', True):
+        from app.routes.metrics import metrics_bp
+        app.register_blueprint(metrics_bp)
+    
+    # Opt-in request profiler (no hooks installed unless PROFILER_ENABLED)
+    from app.services.profiler import profiler
+    profiler.init_app(app)
+    
+    # Turnout analytics rollups (buffered verification counters)
+    from app.services import rollups
+    rollups.init_app(app)
+    
+    # Audit trail of face/vote attempts (buffered, written in batches by a background thread)
+    from app.services import audit
+    audit.init_app(app)
+    
+    # Rendered dashboard fragments, keyed by election version counters
+    from app.services import fragments
+    fragments.init_app(app)
+    
+    # Election lifecycle scheduler (open/close transitions, cache warming)
+    from app.services import lifecycle
+    lifecycle.init_app(app)
     
-    # Create database tables
+    # Create database tables (in every tenant database)
     with app.app_context():
-        db.create_all()
+        from app.models.schema import upgrade_schema
+        for tenant in tenancy.tenant_names(app.config):
+            with tenancy.use_tenant(tenant):
+                engine = tenancy.engine()
+                db.metadata.create_all(engine)
+                upgrade_schema(db, engine)
+                rollups.ensure_backfilled()
+                # Bring statuses up to date before serving; close-time work is left to the scheduler
+                lifecycle.tick(grace_seconds=app.config.get('SCHEDULER_CLOSE_GRACE_SECONDS', 5), hooks=False)
+            db.session.remove()
     
     return app
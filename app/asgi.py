@@ -0,0 +1,558 @@
+"""
+ASGI entry point - asyncio variants of /api/face/* and /api/vote/*
+Run with: uvicorn app.asgi:application --host 0.0.0.0 --port 5000
+
+The face and vote endpoints are served natively on the event loop; every other
+path goes to the Flask app through asgiref's WsgiToAsgi. A request awaits its
+image decode + encode on a bounded executor (FACE_ASYNC_ENCODE_WORKERS threads,
+so CPU parallelism stays fixed) and its database steps on a separate thread
+pool inside an app context, so one worker can hold hundreds of in-flight
+verifications without a thread per request. Request parsing, validation and
+JSON responses go through app.services.face_pipeline, the same steps the Flask
+blueprints use, so both speak the same contract. Admission control
+(app.services.admission) gates these endpoints here as well, and every
+attempt is appended to the audit log (app.services.audit).
+
+/ws/face/verify streams webcam frames over a WebSocket and answers with a
+signed verification token as soon as one frame matches (see verify_stream).
+A session passes the waiting room once, at the handshake, but holds an
+admission slot only while one of its frames is encoding, so idle streams do
+not starve uploads.
+Browsers send the session cookie with cross-site WebSocket handshakes too, so
+the handshake is refused unless its Origin is this host or listed in
+FACE_STREAM_ALLOWED_ORIGINS.
+"""
+import asyncio
+import base64
+import binascii
+import contextvars
+import io
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlsplit
+
+from werkzeug.wrappers import Request
+
+from app import create_app, db, login_manager
+from app.models.user import User
+from app.services import admission, audit, face_pipeline, metrics, rollups, tenancy
+from app.services.face_pipeline import PipelineError
+from app.services.face_recognition_service import create_face_service
+
+
+stream_frames = metrics.registry.counter(
+    'face_stream_frames_total', 'Frames on the streaming verifier: received, dropped (stale) and encoded',
+    labels=('result',))
+
+
+class AsyncFaceVoteApp:
+    """ASGI app for the face/vote API, falling back to another ASGI app for everything else"""
+
+    def __init__(self, flask_app, fallback=None):
+        self.flask_app = flask_app
+        self.fallback = fallback
+        config = flask_app.config
+        self.routes = {
+            '/api/face/register': ('register_face', 'face_api.register_face', self.register_face),
+            '/api/face/verify': ('verify_face', 'face_api.verify_face', self.verify_face),
+            '/api/vote/cast': ('cast_vote', 'vote_api.cast_vote', self.cast_vote),
+        }
+        self.encode_workers = config.get('FACE_ASYNC_ENCODE_WORKERS') or os.cpu_count() or 1
+        self.max_pending = config.get('FACE_ASYNC_MAX_PENDING', 500)
+        self.max_body = config.get('MAX_CONTENT_LENGTH')
+        self.encode_pool = ThreadPoolExecutor(self.encode_workers, thread_name_prefix='face-encode')
+        self.db_pool = ThreadPoolExecutor(config.get('FACE_ASYNC_DB_WORKERS', 16), thread_name_prefix='face-db')
+        self._encode_slots = None  # asyncio.Semaphore, created on the running loop
+        self.pending = 0
+        self.allowed_origins = {o.rstrip('/').lower() for o in config.get('FACE_STREAM_ALLOWED_ORIGINS') or ()}
+        self._serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        self._session_max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+        with flask_app.test_request_context():
+            from flask import url_for
+            self._login_url = url_for(login_manager.login_view)
+        metrics.registry.gauge('face_async_pending', 'Async face/vote requests waiting for or running an encode',
+                               callback=lambda: self.pending)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] == 'websocket':
+            if scope['path'] == '/ws/face/verify':
+                await self.verify_stream(scope, receive, send)
+            else:
+                await receive()  # websocket.connect
+                await send({'type': 'websocket.close', 'code': 1008})
+            return
+        route = self.routes.get(scope.get('path')) if scope['type'] == 'http' else None
+        if scope['type'] == 'http' and scope['path'] == '/api/admission/status' and scope['method'] == 'GET':
+            await self._admission_status(scope, send)
+            return
+        if route is not None:
+            if scope['method'] != 'POST':
+                await self._send_json(send, 405, {'success': False, 'error': 'Method not allowed'},
+                                      [(b'allow', b'POST')])
+                return
+            await self._handle(route, scope, receive, send)
+            return
+        if self.fallback is None:
+            await self._send_json(send, 404, {'success': False, 'error': 'Not found (install asgiref to serve '
+                                              'the Flask pages from this entry point)'})
+            return
+        await self.fallback(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.encode_pool.shutdown(wait=False, cancel_futures=True)
+                self.db_pool.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # --- Plumbing ---
+
+    async def _handle(self, route, scope, receive, send):
+        operation, endpoint, handler = route
+        start = time.perf_counter()
+        body = await self._read_body(receive)
+        if body is None:
+            await self._send_json(send, 413, {'success': False, 'error': 'Request too large'})
+            return
+        request = Request(_environ(scope, body))
+        tenant, user_id = self._identity(request)
+        if user_id is None:
+            await self._send_login_redirect(scope, send)
+            return
+        with tenancy.use_tenant(tenant), metrics.request_scope(), audit.attempt() as notes:
+            status, payload = await self._run_admitted(operation, handler, user_id, request, scope, send)
+            if audit.audit_log.enabled and status != 202:  # waiting-room answers are not attempts
+                event = audit.make_event(operation, user_id, status, payload, time.perf_counter() - start,
+                                         request.form.get('election_id', type=int), notes)
+                audit.audit_log.record(event, block=False)  # never block the event loop
+        # What the Flask after_request hooks do for the WSGI endpoints
+        metrics.request_seconds.observe(time.perf_counter() - start, endpoint=endpoint,
+                                        method='POST', status=status)
+        metrics.registry.maybe_export()
+        if rollups.verifications.flush_due:
+            await self._db(rollups.verifications.flush)
+
+    async def _run_admitted(self, operation, handler, user_id, request, scope, send):
+        """Run the handler once admitted (or send the admission answer); returns (status, payload) sent"""
+        gate = admission.controller
+        if gate.enabled:
+            client = scope.get('client') or (None,)
+            decision = gate.enter(admission.user_key(user_id), client[0],
+                                  admission.request_ticket(request.form, request.headers))
+            if not decision.admitted:
+                await self._send_json(send, decision.status, decision.payload,
+                                      [(k.lower().encode(), v.encode()) for k, v in decision.headers.items()])
+                return decision.status, decision.payload
+        handler_start = time.perf_counter()
+        with metrics.operation(operation):
+            try:
+                status, payload = await handler(user_id, request)
+            except PipelineError as e:
+                status, payload = e.status, e.payload()
+            except Exception as e:
+                metrics.record_error()
+                traceback.print_exc()
+                status, payload = 500, {'success': False, 'error': str(e)}
+            finally:
+                if gate.enabled:
+                    gate.leave(time.perf_counter() - handler_start)
+        headers = []
+        stages = metrics.request_stages()
+        if self.flask_app.config.get('METRICS_SERVER_TIMING') and stages:
+            headers.append((b'server-timing', metrics.server_timing(stages).encode()))
+        await self._send_json(send, status, payload, headers)
+        return status, payload
+
+    async def _admission_status(self, scope, send):
+        request = Request(_environ(scope, b''))
+        tenant, user_id = self._identity(request)
+        if user_id is None:
+            await self._send_login_redirect(scope, send)
+            return
+        with tenancy.use_tenant(tenant):
+            payload, status = admission.controller.status(admission.user_key(user_id), request.args.get('ticket', ''))
+        await self._send_json(send, status, payload)
+
+    async def _send_login_redirect(self, scope, send):
+        # Same as flask_login's login_required for these endpoints
+        location = f'{self._login_url}?next={quote(scope["path"])}'
+        await send({'type': 'http.response.start', 'status': 302,
+                    'headers': [(b'location', location.encode('latin-1')), (b'content-length', b'0')]})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def _read_body(self, receive):
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return b''.join(chunks)
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if self.max_body and size > self.max_body:
+                return None
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    def _identity(self, request):
+        """(tenant, logged-in user id or None) from the host and the signed Flask session cookie"""
+        session = {}
+        cookie = request.cookies.get(self.flask_app.config['SESSION_COOKIE_NAME'])
+        if cookie and self._serializer is not None:
+            try:
+                session = self._serializer.loads(cookie, max_age=self._session_max_age)
+            except Exception:
+                session = {}
+        tenant = tenancy.resolve(self.flask_app.config, request.host, session.get('tenant'))
+        if not tenancy.session_matches(session.get('tenant'), tenant):
+            return tenant, None  # logged in to another tenant (same rules as the Flask user_loader)
+        user_id = session.get('_user_id')
+        return tenant, (int(user_id) if user_id and str(user_id).isdigit() else None)
+
+    def _origin_allowed(self, request):
+        """Handshake Origin is this host or in FACE_STREAM_ALLOWED_ORIGINS (a missing Origin is refused)"""
+        origin = (request.headers.get('Origin') or '').rstrip('/').lower()
+        if not origin or origin == 'null':
+            return False
+        if origin in self.allowed_origins:
+            return True
+        return urlsplit(origin).netloc == (request.host or '').lower()
+
+    async def _send_json(self, send, status, payload, headers=()):
+        body = json.dumps(payload).encode('utf-8')
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json'),
+                                (b'content-length', str(len(body)).encode())] + list(headers)})
+        await send({'type': 'http.response.body', 'body': body})
+
+    def _in_app(self, fn, *args):
+        with self.flask_app.app_context():
+            try:
+                return fn(*args)
+            finally:
+                db.session.remove()
+
+    async def _db(self, fn, *args):
+        """Run a database step on the DB thread pool inside an app context"""
+        ctx = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.db_pool, ctx.run, self._in_app, fn, *args)
+
+    async def _encode(self, fn, *args):
+        """Run a CPU-bound step on the encode pool; at most encode_workers run at once"""
+        if self.pending >= self.max_pending:
+            raise PipelineError('Server busy, please retry', 503)
+        if self._encode_slots is None:
+            self._encode_slots = asyncio.Semaphore(self.encode_workers)
+        self.pending += 1
+        try:
+            async with self._encode_slots:
+                ctx = contextvars.copy_context()
+                return await asyncio.get_running_loop().run_in_executor(self.encode_pool, ctx.run, fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def _encode_frame(self, kind, service, user_id, img_bytes):
+        """Encoding for an uploaded frame; exact resubmissions come from the frame cache without queueing"""
+        hit = face_pipeline.frame_cache_hit(kind, service, user_id, img_bytes)
+        if hit is not None:
+            return hit[0]
+        job = _registration_job if kind == 'register' else _probe_job
+        return await self._encode(job, service, user_id, img_bytes)
+
+    def _service(self):
+        return create_face_service(self.flask_app.config)
+
+    # --- Endpoints (same JSON as app/routes/api/face_api.py and vote_api.py) ---
+
+    async def register_face(self, user_id, request):
+        user = await self._db(_load_user, user_id)
+        face_pipeline.require_student(user)
+        img_bytes = face_pipeline.image_bytes(request.form, request.files)
+        service = self._service()
+        encoding = await self._encode_frame('register', service, user_id, img_bytes)
+        return 200, await self._db(_save_registration, service, user_id, encoding)
+
+    async def verify_face(self, user_id, request):
+        user = await self._db(_load_user, user_id)
+        face_pipeline.require_student(user)
+        face_pipeline.require_registered_face(user)
+        img_bytes = face_pipeline.image_bytes(request.form, request.files)
+        service = self._service()
+        encoding = await self._encode_frame('probe', service, user_id, img_bytes)
+        match, distance = await self._db(face_pipeline.match_face, service, user, encoding, 'verify_face',
+                                         request.form.get('election_id', type=int))
+        return 200, face_pipeline.verification_payload(match, distance)
+
+    async def cast_vote(self, user_id, request):
+        user = await self._db(_load_user, user_id)
+        ballot = await self._db(face_pipeline.prepare_ballot, user, request.form)
+        token = request.form.get('verification_token')
+        if token:
+            face_pipeline.check_verification_token(self.flask_app.config, token, user, ballot['election_id'])
+            return 200, await self._db(_save_vote, user_id, ballot)
+        img_bytes = face_pipeline.image_bytes(request.form, request.files)
+        service = self._service()
+        encoding = await self._encode_frame('probe', service, user_id, img_bytes)
+        match, _ = await self._db(face_pipeline.match_face, service, user, encoding, 'cast_vote',
+                                  ballot['election_id'])
+        if not match:
+            return 403, {'success': False, 'error': 'Face verification failed'}
+        return 200, await self._db(_save_vote, user_id, ballot)
+
+    # --- Streaming verification (WebSocket /ws/face/verify?election_id=N[&ticket=T]) ---
+
+    async def verify_stream(self, scope, receive, send):
+        """
+        The client streams downscaled frames (binary JPEG or data-URL text). Only the
+        newest frame is encoded; frames arriving meanwhile replace each other. The first
+        frame within FACE_ENCODING_TOLERANCE ends the session with a signed verification
+        token for /api/vote/cast. At most FACE_STREAM_MAX_ENCODES encodes per session.
+        """
+        if (await receive())['type'] != 'websocket.connect':
+            return
+        request = Request(_environ(scope, b''))
+        if not self._origin_allowed(request):
+            # Cross-site WebSocket hijacking: another site's page riding the student's cookie
+            await send({'type': 'websocket.close', 'code': 4403})
+            return
+        tenant, user_id = self._identity(request)
+        if user_id is None:
+            await send({'type': 'websocket.close', 'code': 4401})
+            return
+        await send({'type': 'websocket.accept'})
+        with tenancy.use_tenant(tenant):
+            await self._verify_session(scope, request, user_id, receive, send)
+
+    async def _verify_session(self, scope, request, user_id, receive, send):
+        """One accepted streaming session: admission, then frames until a verdict"""
+        gate = admission.controller
+        slot = _StreamSlot(None)
+        try:
+            if gate.enabled:
+                client = scope.get('client') or (None,)
+                decision = gate.enter(admission.user_key(user_id), client[0], request.args.get('ticket'))
+                if not decision.admitted:
+                    await self._ws_finish(send, dict(decision.payload, type='queued' if decision.status == 202
+                                                     else 'failed'), 1013)
+                    return
+                slot = _StreamSlot(gate, held=True)
+            user = await self._db(_load_user, user_id)
+            face_pipeline.require_student(user)
+            face_pipeline.require_registered_face(user)
+            election_id = request.args.get('election_id', type=int)
+            with metrics.request_scope(), metrics.operation('stream_verify'), audit.attempt() as notes:
+                start = time.perf_counter()
+                result = await self._stream_frames(user, election_id, receive, send, slot)
+                if result is not None and audit.audit_log.enabled:
+                    event = audit.make_event('stream_verify', user_id, None, result, time.perf_counter() - start,
+                                             election_id, notes)
+                    audit.audit_log.record(event, block=False)
+            if result is not None:
+                await self._ws_finish(send, result)
+        except PipelineError as e:
+            await self._ws_finish(send, {'type': 'failed', 'error': e.message})
+        except Exception as e:
+            metrics.record_error()
+            traceback.print_exc()
+            await self._ws_finish(send, {'type': 'failed', 'error': str(e)}, 1011)
+        finally:
+            slot.release()
+
+    async def _stream_frames(self, user, election_id, receive, send, slot):
+        """Encode the newest frame until one matches; None if the client went away"""
+        config = self.flask_app.config
+        max_encodes = config.get('FACE_STREAM_MAX_ENCODES', 10)
+        deadline = time.monotonic() + config.get('FACE_STREAM_TIMEOUT', 30.0)
+        state = {'frame': None, 'closed': False}
+        arrived = asyncio.Event()
+
+        async def reader():
+            while True:
+                message = await receive()
+                if message['type'] == 'websocket.disconnect':
+                    state['closed'] = True
+                    arrived.set()
+                    return
+                frame = message.get('bytes')
+                if frame is None and message.get('text'):
+                    frame = _data_url_bytes(message['text'])
+                if frame is None:
+                    continue
+                stream_frames.inc(result='received')
+                if state['frame'] is not None:
+                    stream_frames.inc(result='dropped')
+                state['frame'] = frame
+                arrived.set()
+
+        reader_task = asyncio.ensure_future(reader())
+        service = self._service()
+        encodes, faces, best = 0, 0, None
+        try:
+            while encodes < max_encodes:
+                slot.release()  # waiting for the client must not hold an encode slot
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(arrived.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                arrived.clear()
+                if state['closed']:
+                    return None
+                if state['frame'] is None:
+                    continue
+                if not await slot.acquire(deadline):
+                    break
+                if state['closed']:
+                    return None
+                frame, state['frame'] = state['frame'], None  # newest frame, even if more came while waiting
+                encodes += 1
+                stream_frames.inc(result='encoded')
+                try:
+                    encoding = await self._encode_frame('probe', service, user.id, frame)
+                except PipelineError as e:
+                    if e.status == 503:
+                        raise
+                    encoding = None  # undecodable frame
+                if encoding is None:
+                    await self._ws_send(send, {'type': 'progress', 'frames': encodes, 'face': False})
+                    continue
+                faces += 1
+                match, distance = await self._db(service.verify_face, encoding, user.face_encoding_path)
+                if distance is not None:
+                    best = distance if best is None else min(best, distance)
+                if match:
+                    rollups.verifications.record('stream_verify', 'verified', user.department, election_id)
+                    audit.note(outcome='verified', distance=distance)
+                    return {'type': 'verified', 'success': True, 'verified': True, 'distance': distance,
+                            'frames': encodes,
+                            'token': face_pipeline.issue_verification_token(config, user.id, election_id)}
+                await self._ws_send(send, {'type': 'progress', 'frames': encodes, 'face': True, 'distance': distance})
+        finally:
+            reader_task.cancel()
+        rollups.verifications.record('stream_verify', 'mismatch' if faces else 'no_face', user.department,
+                                     election_id)
+        audit.note(outcome='mismatch' if faces else 'no_face', distance=best)
+        return {'type': 'failed', 'success': False, 'verified': False, 'distance': best, 'frames': encodes,
+                'error': 'Face verification failed' if faces else 'Could not detect face'}
+
+    async def _ws_send(self, send, payload):
+        await send({'type': 'websocket.send', 'text': json.dumps(payload)})
+
+    async def _ws_finish(self, send, payload, code=1000):
+        try:
+            await self._ws_send(send, payload)
+            await send({'type': 'websocket.close', 'code': code})
+        except Exception:
+            pass  # client already gone
+
+
+class _StreamSlot:
+    """A streaming session's admission slot, held only while one of its frames is encoding"""
+
+    def __init__(self, gate, held=False):
+        self.gate = gate  # None when admission is off
+        self.held = held
+        self.since = time.perf_counter()
+
+    async def acquire(self, deadline):
+        """Wait for a free slot until deadline (time.monotonic()); False if none came"""
+        while self.gate is not None and not self.held:
+            if self.gate.try_acquire():
+                self.held, self.since = True, time.perf_counter()
+            elif time.monotonic() >= deadline:
+                return False
+            else:
+                await asyncio.sleep(0.05)
+        return True
+
+    def release(self):
+        if self.held:
+            self.held = False
+            self.gate.leave(time.perf_counter() - self.since)
+
+
+def _load_user(user_id):
+    """User for the session, detached with its columns loaded (like flask_login's user_loader)"""
+    user = db.session.get(User, user_id)
+    if user is None or not user.is_active:
+        raise PipelineError('Not logged in', 401)
+    db.session.expunge(user)
+    return user
+
+
+def _registration_job(service, user_id, img_bytes):
+    return face_pipeline.registration_encoding_for(service, user_id, img_bytes)
+
+
+def _probe_job(service, user_id, img_bytes):
+    return face_pipeline.probe_encoding_for(service, user_id, img_bytes)
+
+
+def _save_registration(service, user_id, encoding):
+    return face_pipeline.save_registration(service, db.session.get(User, user_id), encoding)
+
+
+def _save_vote(user_id, ballot):
+    return face_pipeline.save_vote(db.session.get(User, user_id), ballot)
+
+
+def _data_url_bytes(text):
+    try:
+        return base64.b64decode(text.split(',', 1)[-1])
+    except (ValueError, binascii.Error):
+        return None
+
+
+def _environ(scope, body):
+    """Minimal WSGI environ so werkzeug can parse the form/multipart body"""
+    headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+    environ = {
+        'REQUEST_METHOD': scope.get('method', 'GET'),
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': (scope.get('server') or ('localhost', 80))[0],
+        'SERVER_PORT': str((scope.get('server') or ('localhost', 80))[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'CONTENT_TYPE': headers.get('content-type', ''),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+    }
+    for name, value in headers.items():
+        if name not in ('content-type', 'content-length'):
+            environ['HTTP_' + name.upper().replace('-', '_')] = value
+    return environ
+
+
+def create_asgi_app(flask_app=None):
+    """Async face/vote API with the Flask app mounted for every other path"""
+    flask_app = flask_app or create_app(os.environ.get('FLASK_ENV', 'development'))
+    admission.require_single_process(flask_app.config)
+    try:
+        from asgiref.wsgi import WsgiToAsgi
+        fallback = WsgiToAsgi(flask_app)
+    except ImportError:
+        fallback = None
+    return AsyncFaceVoteApp(flask_app, fallback)
+
+
+def __getattr__(name):
+    # `application` is built on first access (uvicorn app.asgi:application), not when the module is imported
+    global application
+    if name == 'application':
+        application = create_asgi_app()
+        return application
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
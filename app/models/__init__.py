@@ -2,6 +2,10 @@
 Database models for College Voting System
 """
 from app.models.user import User
-from app.models.election import Election, Candidate, Vote
+from app.models.election import Election, Candidate, Vote, ElectionResultSnapshot
+from app.models.rollup import VoteRollup, VerificationRollup
+from app.models.face_encoding import FaceEncoding
+from app.models.audit import AuditEvent
 
-__all__ = ['User', 'Election', 'Candidate', 'Vote']
+__all__ = ['User', 'Election', 'Candidate', 'Vote', 'ElectionResultSnapshot', 'VoteRollup', 'VerificationRollup',
+           'FaceEncoding', 'AuditEvent']
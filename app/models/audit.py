@@ -0,0 +1,35 @@
+"""
+Audit model - append-only record of face registration, verification and voting attempts
+Rows are written in batches by app.services.audit and never updated.
+"""
+import json
+
+from app import db
+
+
+class AuditEvent(db.Model):
+    """One register_face / verify_face / cast_vote attempt"""
+    __tablename__ = 'audit_events'
+    __table_args__ = (
+        db.Index('ix_audit_events_created_id', 'created_at', 'id'),
+        db.Index('ix_audit_events_user_created', 'user_id', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False)  # when the attempt finished (UTC)
+    user_id = db.Column(db.Integer)  # no foreign key: the trail outlives deleted users
+    election_id = db.Column(db.Integer)
+    operation = db.Column(db.String(20), nullable=False)  # register_face, verify_face, cast_vote, stream_verify
+    outcome = db.Column(db.String(20), nullable=False)  # ok, verified, mismatch, no_face, rejected, rate_limited, error
+    status = db.Column(db.Integer)  # HTTP status returned
+    distance = db.Column(db.Float)  # face distance, when a comparison ran
+    duration_ms = db.Column(db.Float)
+    stages = db.Column(db.Text)  # JSON {stage: milliseconds}
+    error = db.Column(db.String(200))
+
+    @property
+    def stage_timings(self):
+        return json.loads(self.stages) if self.stages else {}
+
+    def __repr__(self):
+        return f'<AuditEvent {self.operation} user={self.user_id} {self.outcome}>'
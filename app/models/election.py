@@ -1,8 +1,32 @@
 """
-Election, Candidate, and Vote models
+Election, Candidate, Vote, and result snapshot models
 """
+import json
 from datetime import datetime
+import numpy as np
 from app import db
+from app.services.tenancy import current_tenant
+
+BALLOT_TYPES = {
+    'plurality': 'Plurality (one choice)',
+    'irv': 'Ranked choice - instant runoff (single seat)',
+    'stv': 'Ranked choice - single transferable vote (multi-seat)',
+}
+RANKING_DTYPE = np.dtype('<u4')  # Vote.rankings: little-endian uint32 candidate ids
+ELECTION_STATUSES = ('scheduled', 'open', 'closed')  # set by app/services/lifecycle.py
+
+
+def status_for_dates(start_date, end_date, now=None):
+    """Lifecycle status an election should have at `now`"""
+    now = now or datetime.utcnow()
+    if now < start_date:
+        return 'scheduled'
+    return 'open' if now <= end_date else 'closed'
+
+
+def _initial_status(context):
+    params = context.get_current_parameters()
+    return status_for_dates(params['start_date'], params['end_date'])
 
 
 class Election(db.Model):
@@ -17,6 +41,16 @@ class Election(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    ballot_type = db.Column(db.String(20), nullable=False, default='plurality', server_default='plurality')
+    seats = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Precomputed by the lifecycle scheduler; request paths read this instead of comparing dates
+    status = db.Column(db.String(20), nullable=False, default=_initial_status, server_default='scheduled', index=True)
+    status_changed_at = db.Column(db.DateTime, nullable=True)
+    # Bumped with every change to the election or its candidates; keys rendered
+    # dashboard blocks (services/fragments.py)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # College running the election; stored in that tenant's database (services/tenancy.py)
+    tenant = db.Column(db.String(50), nullable=False, default=current_tenant, server_default='default', index=True)
     
     # Relationships
     candidates = db.relationship('Candidate', backref='election', lazy='dynamic', cascade='all, delete-orphan')
@@ -25,18 +59,27 @@ class Election(db.Model):
     @property
     def is_ongoing(self):
         """Check if election is currently active"""
-        now = datetime.utcnow()
-        return self.start_date <= now <= self.end_date and self.is_active
+        return self.status == 'open' and self.is_active
     
     @property
     def is_upcoming(self):
         """Check if election hasn't started"""
-        return datetime.utcnow() < self.start_date
+        return self.status == 'scheduled'
     
     @property
     def is_completed(self):
         """Check if election has ended"""
-        return datetime.utcnow() > self.end_date
+        return self.status == 'closed'
+    
+    @property
+    def accepting_votes(self):
+        """Open, and within its dates even if the scheduler has not closed it yet"""
+        return self.is_ongoing and self.start_date <= datetime.utcnow() <= self.end_date
+    
+    @property
+    def is_ranked(self):
+        """Ballots carry an ordered list of preferences"""
+        return self.ballot_type in ('irv', 'stv')
     
     def get_results(self):
         """Get vote count per candidate"""
@@ -64,6 +107,11 @@ class Candidate(db.Model):
     nominated_at = db.Column(db.DateTime, default=datetime.utcnow)
     approved_at = db.Column(db.DateTime, nullable=True)
     
+    __table_args__ = (
+        db.Index('ix_candidates_election_user', 'election_id', 'user_id'),
+        db.Index('ix_candidates_nominated_id', 'nominated_at', 'id'),
+    )
+    
     # Relationships
     votes = db.relationship('Vote', backref='candidate', lazy='dynamic')
     
@@ -84,11 +132,57 @@ class Vote(db.Model):
     candidate_id = db.Column(db.Integer, db.ForeignKey('candidates.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     voted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Ranked ballots: preference order as packed uint32 candidate ids (candidate_id is the first preference)
+    rankings = db.Column(db.LargeBinary, nullable=True)
     
     # Unique constraint: one vote per user per election
     __table_args__ = (
         db.UniqueConstraint('election_id', 'user_id', name='unique_vote_per_election'),
+        db.Index('ix_votes_candidate', 'candidate_id'),
     )
     
+    @staticmethod
+    def pack_rankings(candidate_ids):
+        return np.asarray(candidate_ids, dtype=RANKING_DTYPE).tobytes()
+    
+    @property
+    def preferences(self):
+        """Candidate ids in preference order"""
+        if self.rankings is None:
+            return [self.candidate_id]
+        return np.frombuffer(self.rankings, dtype=RANKING_DTYPE).tolist()
+    
     def __repr__(self):
         return f'<Vote election={self.election_id} user={self.user_id}>'
+
+
+class ElectionResultSnapshot(db.Model):
+    """Materialized results of a completed election (written once, served thereafter)"""
+    __tablename__ = 'election_result_snapshots'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    election_id = db.Column(db.Integer, db.ForeignKey('elections.id'), nullable=False, unique=True)
+    total_votes = db.Column(db.Integer, nullable=False, default=0)
+    eligible_voters = db.Column(db.Integer, nullable=False, default=0)
+    results_json = db.Column(db.Text, nullable=False)  # [{candidate_user_id, name, votes, percentage}]
+    ballot_checksum = db.Column(db.String(64), nullable=False)  # sha256 over ballots in vote id order
+    rounds_json = db.Column(db.Text, nullable=True)  # ranked elections: tabulation rounds
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    election = db.relationship('Election', backref=db.backref('result_snapshot', uselist=False, cascade='all, delete-orphan'))
+    
+    @property
+    def results(self):
+        return json.loads(self.results_json)
+    
+    @property
+    def rounds(self):
+        return json.loads(self.rounds_json) if self.rounds_json else None
+    
+    @property
+    def turnout(self):
+        """Percentage of eligible voters who voted"""
+        return round(100.0 * self.total_votes / self.eligible_voters, 1) if self.eligible_voters else 0.0
+    
+    def __repr__(self):
+        return f'<ElectionResultSnapshot election={self.election_id} votes={self.total_votes}>'
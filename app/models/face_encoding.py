@@ -0,0 +1,18 @@
+"""
+Face encoding blobs - database storage backend for face encodings
+"""
+from datetime import datetime
+from app import db
+
+
+class FaceEncoding(db.Model):
+    """Raw float64 encoding bytes under a storage key (e.g. user_42)"""
+    __tablename__ = 'face_encodings'
+    
+    key = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.String(32), nullable=False)  # content hash, matches the ref suffix
+    data = db.Column(db.LargeBinary, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<FaceEncoding {self.key}@{self.version}>'
@@ -0,0 +1,34 @@
+"""
+Analytics rollup models - small pre-aggregated tables behind the turnout dashboards
+"""
+from app import db
+
+
+class VoteRollup(db.Model):
+    """Votes per election, time bucket and voter department"""
+    __tablename__ = 'vote_rollups'
+    
+    election_id = db.Column(db.Integer, db.ForeignKey('elections.id'), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    department = db.Column(db.String(100), primary_key=True, default='')  # '' = no department
+    votes = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<VoteRollup election={self.election_id} {self.bucket_start} {self.department!r}={self.votes}>'
+
+
+class VerificationRollup(db.Model):
+    """Face verification outcomes per election, time bucket, operation and department"""
+    __tablename__ = 'verification_rollups'
+    __table_args__ = {'info': {'rebuild_on_key_change': True}}  # derived counters, see models/schema.py
+    
+    election_id = db.Column(db.Integer, primary_key=True, default=0)  # 0 = not tied to an election
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    operation = db.Column(db.String(20), primary_key=True)  # verify_face, cast_vote
+    department = db.Column(db.String(100), primary_key=True, default='')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    failures = db.Column(db.Integer, nullable=False, default=0)  # face did not match
+    no_face = db.Column(db.Integer, nullable=False, default=0)  # no face detected in the frame
+    
+    def __repr__(self):
+        return f'<VerificationRollup election={self.election_id} {self.bucket_start} {self.operation} {self.department!r}>'
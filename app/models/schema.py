@@ -0,0 +1,52 @@
+"""
+Lightweight schema upgrades for existing databases
+db.create_all() only creates missing tables, so columns and indexes added to
+existing models are applied here (ALTER TABLE ADD COLUMN / CREATE INDEX).
+A primary key cannot be altered in place; tables of derived counters marked
+info={'rebuild_on_key_change': True} are dropped and recreated empty instead.
+"""
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateIndex
+
+
+def upgrade_schema(db, engine=None):
+    """Add missing columns and indexes for every table in db.metadata (on `engine`, default db.engine)"""
+    engine = engine or db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            if table.info.get('rebuild_on_key_change') and _key_changed(inspector, table):
+                table.drop(conn)
+                table.create(conn)
+                continue
+            present = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in present:
+                    conn.exec_driver_sql(_add_column_sql(engine, table, column))
+            # Reflection skips expression indexes, so rely on IF NOT EXISTS instead
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+        if engine.dialect.name == 'sqlite' and 'sqlite_stat1' not in existing_tables:
+            # Planner statistics; without them SQLite prefers sort-avoiding scans over search indexes
+            conn.exec_driver_sql('ANALYZE')
+
+
+def _key_changed(inspector, table):
+    stored = inspector.get_pk_constraint(table.name).get('constrained_columns') or []
+    return set(stored) != {c.name for c in table.primary_key}
+
+
+def _add_column_sql(engine, table, column):
+    preparer = engine.dialect.identifier_preparer
+    col_type = column.type.compile(dialect=engine.dialect)
+    sql = f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} {col_type}'
+    if column.server_default is not None:
+        default = column.server_default.arg
+        default = default.text if hasattr(default, 'text') else f"'{default}'"
+        sql += f' DEFAULT {default}'
+    if not column.nullable and column.server_default is not None:
+        sql += ' NOT NULL'
+    return sql
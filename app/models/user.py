@@ -4,9 +4,15 @@ User model - supports Admin, Student, College, Candidate roles
 from datetime import datetime
 from flask_login import UserMixin
 from app import db
+from app.services.tenancy import current_tenant
 import bcrypt
 
 
+def hash_password(password):
+    """bcrypt hash of a password (releases the GIL, so a thread pool hashes in parallel)"""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+
 class User(UserMixin, db.Model):
     """User model with role-based access"""
     __tablename__ = 'users'
@@ -19,8 +25,17 @@ class User(UserMixin, db.Model):
     student_id = db.Column(db.String(20), unique=True, nullable=True)  # For students
     department = db.Column(db.String(100), nullable=True)
     is_active = db.Column(db.Boolean, default=True)
-    face_encoding_path = db.Column(db.String(255), nullable=True)  # Path to stored face encoding
+    face_encoding_path = db.Column(db.String(255), nullable=True)  # Encoding reference (backend:key@version) or legacy .pkl path
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # College this user belongs to; each tenant's rows live in its own database (services/tenancy.py)
+    tenant = db.Column(db.String(50), nullable=False, default=current_tenant, server_default='default', index=True)
+    
+    # Listing/search indexes: keyset paging by (role, name, id), prefix search on lower(name/department)
+    __table_args__ = (
+        db.Index('ix_users_role_name_id', 'role', 'name', 'id'),
+        db.Index('ix_users_name_lower', db.func.lower(name)),
+        db.Index('ix_users_department_lower', db.func.lower(department)),
+    )
     
     # Relationships
     votes = db.relationship('Vote', backref='voter', lazy='dynamic')
@@ -28,10 +43,7 @@ class User(UserMixin, db.Model):
     
     def set_password(self, password):
         """Hash and set password"""
-        self.password_hash = bcrypt.hashpw(
-            password.encode('utf-8'),
-            bcrypt.gensalt()
-        ).decode('utf-8')
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         """Verify password"""
@@ -1,13 +1,18 @@
 """
 Admin module - Manages elections, candidates, student access, system monitoring
 """
-from datetime import datetime
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from datetime import datetime, timedelta
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, abort, jsonify
 from flask_login import login_required, current_user
 from functools import wraps
+from itertools import islice
+from sqlalchemy import func, select, union
+from sqlalchemy.orm import joinedload
 from app import db
 from app.models.user import User
-from app.models.election import Election, Candidate, Vote
+from app.models.election import Election, Candidate, Vote, BALLOT_TYPES
+from app.services.pagination import keyset_page, prefix_range
+from app.services import fragments, lifecycle, rollups, tenancy
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -21,23 +26,83 @@ def admin_required(f):
     return decorated
 
 
+def student_search_query(q):
+    """Students, optionally filtered by name / student ID / department prefix (all indexed)"""
+    query = User.query.filter(User.role == 'student')
+    if q:
+        # UNION of per-index range scans so each prefix index is used on its own
+        matches = union(
+            select(User.id).where(prefix_range(func.lower(User.name), q)),
+            select(User.id).where(prefix_range(User.student_id, q, lower=False)),
+            select(User.id).where(prefix_range(User.student_id, q.upper(), lower=False)),
+            select(User.id).where(prefix_range(func.lower(User.department), q)),
+        )
+        query = query.filter(User.id.in_(matches))
+    return query
+
+
+def candidate_vote_counts(candidate_ids):
+    """{candidate_id: votes} for one page of candidates in a single grouped query"""
+    if not candidate_ids:
+        return {}
+    rows = db.session.query(Vote.candidate_id, func.count(Vote.id)).filter(
+        Vote.candidate_id.in_(candidate_ids)
+    ).group_by(Vote.candidate_id).all()
+    return dict(rows)
+
+
 @admin_bp.route('/')
 @login_required
 @admin_required
 def index():
     """Admin dashboard"""
-    elections = Election.query.order_by(Election.created_at.desc()).all()
+    query = Election.query.order_by(Election.created_at.desc())
+    versions = fragments.versions(query)
+    elections_table = fragments.render('admin_elections', tuple(versions), 'admin/_election_table.html',
+                                       lambda: {'elections': query.all()})
     total_students = User.query.filter_by(role='student').count()
-    total_votes = Vote.query.count()
+    total_votes = sum(rollups.vote_totals().values())
     pending_candidates = Candidate.query.filter_by(status='pending').count()
     return render_template('admin/dashboard.html',
-        elections=elections,
+        election_count=len(versions),
+        elections_table=elections_table,
         total_students=total_students,
         total_votes=total_votes,
         pending_candidates=pending_candidates
     )
 
 
+def tenant_summary():
+    """Headline counts from the current tenant's database (one fan-out query)"""
+    return {
+        'students': User.query.filter_by(role='student').count(),
+        'registered': User.query.filter(User.role == 'student', User.face_encoding_path.isnot(None)).count(),
+        'elections': dict(db.session.query(Election.status, func.count(Election.id)).group_by(Election.status)),
+        'votes': sum(rollups.vote_totals().values()),
+        'pending_candidates': Candidate.query.filter_by(status='pending').count(),
+    }
+
+
+@admin_bp.route('/tenants')
+@login_required
+@admin_required
+def tenants_overview():
+    """Totals per college, queried from every tenant database in parallel (default-tenant admins only)"""
+    if tenancy.current_tenant() != tenancy.DEFAULT_TENANT:
+        abort(403)
+    summaries = tenancy.fan_out(current_app._get_current_object(), tenant_summary,
+                                workers=current_app.config.get('TENANT_FANOUT_WORKERS', 8))
+    totals = {'students': 0, 'registered': 0, 'votes': 0, 'pending_candidates': 0, 'elections': {}}
+    for summary in summaries.values():
+        if summary is None:
+            continue
+        for key in ('students', 'registered', 'votes', 'pending_candidates'):
+            totals[key] += summary[key]
+        for status, count in summary['elections'].items():
+            totals['elections'][status] = totals['elections'].get(status, 0) + count
+    return render_template('admin/tenants.html', summaries=summaries, totals=totals)
+
+
 @admin_bp.route('/elections')
 @login_required
 @admin_required
@@ -57,7 +122,7 @@ def create_election():
         end = request.form.get('end_date')
         if not title or not start or not end:
             flash('Title and dates are required.', 'error')
-            return render_template('admin/election_form.html')
+            return render_template('admin/election_form.html', ballot_types=BALLOT_TYPES)
         try:
             start_dt = datetime.fromisoformat(start.replace('Z', '+00:00'))
             end_dt = datetime.fromisoformat(end.replace('Z', '+00:00'))
@@ -66,19 +131,28 @@ def create_election():
             end_dt = datetime.strptime(end, '%Y-%m-%dT%H:%M')
         if start_dt >= end_dt:
             flash('End date must be after start date.', 'error')
-            return render_template('admin/election_form.html')
+            return render_template('admin/election_form.html', ballot_types=BALLOT_TYPES)
+        ballot_type = request.form.get('ballot_type', 'plurality')
+        seats = request.form.get('seats', 1, type=int) or 1
+        if ballot_type not in BALLOT_TYPES or seats < 1:
+            flash('Invalid ballot type or number of seats.', 'error')
+            return render_template('admin/election_form.html', ballot_types=BALLOT_TYPES)
+        if ballot_type == 'irv':
+            seats = 1
         election = Election(
             title=title,
             description=description or None,
             start_date=start_dt,
             end_date=end_dt,
+            ballot_type=ballot_type,
+            seats=seats,
             created_by=current_user.id
         )
         db.session.add(election)
         db.session.commit()
         flash('Election created successfully.', 'success')
         return redirect(url_for('admin.elections_list'))
-    return render_template('admin/election_form.html')
+    return render_template('admin/election_form.html', ballot_types=BALLOT_TYPES)
 
 
 @admin_bp.route('/elections/<int:eid>')
@@ -86,18 +160,36 @@ def create_election():
 @admin_required
 def election_detail(eid):
     election = Election.query.get_or_404(eid)
-    candidates = election.candidates.all()
-    candidate_user_ids = [c.user_id for c in candidates]
-    students_query = User.query.filter_by(role='student')
-    if candidate_user_ids:
-        students_query = students_query.filter(~User.id.in_(candidate_user_ids))
-    available_students = students_query.order_by(User.name).all()
-    return render_template(
-        'admin/election_detail.html',
-        election=election,
-        candidates=candidates,
-        available_students=available_students
-    )
+
+    def load():
+        candidates = election.candidates.options(joinedload(Candidate.user)).all()
+        return {'candidates': candidates, 'vote_counts': candidate_vote_counts([c.id for c in candidates])}
+
+    votes = rollups.vote_totals([eid]).get(eid, 0)
+    candidates_table = fragments.render('admin_candidates', (eid, election.version, votes),
+                                        'admin/_candidate_table.html', load)
+    # Students are picked through the candidate_options typeahead instead of a full <select>
+    return render_template('admin/election_detail.html', election=election, candidates_table=candidates_table)
+
+
+@admin_bp.route('/elections/<int:eid>/candidate-options')
+@login_required
+@admin_required
+def candidate_options(eid):
+    """Typeahead for the add-candidate picker: students not yet in this election"""
+    Election.query.get_or_404(eid)
+    q = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', 20, type=int), 50)
+    already = db.session.query(Candidate.id).filter(
+        Candidate.election_id == eid, Candidate.user_id == User.id
+    ).exists()
+    query = student_search_query(q).filter(~already)
+    students = query.order_by(User.name, User.id).limit(limit).all()
+    return jsonify([
+        {'id': u.id, 'name': u.name, 'email': u.email,
+         'student_id': u.student_id, 'department': u.department}
+        for u in students
+    ])
 
 
 @admin_bp.route('/elections/<int:eid>/candidates/add', methods=['POST'])
@@ -136,7 +228,9 @@ def add_candidate_to_election(eid):
         candidate.approved_at = datetime.utcnow()
 
     db.session.add(candidate)
+    fragments.bump(eid)
     db.session.commit()
+    lifecycle.candidate_lists.invalidate(eid)
     flash(f'{student.name} added as candidate.', 'success')
     return redirect(url_for('admin.election_detail', eid=eid))
 
@@ -147,6 +241,7 @@ def add_candidate_to_election(eid):
 def toggle_election(eid):
     election = Election.query.get_or_404(eid)
     election.is_active = not election.is_active
+    fragments.bump(eid)
     db.session.commit()
     flash(f'Election {"activated" if election.is_active else "deactivated"}.', 'success')
     return redirect(request.referrer or url_for('admin.elections_list'))
@@ -156,8 +251,27 @@ def toggle_election(eid):
 @login_required
 @admin_required
 def candidates_list():
-    candidates = Candidate.query.join(User).order_by(Candidate.nominated_at.desc()).all()
-    return render_template('admin/candidates.html', candidates=candidates)
+    query = Candidate.query.options(joinedload(Candidate.user), joinedload(Candidate.election))
+    status = request.args.get('status', '').strip()
+    if status:
+        query = query.filter(Candidate.status == status)
+    election_id = request.args.get('election_id', type=int)
+    if election_id:
+        query = query.filter(Candidate.election_id == election_id)
+    page = keyset_page(
+        query, [Candidate.nominated_at, Candidate.id],
+        cursor=request.args.get('after'),
+        per_page=current_app.config.get('ADMIN_PAGE_SIZE', 50),
+        descending=True,
+        key=lambda c: (c.nominated_at, c.id)
+    )
+    return render_template('admin/candidates.html',
+        candidates=page.items,
+        page=page,
+        vote_counts=candidate_vote_counts([c.id for c in page.items]),
+        status=status,
+        election_id=election_id
+    )
 
 
 @admin_bp.route('/candidates/<int:cid>/approve', methods=['POST'])
@@ -167,7 +281,9 @@ def approve_candidate(cid):
     c = Candidate.query.get_or_404(cid)
     c.status = 'approved'
     c.approved_at = datetime.utcnow()
+    fragments.bump(c.election_id)
     db.session.commit()
+    lifecycle.candidate_lists.invalidate(c.election_id)
     flash('Candidate approved.', 'success')
     return redirect(request.referrer or url_for('admin.candidates_list'))
 
@@ -178,7 +294,9 @@ def approve_candidate(cid):
 def reject_candidate(cid):
     c = Candidate.query.get_or_404(cid)
     c.status = 'rejected'
+    fragments.bump(c.election_id)
     db.session.commit()
+    lifecycle.candidate_lists.invalidate(c.election_id)
     flash('Candidate rejected.', 'info')
     return redirect(request.referrer or url_for('admin.candidates_list'))
 
@@ -187,8 +305,14 @@ def reject_candidate(cid):
 @login_required
 @admin_required
 def students_list():
-    students = User.query.filter_by(role='student').order_by(User.name).all()
-    return render_template('admin/students.html', students=students)
+    q = request.args.get('q', '').strip()
+    page = keyset_page(
+        student_search_query(q), [User.name, User.id],
+        cursor=request.args.get('after'),
+        per_page=current_app.config.get('ADMIN_PAGE_SIZE', 50),
+        key=lambda u: (u.name, u.id)
+    )
+    return render_template('admin/students.html', students=page.items, page=page, q=q)
 
 
 @admin_bp.route('/students/add', methods=['GET', 'POST'])
@@ -216,6 +340,39 @@ def add_student():
     return render_template('admin/user_form.html', role='student')
 
 
+@admin_bp.route('/students/import', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def import_students():
+    """Bulk import students from a CSV/XLSX file"""
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Choose a CSV or XLSX file to import.', 'error')
+            return render_template('admin/student_import.html',
+                                   limit=current_app.config.get('BULK_IMPORT_MAX_WEB_ROWS', 200))
+        from app.services.bulk_import import StudentImporter, read_rows
+        limit = current_app.config.get('BULK_IMPORT_MAX_WEB_ROWS', 200)
+        try:
+            # Read (and cap) the whole file before inserting anything, so an oversized file changes nothing
+            rows = list(islice(read_rows(upload.stream, upload.filename), limit + 1))
+        except (ValueError, UnicodeDecodeError) as e:
+            flash(f'Could not read file: {e}', 'error')
+            return render_template('admin/student_import.html', limit=limit)
+        if len(rows) > limit:
+            flash(f'File has more than {limit} rows. Import large intakes with '
+                  f'"python -m scripts.import_students FILE".', 'error')
+            return render_template('admin/student_import.html', limit=limit)
+        importer = StudentImporter(
+            batch_size=current_app.config.get('BULK_IMPORT_BATCH_SIZE', 500),
+            workers=current_app.config.get('BULK_IMPORT_WORKERS')
+        )
+        report = importer.run(rows)
+        flash(f'Imported {report.created} of {report.total} rows.', 'success' if report.created else 'info')
+        return render_template('admin/student_import.html', report=report, limit=limit)
+    return render_template('admin/student_import.html', limit=current_app.config.get('BULK_IMPORT_MAX_WEB_ROWS', 200))
+
+
 @admin_bp.route('/users/<int:uid>/toggle-active', methods=['POST'])
 @login_required
 @admin_required
@@ -228,3 +385,69 @@ def toggle_user_active(uid):
     db.session.commit()
     flash(f'User {"activated" if u.is_active else "deactivated"}.', 'success')
     return redirect(request.referrer or url_for('admin.students_list'))
+
+
+@admin_bp.route('/profiles')
+@login_required
+@admin_required
+def profiles_list():
+    """Slowest requests captured by the request profiler"""
+    from app.services.profiler import list_captures
+    enabled = current_app.config.get('PROFILER_ENABLED', False)
+    captures = list_captures(current_app.config['PROFILER_DIR']) if enabled else []
+    return render_template('admin/profiles.html', captures=captures, enabled=enabled)
+
+
+@admin_bp.route('/profiles/<name>')
+@login_required
+@admin_required
+def profile_detail(name):
+    from app.services.profiler import load_capture
+    capture = load_capture(current_app.config['PROFILER_DIR'], name)
+    if capture is None:
+        abort(404)
+    return render_template('admin/profile_detail.html', capture=capture, name=name)
+
+
+def _parse_datetime(value):
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+@admin_bp.route('/audit')
+@login_required
+@admin_required
+def audit_events():
+    """Recent face/vote attempts, newest first (range scan on created_at, id)"""
+    from app.models.audit import AuditEvent
+    from app.services.audit import audit_log
+    until = _parse_datetime(request.args.get('until'))
+    since = _parse_datetime(request.args.get('since')) or (until or datetime.utcnow()) - timedelta(hours=24)
+    query = AuditEvent.query.filter(AuditEvent.created_at >= since)
+    if until:
+        query = query.filter(AuditEvent.created_at < until)
+    user_id = request.args.get('user_id', type=int)
+    if user_id:
+        query = query.filter(AuditEvent.user_id == user_id)
+    operation = request.args.get('operation', '').strip()
+    if operation:
+        query = query.filter(AuditEvent.operation == operation)
+    outcome = request.args.get('outcome', '').strip()
+    if outcome:
+        query = query.filter(AuditEvent.outcome == outcome)
+    page = keyset_page(
+        query, [AuditEvent.created_at, AuditEvent.id],
+        cursor=request.args.get('after'),
+        per_page=current_app.config.get('ADMIN_PAGE_SIZE', 50),
+        descending=True,
+        key=lambda e: (e.created_at, e.id)
+    )
+    user_ids = {e.user_id for e in page.items if e.user_id}
+    names = dict(db.session.query(User.id, User.name).filter(User.id.in_(user_ids))) if user_ids else {}
+    filters = {'since': since.isoformat(timespec='minutes'),
+               'until': until.isoformat(timespec='minutes') if until else None,
+               'user_id': user_id, 'operation': operation or None, 'outcome': outcome or None}
+    return render_template('admin/audit.html', events=page.items, page=page, names=names,
+                           filters=filters, stats=audit_log.stats())
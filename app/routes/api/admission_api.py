@@ -0,0 +1,16 @@
+"""
+Admission API - waiting-room status for queued face/vote requests
+"""
+from flask import Blueprint, request, jsonify
+from flask_login import login_required, current_user
+from app.services.admission import controller, user_key
+
+admission_api_bp = Blueprint('admission_api', __name__, url_prefix='/api/admission')
+
+
+@admission_api_bp.route('/status')
+@login_required
+def status():
+    """Queue position for ?ticket=..., or admitted: true once a slot is reserved"""
+    payload, code = controller.status(user_key(current_user.id), request.args.get('ticket', ''))
+    return jsonify(payload), code
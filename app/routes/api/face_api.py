@@ -1,73 +1,45 @@
 """
 Face recognition API - used for registration and verification
 """
-import base64
-import io
-import numpy as np
-import cv2
 from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
+from app.services import audit, metrics, face_pipeline
+from app.services.admission import admission_required
+from app.services.face_pipeline import PipelineError
 
 face_api_bp = Blueprint('face_api', __name__, url_prefix='/api/face')
 
 
 def get_face_service():
     from flask import current_app
-    from app.services.face_recognition_service import FaceRecognitionService
-    return FaceRecognitionService(
-        current_app.config['FACE_ENCODINGS_FOLDER'],
-        tolerance=current_app.config.get('FACE_ENCODING_TOLERANCE', 0.5)
-    )
+    from app.services.face_recognition_service import create_face_service
+    return create_face_service(current_app.config)
 
 
-def decode_image_from_request():
-    """Decode image from base64 or file upload"""
-    if request.form.get('image'):
-        # Base64 data URL or raw base64
-        data = request.form['image']
-        if ',' in data:
-            data = data.split(',')[1]
-        img_bytes = base64.b64decode(data)
-    elif request.files.get('image'):
-        img_bytes = request.files['image'].read()
-    else:
-        return None
-    nparr = np.frombuffer(img_bytes, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    return img
+def image_bytes_from_request():
+    """Raw image bytes from base64 or file upload"""
+    return face_pipeline.image_bytes(request.form, request.files)
 
 
 @face_api_bp.route('/register', methods=['POST'])
 @login_required
+@audit.audited('register_face')
+@admission_required
+@metrics.operation('register_face')
 def register_face():
     """
     Register user's face. Expects multipart form with 'image' (file or base64).
     Students only.
     """
     try:
-        if not current_user.is_student():
-            return jsonify({'success': False, 'error': 'Students only'}), 403
-
-        img = decode_image_from_request()
-        if img is None:
-            return jsonify({'success': False, 'error': 'No image provided'}), 400
-
+        face_pipeline.require_student(current_user)
         service = get_face_service()
-        ok, msg = service.detect_face_in_image(img)
-        if not ok:
-            return jsonify({'success': False, 'error': msg}), 400
-
-        encoding = service.encode_face_from_image(img)
-        if encoding is None:
-            return jsonify({'success': False, 'error': 'Could not extract face encoding'}), 400
-
-        path = service.save_encoding(current_user.id, encoding)
-        current_user.face_encoding_path = path
-        from app import db
-        db.session.commit()
-
-        return jsonify({'success': True, 'message': 'Face registered successfully'})
+        encoding = face_pipeline.registration_encoding_for(service, current_user.id, image_bytes_from_request())
+        return jsonify(face_pipeline.save_registration(service, current_user, encoding))
+    except PipelineError as e:
+        return jsonify(e.payload()), e.status
     except Exception as e:
+        metrics.record_error()
         import traceback
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -75,34 +47,26 @@ def register_face():
 
 @face_api_bp.route('/verify', methods=['POST'])
 @login_required
+@audit.audited('verify_face')
+@admission_required
+@metrics.operation('verify_face')
 def verify_face():
     """
     Verify user's face against stored encoding.
     Returns success if face matches.
     """
     try:
-        if not current_user.is_student():
-            return jsonify({'success': False, 'error': 'Students only'}), 403
-
-        if not current_user.face_encoding_path:
-            return jsonify({'success': False, 'error': 'No face registered'}), 400
-
-        img = decode_image_from_request()
-        if img is None:
-            return jsonify({'success': False, 'error': 'No image provided'}), 400
-
+        face_pipeline.require_student(current_user)
+        face_pipeline.require_registered_face(current_user)
         service = get_face_service()
-        encoding = service.encode_face_from_image(img)
-        if encoding is None:
-            return jsonify({'success': False, 'error': 'Could not detect face'}), 400
-
-        match, distance = service.verify_face(encoding, current_user.face_encoding_path)
-        return jsonify({
-            'success': match,
-            'verified': match,
-            'distance': distance
-        })
+        encoding = face_pipeline.probe_encoding_for(service, current_user.id, image_bytes_from_request())
+        match, distance = face_pipeline.match_face(service, current_user, encoding, 'verify_face',
+                                                   request.form.get('election_id', type=int))
+        return jsonify(face_pipeline.verification_payload(match, distance))
+    except PipelineError as e:
+        return jsonify(e.payload()), e.status
     except Exception as e:
+        metrics.record_error()
         import traceback
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)}), 500
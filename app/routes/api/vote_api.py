@@ -1,89 +1,56 @@
 """
 Vote API - Cast vote with face verification
 """
-import base64
-import io
-import numpy as np
-import cv2
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
-from app import db
-from app.models.election import Election, Candidate, Vote
+from app.services import audit, metrics, face_pipeline
+from app.services.admission import admission_required
+from app.services.face_pipeline import PipelineError
 
 vote_api_bp = Blueprint('vote_api', __name__, url_prefix='/api/vote')
 
 
 def get_face_service():
     from flask import current_app
-    from app.services.face_recognition_service import FaceRecognitionService
-    return FaceRecognitionService(
-        current_app.config['FACE_ENCODINGS_FOLDER'],
-        tolerance=current_app.config.get('FACE_ENCODING_TOLERANCE', 0.5)
-    )
+    from app.services.face_recognition_service import create_face_service
+    return create_face_service(current_app.config)
 
 
-def decode_image_from_request():
-    if request.form.get('image'):
-        data = request.form['image']
-        if ',' in data:
-            data = data.split(',')[1]
-        img_bytes = base64.b64decode(data)
-    elif request.files.get('image'):
-        img_bytes = request.files['image'].read()
-    else:
-        return None
-    nparr = np.frombuffer(img_bytes, np.uint8)
-    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+def image_bytes_from_request():
+    """Raw image bytes from base64 or file upload"""
+    return face_pipeline.image_bytes(request.form, request.files)
 
 
 @vote_api_bp.route('/cast', methods=['POST'])
 @login_required
+@audit.audited('cast_vote')
+@admission_required
+@metrics.operation('cast_vote')
 def cast_vote():
     """
-    Cast vote: requires face image for verification, candidate_id, election_id.
+    Cast vote: requires face image (or a verification_token from the streaming
+    verifier), election_id, and candidate_id (or, for ranked elections,
+    rankings: candidate ids in order of preference).
     """
     try:
-        if not current_user.is_student():
-            return jsonify({'success': False, 'error': 'Students only'}), 403
-
-        if not current_user.has_face_registered():
-            return jsonify({'success': False, 'error': 'Register your face first'}), 400
-
-        election_id = request.form.get('election_id', type=int)
-        candidate_id = request.form.get('candidate_id', type=int)
-        if not election_id or not candidate_id:
-            return jsonify({'success': False, 'error': 'election_id and candidate_id required'}), 400
-
-        election = Election.query.get(election_id)
-        if not election or not election.is_ongoing:
-            return jsonify({'success': False, 'error': 'Election not active'}), 400
-
-        candidate = Candidate.query.filter_by(id=candidate_id, election_id=election_id, status='approved').first()
-        if not candidate:
-            return jsonify({'success': False, 'error': 'Invalid candidate'}), 400
-
-        if Vote.query.filter_by(election_id=election_id, user_id=current_user.id).first():
-            return jsonify({'success': False, 'error': 'You have already voted'}), 400
-
-        img = decode_image_from_request()
-        if img is None:
-            return jsonify({'success': False, 'error': 'No image provided'}), 400
-
-        service = get_face_service()
-        encoding = service.encode_face_from_image(img)
-        if encoding is None:
-            return jsonify({'success': False, 'error': 'Could not detect face'}), 400
-
-        match, _ = service.verify_face(encoding, current_user.face_encoding_path)
-        if not match:
-            return jsonify({'success': False, 'error': 'Face verification failed'}), 403
-
-        vote = Vote(election_id=election_id, candidate_id=candidate_id, user_id=current_user.id)
-        db.session.add(vote)
-        db.session.commit()
-
-        return jsonify({'success': True, 'message': 'Vote cast successfully'})
+        ballot = face_pipeline.prepare_ballot(current_user, request.form)
+
+        token = request.form.get('verification_token')
+        if token:
+            # Already verified over the streaming channel (app/asgi.py)
+            face_pipeline.check_verification_token(current_app.config, token, current_user, ballot['election_id'])
+        else:
+            service = get_face_service()
+            encoding = face_pipeline.probe_encoding_for(service, current_user.id, image_bytes_from_request())
+            match, _ = face_pipeline.match_face(service, current_user, encoding, 'cast_vote', ballot['election_id'])
+            if not match:
+                return jsonify({'success': False, 'error': 'Face verification failed'}), 403
+
+        return jsonify(face_pipeline.save_vote(current_user, ballot))
+    except PipelineError as e:
+        return jsonify(e.payload()), e.status
     except Exception as e:
+        metrics.record_error()
         import traceback
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)}), 500
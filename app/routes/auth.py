@@ -1,14 +1,22 @@
 """
 Authentication routes - Login, Logout, Registration
 """
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, session
 from flask_login import login_user, logout_user, login_required, current_user
 from app import db
 from app.models.user import User
+from app.services import tenancy
 
 auth_bp = Blueprint('auth', __name__)
 
 
+def render_login():
+    """Login page; asks for the college when several tenants share this host"""
+    config = current_app.config
+    choose_tenant = len(tenancy.tenant_names(config)) > 1 and tenancy.host_tenant(config, request.host) is None
+    return render_template('auth/login.html', choose_tenant=choose_tenant)
+
+
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
     """User login"""
@@ -21,21 +29,29 @@ def login():
         
         if not email or not password:
             flash('Please enter both email and password.', 'error')
-            return render_template('auth/login.html')
+            return render_login()
+        
+        config = current_app.config
+        tenant = tenancy.host_tenant(config, request.host) or request.form.get('tenant') or tenancy.DEFAULT_TENANT
+        if tenant not in tenancy.tenant_names(config):
+            flash('Unknown college.', 'error')
+            return render_login()
         
-        user = User.query.filter_by(email=email).first()
+        with tenancy.use_tenant(tenant):
+            user = User.query.filter_by(email=email).first()
         if user and user.check_password(password):
             if not user.is_active:
                 flash('Your account has been deactivated. Contact admin.', 'error')
-                return render_template('auth/login.html')
+                return render_login()
             login_user(user)
+            session['tenant'] = tenant
             flash(f'Welcome back, {user.name}!', 'success')
             next_page = request.args.get('next')
             return redirect(next_page or url_for('main.dashboard'))
         
         flash('Invalid email or password.', 'error')
     
-    return render_template('auth/login.html')
+    return render_login()
 
 
 @auth_bp.route('/logout')
@@ -43,5 +59,6 @@ def login():
 def logout():
     """User logout"""
     logout_user()
+    session.pop('tenant', None)
     flash('You have been logged out.', 'info')
     return redirect(url_for('auth.login'))
@@ -1,11 +1,13 @@
 """
 College module - Overview of elections and results
 """
-from flask import Blueprint, render_template
+from flask import Blueprint, render_template, request, abort, current_app, Response, stream_with_context, session, make_response, jsonify
 from flask_login import login_required, current_user
 from functools import wraps
 from app.models.election import Election, Candidate, Vote
 from app.models.user import User
+from app.services import export, fragments, rollups, results as results_service
+from app.services.tabulation import tabulate_election
 
 college_bp = Blueprint('college', __name__, url_prefix='/college')
 
@@ -20,21 +22,79 @@ def college_required(f):
     return decorated
 
 
+def results_access_required(f):
+    """College staff or admins (audit exports)"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not current_user.is_authenticated or not (current_user.is_college() or current_user.is_admin()):
+            from flask import redirect, url_for
+            return redirect(url_for('auth.login'))
+        return f(*args, **kwargs)
+    return decorated
+
+
 @college_bp.route('/dashboard')
 @login_required
 @college_required
 def dashboard():
     """College dashboard - all elections with status"""
-    elections = Election.query.order_by(Election.start_date.desc()).all()
-    return render_template('college/dashboard.html', elections=elections)
+    query = Election.query.order_by(Election.start_date.desc())
+    versions = fragments.versions(query, votes=True)
+    election_cards = fragments.render(
+        'college_elections', tuple(versions), 'college/_election_cards.html',
+        lambda: {'elections': query.all(), 'vote_totals': {eid: votes for eid, _, votes in versions}})
+    return render_template('college/dashboard.html', election_cards=election_cards)
+
+
+@college_bp.route('/election/<int:eid>/turnout')
+@login_required
+@results_access_required
+def election_turnout(eid):
+    """Live turnout charts (votes over time, turnout by department, verification failures)"""
+    election = Election.query.get_or_404(eid)
+    return render_template('college/turnout.html', election=election,
+                           bucket_minutes=current_app.config.get('ROLLUP_BUCKET_SECONDS', 300) // 60)
+
+
+@college_bp.route('/election/<int:eid>/turnout.json')
+@login_required
+@results_access_required
+def election_turnout_data(eid):
+    """Chart data, read from the rollup tables only"""
+    election = Election.query.get_or_404(eid)
+    series = rollups.votes_over_time(eid)
+    cumulative, running = [], 0
+    for _, votes in series:
+        running += votes
+        cumulative.append(running)
+    verification = rollups.verification_over_time(eid)
+    return jsonify({
+        'total_votes': running,
+        'votes_over_time': {
+            'buckets': [b.isoformat() for b, _ in series],
+            'votes': [v for _, v in series],
+            'cumulative': cumulative,
+        },
+        'departments': rollups.turnout_by_department(eid),
+        'verification': {
+            'buckets': [b.isoformat() for b, *_ in verification],
+            'attempts': [a for _, a, _, _ in verification],
+            'failures': [f for _, _, f, _ in verification],
+            'no_face': [n for _, _, _, n in verification],
+            'failure_rate': [round(100.0 * (f + n) / a, 1) if a else None for _, a, f, n in verification],
+        },
+    })
 
 
 @college_bp.route('/election/<int:eid>/results')
 @login_required
 @college_required
 def election_results(eid):
-    """View election results"""
+    """View election results (completed elections are served from their snapshot)"""
     election = Election.query.get_or_404(eid)
+    snapshot = results_service.get_snapshot(election)
+    if snapshot is not None:
+        return _snapshot_response(election, snapshot)
     results = election.get_results()
     # Get candidate details
     candidate_votes = []
@@ -44,4 +104,80 @@ def election_results(eid):
         if user:
             candidate_votes.append({'name': user.name, 'votes': vote_count})
     total = sum(r[1] for r in results)
-    return render_template('college/results.html', election=election, candidate_votes=candidate_votes, total_votes=total)
+    tabulation = tabulate_election(election) if results_service.needs_tabulation(election) else None
+    return render_template('college/results.html', election=election, candidate_votes=candidate_votes,
+                           total_votes=total, tabulation=tabulation)
+
+
+def _snapshot_response(election, snapshot):
+    """Immutable results page with a strong ETag; revalidations get 304 without rendering"""
+    # The page chrome shows the signed-in user, so the validator varies with them
+    etag = results_service.snapshot_etag(snapshot, current_user.id, current_user.name, current_user.role)
+    cacheable = not session.get('_flashes')  # pending flash messages make the page one-off
+    if cacheable and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        html = results_service.rendered_pages.get(etag) if cacheable else None
+        if html is None:
+            html = render_template('college/results.html', election=election, snapshot=snapshot,
+                                   candidate_votes=snapshot.results, total_votes=snapshot.total_votes,
+                                   tabulation=snapshot.rounds)
+            if cacheable:
+                results_service.rendered_pages.set(etag, html)
+        response = make_response(html)
+    response.set_etag(etag)
+    response.last_modified = snapshot.created_at
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+@college_bp.route('/election/<int:eid>/export/tally.<fmt>')
+@login_required
+@results_access_required
+def export_tally(eid, fmt):
+    """Per-candidate totals as CSV or NDJSON"""
+    if fmt not in export.FORMATS:
+        abort(404)
+    election = Election.query.get_or_404(eid)
+    chunks = [export.tally_rows(election)]
+    return _export_response(export.stream(fmt, export.TALLY_COLUMNS, chunks), fmt, f'election-{eid}-tally')
+
+
+@college_bp.route('/election/<int:eid>/export/votes.<fmt>')
+@login_required
+@results_access_required
+def export_votes(eid, fmt):
+    """Anonymous vote-level ballots, streamed from a server-side cursor"""
+    if fmt not in export.FORMATS:
+        abort(404)
+    election = Election.query.get_or_404(eid)
+    chunks = export.iter_vote_chunks(eid, ranked=election.is_ranked,
+                                     chunk_size=current_app.config.get('EXPORT_CHUNK_SIZE', 1000))
+    body = export.stream(fmt, export.vote_columns(election.is_ranked), chunks)
+    return _export_response(body, fmt, f'election-{eid}-votes')
+
+
+@college_bp.route('/election/<int:eid>/export/roll.<fmt>')
+@login_required
+@results_access_required
+def export_roll(eid, fmt):
+    """Who voted (no ballots), for turnout audits"""
+    if fmt not in export.FORMATS:
+        abort(404)
+    Election.query.get_or_404(eid)
+    chunks = export.iter_roll_chunks(eid, chunk_size=current_app.config.get('EXPORT_CHUNK_SIZE', 1000))
+    return _export_response(export.stream(fmt, export.ROLL_COLUMNS, chunks), fmt, f'election-{eid}-roll')
+
+
+def _export_response(body, fmt, basename):
+    # No Content-Length: the WSGI server sends the generator with chunked transfer encoding
+    return Response(
+        stream_with_context(body),
+        mimetype=export.FORMATS[fmt],
+        headers={
+            'Content-Disposition': f'attachment; filename="{basename}.{fmt}"',
+            'X-Accel-Buffering': 'no',
+            'Cache-Control': 'no-store',
+        },
+    )
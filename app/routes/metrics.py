@@ -0,0 +1,23 @@
+"""
+Metrics endpoint - Prometheus text exposition of in-process metrics
+Route names, queue depths and pool sizes describe the deployment, so the
+endpoint is never public: scrapers send the METRICS_TOKEN bearer token, and
+without a token configured only a signed-in admin can read it.
+"""
+import hmac
+from flask import Blueprint, Response, abort, current_app, request
+from flask_login import current_user
+from app.services import metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics')
+def export():
+    """Prometheus scrape target, for the METRICS_TOKEN bearer or an admin session"""
+    token = current_app.config.get('METRICS_TOKEN')
+    supplied = request.headers.get('Authorization', '')
+    scraper = bool(token) and hmac.compare_digest(supplied, f'Bearer {token}')
+    if not scraper and not (current_user.is_authenticated and current_user.is_admin()):
+        abort(401)
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
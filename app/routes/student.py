@@ -6,6 +6,7 @@ from flask_login import login_required, current_user
 from functools import wraps
 from app import db
 from app.models.election import Election, Candidate, Vote
+from app.services import fragments, lifecycle
 
 student_bp = Blueprint('student', __name__, url_prefix='/student')
 
@@ -26,10 +27,19 @@ def student_required(f):
 @student_required
 def dashboard():
     """Student dashboard - show ongoing and upcoming elections"""
-    all_active = Election.query.filter(Election.is_active == True).order_by(Election.start_date.desc()).all()
-    ongoing = [e for e in all_active if e.is_ongoing]
-    upcoming = [e for e in all_active if e.is_upcoming]
-    return render_template('student/dashboard.html', elections=ongoing, upcoming=upcoming)
+    query = Election.query.filter(
+        Election.is_active == True, Election.status.in_(('open', 'scheduled'))
+    ).order_by(Election.start_date.desc())
+
+    def load():
+        elections = query.all()
+        return {'elections': [e for e in elections if e.status == 'open'],
+                'upcoming': [e for e in elections if e.status == 'scheduled']}
+
+    # The election lists are the same for every student; only the welcome card is per user
+    election_lists = fragments.render('student_elections', tuple(fragments.versions(query)),
+                                      'student/_election_lists.html', load)
+    return render_template('student/dashboard.html', election_lists=election_lists)
 
 
 @student_bp.route('/register-face')
@@ -46,7 +56,7 @@ def register_face_page():
 def election_view(eid):
     """View election and candidates - option to vote or nominate"""
     election = Election.query.get_or_404(eid)
-    candidates = election.candidates.filter_by(status='approved').all()
+    candidates = lifecycle.candidate_lists.get(eid)
     already_voted = Vote.query.filter_by(election_id=eid, user_id=current_user.id).first() is not None
     my_nomination = Candidate.query.filter_by(election_id=eid, user_id=current_user.id).first()
     return render_template('student/election_vote.html',
@@ -73,6 +83,7 @@ def nominate(eid):
     manifesto = request.form.get('manifesto', '').strip() if request.form else ''
     c = Candidate(election_id=eid, user_id=current_user.id, manifesto=manifesto or None, status='pending')
     db.session.add(c)
+    fragments.bump(eid)
     db.session.commit()
     flash('Nomination submitted. Awaiting admin approval.', 'success')
     return redirect(url_for('student.election_view', eid=eid))
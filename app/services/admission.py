@@ -0,0 +1,315 @@
+"""
+Admission Control - rate limits and a FIFO waiting room for the face endpoints
+Face registration, verification and vote casting each run a CPU-heavy encode.
+When an election opens the whole student body arrives at once. Letting every
+request start encoding makes them all slow, so at most ADMISSION_MAX_CONCURRENT
+run at a time (the encoding capacity of this process).
+
+Requests beyond that get a ticket and a queue position (HTTP 202). The client
+polls /api/admission/status with the ticket. Once the ticket reaches the head
+of the queue and a slot frees up, a slot is reserved for it for
+ADMISSION_RESERVATION_SECONDS, and the client resubmits with the ticket.
+Per-user and per-IP token buckets stop one client from flooding the room.
+
+State (slots, waiting room, tickets, token buckets) lives in this process's
+memory, like the encode capacity it protects, so admission is off unless
+ADMISSION_ENABLED is set. An app that enables it must be served by a single
+worker process, using threads or the ASGI event loop for concurrency: with
+several workers each would admit its own quota, a ticket polled on the wrong
+worker would be unknown, and rate limits would multiply. The serving entry
+points call require_single_process(), which refuses to start when admission
+is enabled and WEB_CONCURRENCY or a --workers/-w option asks for more than
+one process.
+"""
+import math
+import os
+import secrets
+import shlex
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from app.services import metrics, tenancy
+
+decisions = metrics.registry.counter(
+    'admission_decisions_total', 'Admission decisions for face endpoints', labels=('result',))
+wait_seconds = metrics.registry.histogram(
+    'admission_wait_seconds', 'Time from ticket issue to admission',
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300, 600))
+
+
+class TokenBucket:
+    """Token buckets per key: `rate` tokens/second up to `burst`"""
+
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = {}  # key -> [tokens, last refill]
+
+    def take(self, key, now=None):
+        """(allowed, seconds until a token is available)"""
+        if not self.rate or key is None:
+            return True, 0.0
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._prune(now)
+                bucket = self._buckets[key] = [float(self.burst), now]
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return True, 0.0
+            bucket[0] = tokens
+            return False, (1 - tokens) / self.rate
+
+    def _prune(self, now):
+        # Buckets that have refilled completely carry no state
+        full = [k for k, (tokens, last) in self._buckets.items()
+                if tokens + (now - last) * self.rate >= self.burst]
+        for k in full:
+            del self._buckets[k]
+
+
+class Ticket:
+    __slots__ = ('id', 'user_id', 'seq', 'issued', 'last_seen', 'ready_until')
+
+    def __init__(self, user_id, seq, now):
+        self.id = secrets.token_urlsafe(12)
+        self.user_id = user_id
+        self.seq = seq
+        self.issued = now
+        self.last_seen = now
+        self.ready_until = None
+
+
+class Decision:
+    """Outcome of AdmissionController.enter; `status`/`payload` are the response when not admitted"""
+
+    def __init__(self, admitted, status=200, payload=None, retry_after=0):
+        self.admitted = admitted
+        self.status = status
+        self.payload = payload
+        self.retry_after = retry_after
+
+    @property
+    def headers(self):
+        return {'Retry-After': str(self.retry_after)} if self.retry_after else {}
+
+
+class AdmissionController:
+    """Concurrency limit with a fair FIFO waiting room and per-user/IP rate limits"""
+
+    def __init__(self, capacity=None, reservation_seconds=15.0, ticket_ttl=30.0,
+                 user_rate=0.5, user_burst=5, ip_rate=20.0, ip_burst=100):
+        self.enabled = True
+        self.capacity = capacity or os.cpu_count() or 1
+        self.reservation_seconds = reservation_seconds
+        self.ticket_ttl = ticket_ttl
+        self.user_buckets = TokenBucket(user_rate, user_burst)
+        self.ip_buckets = TokenBucket(ip_rate, ip_burst)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queue = OrderedDict()  # ticket id -> Ticket, in arrival order
+        self._reserved = {}  # ticket id -> Ticket holding a slot until ready_until
+        self._by_user = {}  # user id -> ticket id (one place in line per user)
+        self._seq = 0
+        self._next_sweep = 0.0
+        self._service_seconds = 1.0  # moving average, for poll hints
+
+    def configure(self, config):
+        self.enabled = config.get('ADMISSION_ENABLED', False)
+        self.capacity = config.get('ADMISSION_MAX_CONCURRENT') or os.cpu_count() or 1
+        self.reservation_seconds = config.get('ADMISSION_RESERVATION_SECONDS', 15.0)
+        self.ticket_ttl = config.get('ADMISSION_TICKET_TTL', 30.0)
+        self.user_buckets = TokenBucket(config.get('ADMISSION_USER_RATE', 0.5), config.get('ADMISSION_USER_BURST', 5))
+        self.ip_buckets = TokenBucket(config.get('ADMISSION_IP_RATE', 20.0), config.get('ADMISSION_IP_BURST', 100))
+
+    @property
+    def active(self):
+        return self._active
+
+    @property
+    def waiting(self):
+        return len(self._queue) + len(self._reserved)
+
+    def enter(self, user_id, ip=None, ticket_id=None):
+        """Admit (caller must call leave() when done), queue, or rate-limit a request"""
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            ticket = self._find(user_id, ticket_id)
+            if ticket is None:
+                for buckets, key in ((self.user_buckets, user_id), (self.ip_buckets, ip)):
+                    allowed, wait = buckets.take(key, now)
+                    if not allowed:
+                        decisions.inc(result='rate_limited')
+                        retry = max(1, math.ceil(wait))
+                        return Decision(False, 429, {'success': False, 'error': 'Too many attempts, please wait',
+                                                     'retry_after': retry}, retry)
+                if not self._queue and not self._reserved and self._active < self.capacity:
+                    self._active += 1
+                    decisions.inc(result='admitted')
+                    return Decision(True)
+                ticket = self._issue(user_id, now)
+            ticket.last_seen = now
+            self._promote(now)
+            if ticket.id in self._reserved:
+                self._admit(ticket, now)
+                decisions.inc(result='admitted')
+                return Decision(True)
+            decisions.inc(result='queued')
+            payload = self._queued_payload(ticket)
+            return Decision(False, 202, payload, payload['retry_after'])
+
+    def try_acquire(self):
+        """Take a free slot without queueing (work already admitted once, such as a stream's next frame)"""
+        with self._lock:
+            self._promote(time.monotonic())
+            # Free slots go to reserved tickets first, so this never overtakes the waiting room
+            if self._active + len(self._reserved) >= self.capacity:
+                return False
+            self._active += 1
+            return True
+
+    def leave(self, elapsed=None):
+        """Release a slot taken by an admitted request"""
+        with self._lock:
+            self._active = max(0, self._active - 1)
+            if elapsed is not None:
+                self._service_seconds = 0.9 * self._service_seconds + 0.1 * elapsed
+            self._promote(time.monotonic())
+
+    def status(self, user_id, ticket_id):
+        """(payload, http status) for a waiting client polling its ticket"""
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            ticket = self._find(user_id, ticket_id)
+            if ticket is None or ticket.id != ticket_id:
+                return {'success': False, 'error': 'Ticket expired, please try again'}, 404
+            ticket.last_seen = now
+            self._promote(now)
+            if ticket.id in self._reserved:
+                return {'success': True, 'ticket': ticket.id, 'admitted': True, 'position': 0,
+                        'expires_in': round(ticket.ready_until - now, 1)}, 200
+            return self._queued_payload(ticket), 200
+
+    # --- Internals (lock held) ---
+
+    def _find(self, user_id, ticket_id):
+        ticket_id = ticket_id or self._by_user.get(user_id)
+        ticket = self._reserved.get(ticket_id) or self._queue.get(ticket_id)
+        return ticket if ticket is not None and ticket.user_id == user_id else None
+
+    def _issue(self, user_id, now):
+        self._seq += 1
+        ticket = Ticket(user_id, self._seq, now)
+        self._queue[ticket.id] = ticket
+        self._by_user[user_id] = ticket.id
+        return ticket
+
+    def _admit(self, ticket, now):
+        del self._reserved[ticket.id]
+        self._by_user.pop(ticket.user_id, None)
+        self._active += 1
+        wait_seconds.observe(now - ticket.issued)
+
+    def _promote(self, now):
+        while self._queue and self._active + len(self._reserved) < self.capacity:
+            _, ticket = self._queue.popitem(last=False)
+            ticket.ready_until = now + self.reservation_seconds
+            self._reserved[ticket.id] = ticket
+
+    def _sweep(self, now):
+        """Drop reservations nobody claimed and tickets nobody is polling (at most once a second)"""
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + 1.0
+        for ticket in [t for t in self._reserved.values() if t.ready_until < now]:
+            del self._reserved[ticket.id]
+            self._by_user.pop(ticket.user_id, None)
+        for ticket in [t for t in self._queue.values() if t.last_seen + self.ticket_ttl < now]:
+            del self._queue[ticket.id]
+            self._by_user.pop(ticket.user_id, None)
+        self._promote(now)
+
+    def _queued_payload(self, ticket):
+        head = next(iter(self._queue.values()))
+        # Sequence distance to the head; overestimates slightly after abandoned tickets drop out
+        position = min(ticket.seq - head.seq + 1, len(self._queue))
+        retry = max(1, min(10, math.ceil(position * self._service_seconds / self.capacity)))
+        return {'success': False, 'queued': True, 'ticket': ticket.id, 'position': position,
+                'retry_after': retry, 'error': f'Waiting room: you are number {position} in line'}
+
+
+controller = AdmissionController()
+
+
+def init_app(app):
+    controller.configure(app.config)
+    metrics.registry.gauge('admission_active', 'Face requests currently admitted', callback=lambda: controller.active)
+    metrics.registry.gauge('admission_waiting', 'Tickets in the waiting room', callback=lambda: controller.waiting)
+
+
+def worker_processes(argv=None, environ=None):
+    """Worker processes the server was started with: the largest of WEB_CONCURRENCY and --workers/-w N"""
+    argv = sys.argv if argv is None else argv
+    environ = os.environ if environ is None else environ
+    args = list(argv) + shlex.split(environ.get('GUNICORN_CMD_ARGS', ''))
+    counts = [environ.get('WEB_CONCURRENCY', '')]
+    for i, arg in enumerate(args):
+        if arg in ('-w', '--workers') and i + 1 < len(args):
+            counts.append(args[i + 1])
+        elif arg.startswith('--workers='):
+            counts.append(arg.split('=', 1)[1])
+        elif arg.startswith('-w') and arg[2:].isdigit():
+            counts.append(arg[2:])
+    return max([int(c) for c in counts if c.isdigit()] or [1])
+
+
+def require_single_process(config, argv=None, environ=None):
+    """Refuse to serve with several worker processes while admission control keeps its state in memory"""
+    if not config.get('ADMISSION_ENABLED', False):
+        return
+    workers = worker_processes(argv, environ)
+    if workers > 1:
+        raise RuntimeError(
+            f'Admission control keeps its waiting room in process memory, but {workers} worker processes '
+            'were requested. Serve with one worker (threads or the ASGI app for concurrency) '
+            'or set ADMISSION_ENABLED=0.')
+
+
+def user_key(user_id):
+    """Admission key of a user: ids are only unique within a tenant"""
+    return (tenancy.current_tenant(), user_id)
+
+
+def request_ticket(form, headers):
+    return form.get('ticket') or headers.get('X-Admission-Ticket')
+
+
+def admission_required(view):
+    """Run the view only once admitted; otherwise answer 202 (queued) or 429 (rate limited)"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        from flask import jsonify, request
+        from flask_login import current_user
+        if not controller.enabled:
+            return view(*args, **kwargs)
+        decision = controller.enter(user_key(current_user.id), request.remote_addr,
+                                    request_ticket(request.form, request.headers))
+        if not decision.admitted:
+            return jsonify(decision.payload), decision.status, decision.headers
+        start = time.perf_counter()
+        try:
+            return view(*args, **kwargs)
+        finally:
+            controller.leave(time.perf_counter() - start)
+    return wrapper
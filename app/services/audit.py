@@ -0,0 +1,256 @@
+"""
+Audit Log - buffered, append-only trail of face registration, verification and voting attempts
+Every attempt (user, election, outcome, face distance, per-stage timings) is
+appended to an in-memory buffer on the request path; a background thread
+drains it into the audit_events table in batched INSERTs on its own
+connection, so requests never wait for an audit write. Each row is written
+to the database of the tenant it was recorded in.
+
+The buffer holds at most AUDIT_BUFFER_SIZE rows. The flusher wakes early
+once AUDIT_BATCH_SIZE rows are waiting and keeps draining while it is behind.
+If the buffer is still full, a request waits up to AUDIT_BLOCK_SECONDS for
+room (0 = never) and then the oldest row is dropped. Drops and failed writes
+are counted (audit_events_total{result="dropped_*"}) and shown on
+/admin/audit, so a gap in the trail is always visible.
+
+The table is append-only: nothing here updates or deletes rows.
+"""
+import atexit
+import contextvars
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+from sqlalchemy import insert
+
+from app.models.audit import AuditEvent
+from app.services import metrics, tenancy
+
+events = metrics.registry.counter(
+    'audit_events_total', 'Audit events buffered, written and dropped (overflow, write_failed)',
+    labels=('result',))
+flush_seconds = metrics.registry.histogram('audit_flush_seconds', 'Time to write one batch of audit events')
+
+# Fields noted for the attempt in progress (face distance, outcome)
+_attempt = contextvars.ContextVar('audit_attempt', default=None)
+
+
+class AuditLog:
+    """Bounded in-memory buffer of audit rows, drained by a background flusher thread"""
+
+    def __init__(self, capacity=10000, batch_size=500, flush_interval=2.0, block_seconds=0.0):
+        self.enabled = True
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_seconds = block_seconds
+        self.app = None
+        self.written = 0
+        self.dropped = 0
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def configure(self, config):
+        self.enabled = config.get('AUDIT_ENABLED', True)
+        self.capacity = config.get('AUDIT_BUFFER_SIZE', self.capacity)
+        self.batch_size = config.get('AUDIT_BATCH_SIZE', self.batch_size)
+        self.flush_interval = config.get('AUDIT_FLUSH_INTERVAL', self.flush_interval)
+        self.block_seconds = config.get('AUDIT_BLOCK_SECONDS', self.block_seconds)
+        return self
+
+    @property
+    def buffered(self):
+        return len(self._buffer)
+
+    def record(self, row, block=True):
+        """Buffer one row. Returns False if the buffer was full and the oldest row was dropped."""
+        with self._not_full:
+            if len(self._buffer) >= self.capacity and block and self.block_seconds:
+                self._wake.set()
+                self._not_full.wait_for(lambda: len(self._buffer) < self.capacity, self.block_seconds)
+            overflow = len(self._buffer) >= self.capacity
+            if overflow:
+                self._buffer.popleft()
+                self.dropped += 1
+            self._buffer.append((tenancy.current_tenant(), row))
+            size = len(self._buffer)
+        events.inc(result='buffered')
+        if overflow:
+            events.inc(result='dropped_overflow')
+        if size >= self.batch_size:
+            self._wake.set()
+        self._ensure_started()
+        return not overflow
+
+    def flush(self):
+        """Write everything buffered in batches of batch_size. Returns rows written."""
+        written = 0
+        while True:
+            with self._not_full:
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                self._not_full.notify_all()
+            if not batch:
+                return written
+            by_tenant = {}
+            for tenant, row in batch:
+                by_tenant.setdefault(tenant, []).append(row)
+            start = time.perf_counter()
+            failed = []
+            for tenant, rows in by_tenant.items():
+                try:
+                    with tenancy.engine(tenant).begin() as conn:
+                        conn.execute(insert(AuditEvent), rows)
+                except Exception:
+                    failed.extend((tenant, row) for row in rows)
+                    metrics.record_error()
+            done = len(batch) - len(failed)
+            flush_seconds.observe(time.perf_counter() - start)
+            events.inc(done, result='written')
+            with self._lock:
+                self.written += done
+            written += done
+            if failed:
+                self._requeue(failed)
+                return written
+
+    def _requeue(self, batch):
+        """Put a failed batch back in front for the next flush, as far as there is room"""
+        with self._lock:
+            room = max(0, self.capacity - len(self._buffer))
+            keep = batch[len(batch) - room:] if room < len(batch) else batch
+            self._buffer.extendleft(reversed(keep))
+            lost = len(batch) - len(keep)
+            self.dropped += lost
+        if lost:
+            events.inc(lost, result='dropped_write_failed')
+
+    def run(self, app):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            with app.app_context():
+                try:
+                    self.flush()
+                except Exception:
+                    app.logger.exception('Audit flush failed')
+
+    def _ensure_started(self):
+        if self._thread is not None or self.app is None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, args=(self.app,), name='audit-flusher', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self):
+        return {'buffered': self.buffered, 'capacity': self.capacity, 'written': self.written,
+                'dropped': self.dropped}
+
+
+audit_log = AuditLog()
+
+
+def init_app(app):
+    """Configure the buffer; the flusher thread starts with the first recorded event"""
+    audit_log.configure(app.config)
+    audit_log.app = app
+    metrics.registry.gauge('audit_buffer_events', 'Audit events waiting to be written',
+                           callback=lambda: audit_log.buffered)
+
+    def _flush_at_exit():
+        audit_log.stop()
+        with app.app_context():
+            audit_log.flush()
+
+    atexit.register(_flush_at_exit)
+
+
+# --- Building events ---
+
+@contextmanager
+def attempt():
+    """Collect note()s made while handling one attempt; yields the dict they land in"""
+    notes = {}
+    token = _attempt.set(notes)
+    try:
+        yield notes
+    finally:
+        _attempt.reset(token)
+
+
+def note(**fields):
+    """Attach fields (distance, outcome) to the attempt being audited, if any"""
+    notes = _attempt.get()
+    if notes is not None:
+        notes.update(fields)
+
+
+def outcome_for(status, noted=None):
+    if status is not None and status >= 500:
+        return 'error'
+    if status == 429:
+        return 'rate_limited'
+    if noted and not (noted == 'verified' and status is not None and status >= 400):
+        return noted
+    return 'ok' if status is None or status < 400 else 'rejected'
+
+
+def make_event(operation, user_id, status, payload, seconds, election_id=None, notes=None):
+    """Audit row for a finished attempt; stage timings come from the current request's metrics"""
+    notes = notes or {}
+    stages = {}
+    for op, name, elapsed in metrics.request_stages():
+        if op == operation:
+            stages[name] = stages.get(name, 0.0) + elapsed
+    error = payload.get('error') if isinstance(payload, dict) and status is not None and status >= 400 else None
+    return {
+        'created_at': datetime.utcnow(),
+        'user_id': user_id,
+        'election_id': election_id,
+        'operation': operation,
+        'outcome': outcome_for(status, notes.get('outcome')),
+        'status': status,
+        'distance': notes.get('distance'),
+        'duration_ms': round(seconds * 1000, 2),
+        'stages': json.dumps({k: round(v * 1000, 2) for k, v in stages.items()}) if stages else None,
+        'error': str(error)[:200] if error else None,
+    }
+
+
+def audited(operation):
+    """Audit every call of a JSON face/vote view (queued waiting-room answers are not attempts)"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import make_response, request
+            from flask_login import current_user
+            if not audit_log.enabled:
+                return view(*args, **kwargs)
+            start = time.perf_counter()
+            with attempt() as notes:
+                try:
+                    response = make_response(view(*args, **kwargs))
+                except Exception:
+                    audit_log.record(make_event(operation, current_user.id, 500, None, time.perf_counter() - start,
+                                                request.form.get('election_id', type=int), notes))
+                    raise
+            if response.status_code != 202:
+                audit_log.record(make_event(operation, current_user.id, response.status_code,
+                                            response.get_json(silent=True), time.perf_counter() - start,
+                                            request.form.get('election_id', type=int), notes))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,119 @@
+"""
+Response Compression - gzip/brotli for large HTML and JSON, long-lived static caching
+Dashboards and JSON chart data compress several-fold, which matters for
+students on campus Wi-Fi during an election rush. Responses of a
+COMPRESS_MIMETYPES type and at least COMPRESS_MIN_SIZE bytes are compressed
+on the fly with the best encoding the client accepts: brotli when the
+optional brotli package is installed, else gzip. Streamed responses (CSV/NDJSON exports) and files are
+sent as they are.
+
+A compressed body is a different representation, so strong ETags are
+weakened (W/"...") as the HTTP spec requires; If-None-Match still matches
+them with weak comparison.
+
+Static files get a STATIC_MAX_AGE Cache-Control and url_for('static') adds
+?v=<mtime>, so a changed file gets a new URL instead of waiting out the cache.
+"""
+import gzip
+import os
+import time
+
+from app.services import metrics
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+responses_total = metrics.registry.counter(
+    'http_compressed_responses_total', 'Responses compressed on the fly', labels=('encoding',))
+saved_bytes = metrics.registry.counter('http_compression_saved_bytes_total', 'Bytes saved by compression')
+compress_seconds = metrics.registry.histogram('http_compression_seconds', 'Time spent compressing a response')
+
+
+def encodings(config):
+    """Encodings this process can produce, preferred first"""
+    available = ['br', 'gzip'] if BROTLI_AVAILABLE else ['gzip']
+    return [e for e in available if e in config.get('COMPRESS_ENCODINGS', ('br', 'gzip'))]
+
+
+def compress(data, encoding, config):
+    if encoding == 'br':
+        return brotli.compress(data, quality=config.get('COMPRESS_BROTLI_QUALITY', 4))
+    return gzip.compress(data, compresslevel=config.get('COMPRESS_LEVEL', 6), mtime=0)
+
+
+def compressible(response, config):
+    """True if `response` is a complete, uncompressed body of a listed type worth compressing"""
+    if response.direct_passthrough or response.is_streamed:
+        return False
+    if not 200 <= response.status_code < 300 or response.status_code in (204, 206):
+        return False
+    if 'Content-Encoding' in response.headers or response.mimetype not in config.get('COMPRESS_MIMETYPES', ()):
+        return False
+    length = response.content_length
+    return length is not None and length >= config.get('COMPRESS_MIN_SIZE', 1024)
+
+
+def compress_response(response, request, config):
+    """Compress `response` in place for `request` if it qualifies; returns it"""
+    if response.mimetype in config.get('COMPRESS_MIMETYPES', ()):
+        # Caches must keep one copy per encoding, whether or not this one was compressed
+        response.vary.add('Accept-Encoding')
+    if not compressible(response, config):
+        return response
+    encoding = request.accept_encodings.best_match(encodings(config))
+    if encoding is None:
+        return response
+    start = time.perf_counter()
+    data = response.get_data()
+    body = compress(data, encoding, config)
+    compress_seconds.observe(time.perf_counter() - start)
+    if len(body) >= len(data):
+        return response
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    responses_total.inc(encoding=encoding)
+    saved_bytes.inc(len(data) - len(body))
+    return response
+
+
+def static_version(app, filename):
+    """Modification time of a static file, as a cache-busting query value"""
+    try:
+        return str(int(os.path.getmtime(os.path.join(app.static_folder, filename))))
+    except (OSError, TypeError):
+        return None
+
+
+def init_app(app):
+    """Compress responses after every other hook has run; version static URLs"""
+    from flask import request
+
+    if app.config.get('STATIC_MAX_AGE'):
+        app.config['SEND_FILE_MAX_AGE_DEFAULT'] = app.config['STATIC_MAX_AGE']
+
+        @app.url_defaults
+        def _version_static(endpoint, values):
+            if endpoint == 'static' and 'filename' in values and 'v' not in values:
+                version = static_version(app, values['filename'])
+                if version:
+                    values['v'] = version
+
+        @app.after_request
+        def _immutable_static(response):
+            if request.endpoint == 'static' and request.args.get('v'):
+                response.cache_control.public = True
+                response.cache_control.immutable = True
+            return response
+
+    if not app.config.get('COMPRESS_ENABLED', True):
+        return
+
+    @app.after_request
+    def _compress(response):
+        return compress_response(response, request, app.config)
@@ -0,0 +1,408 @@
+"""
+Face Encoding Storage - pluggable backends shared by every app node
+Encodings are stored as raw float64 bytes under a per-user key and referenced
+from User.face_encoding_path as "<backend>:<key>@<version>", where version is
+a content hash. Each process keeps a read-through LRU keyed by (backend, key);
+an entry is only served when its version matches the reference, so a
+re-registration on one node invalidates stale copies on all the others.
+
+Backends:
+    local   files in FACE_ENCODINGS_FOLDER (single node or shared volume)
+    db      rows in the face_encodings table (committed with the caller's session)
+    object  S3-compatible object store via boto3, or a local stand-in directory
+
+Every tenant other than the default has its own namespace: local files under
+FACE_ENCODINGS_FOLDER/tenants/<tenant>, objects under <prefix>/tenants/<tenant>,
+db rows in the tenant's own database. References do not name the tenant; they
+resolve within the tenant of the request.
+"""
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+
+import numpy as np
+
+from app.services import metrics
+from app.services.lru import LRUCache
+from app.services.tenancy import DEFAULT_TENANT, current_tenant
+
+ENCODING_DTYPE = np.dtype('<f8')
+
+cache_lookups = metrics.registry.counter(
+    'face_encoding_cache_lookups_total', 'Encoding cache lookups by result', labels=('result',))
+
+
+def pack_encoding(encoding):
+    return np.asarray(encoding, dtype=ENCODING_DTYPE).tobytes()
+
+
+def unpack_encoding(data):
+    return np.frombuffer(data, dtype=ENCODING_DTYPE).copy()
+
+
+def content_version(data):
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def user_key(user_id):
+    return f'user_{user_id}'
+
+
+def make_ref(backend, key, version):
+    return f'{backend}:{key}@{version}'
+
+
+def parse_ref(ref):
+    """(backend, key, version) from a reference, or None for legacy file paths"""
+    if not ref or ':' not in ref or ref.endswith('.pkl') or os.path.isabs(ref):
+        return None
+    backend, rest = ref.split(':', 1)
+    key, _, version = rest.partition('@')
+    return backend, key, version or None
+
+
+class EncodingStore:
+    """Backend interface: raw bytes under a key"""
+
+    name = None
+    namespace = ''  # tenant, for every tenant but the default
+
+    @property
+    def cache_name(self):
+        """Backend name as cached: keys only collide within one namespace"""
+        return f'{self.name}/{self.namespace}' if self.namespace else self.name
+
+    def put(self, key, data):
+        raise NotImplementedError
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def keys(self):
+        raise NotImplementedError
+
+
+class LocalStore(EncodingStore):
+    """One file per key, written atomically"""
+
+    name = 'local'
+
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.folder, f'{key}.bin')
+
+    def put(self, key, data):
+        fd, tmp = tempfile.mkstemp(dir=self.folder, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, self._path(key))
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def keys(self):
+        return sorted(n[:-4] for n in os.listdir(self.folder) if n.endswith('.bin'))
+
+
+class DatabaseStore(EncodingStore):
+    """Rows in face_encodings; writes join the caller's transaction"""
+
+    name = 'db'
+
+    def put(self, key, data):
+        from app import db
+        from app.models.face_encoding import FaceEncoding
+        db.session.merge(FaceEncoding(key=key, version=content_version(data), data=data))
+        db.session.flush()
+
+    def get(self, key):
+        from app import db
+        from app.models.face_encoding import FaceEncoding
+        row = db.session.get(FaceEncoding, key)
+        return row.data if row is not None else None
+
+    def delete(self, key):
+        from app import db
+        from app.models.face_encoding import FaceEncoding
+        return db.session.query(FaceEncoding).filter_by(key=key).delete() > 0
+
+    def keys(self):
+        from app import db
+        from app.models.face_encoding import FaceEncoding
+        return [k for (k,) in db.session.query(FaceEncoding.key).order_by(FaceEncoding.key)]
+
+
+class LocalObjectClient:
+    """Stand-in for an S3 client (the put/get/delete/list subset we use), backed by a directory"""
+
+    class NoSuchKey(Exception):
+        pass
+
+    def __init__(self, root):
+        self.root = root
+        self.exceptions = self
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, *key.split('/'))
+
+    def put_object(self, Bucket, Key, Body, Metadata=None):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(Body)
+        os.replace(tmp, path)
+        with open(path + '.meta', 'w') as f:
+            json.dump(Metadata or {}, f)
+        return {}
+
+    def get_object(self, Bucket, Key):
+        path = self._path(Bucket, Key)
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            raise self.NoSuchKey(Key)
+        return {'Body': _Body(body)}
+
+    def delete_object(self, Bucket, Key):
+        path = self._path(Bucket, Key)
+        for p in (path, path + '.meta'):
+            if os.path.exists(p):
+                os.remove(p)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix='', **kwargs):
+        # Directory-style prefixes only ("face-encodings/"), returned as a single page
+        base = self._path(Bucket, Prefix.rstrip('/')) if Prefix else os.path.join(self.root, Bucket)
+        if not os.path.isdir(base):
+            return {'Contents': [], 'IsTruncated': False}
+        names = sorted(n for n in os.listdir(base) if not n.endswith('.meta') and not n.startswith('.tmp-'))
+        return {'Contents': [{'Key': Prefix + n} for n in names], 'IsTruncated': False}
+
+
+class _Body:
+    def __init__(self, data):
+        self._data = data
+
+    def read(self):
+        return self._data
+
+
+class ObjectStore(EncodingStore):
+    """Objects under <prefix>/<key> in a bucket"""
+
+    name = 'object'
+
+    def __init__(self, client, bucket, prefix='face-encodings'):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+
+    def _object_key(self, key):
+        return f'{self.prefix}/{key}' if self.prefix else key
+
+    def put(self, key, data):
+        self.client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=data,
+                               Metadata={'version': content_version(data)})
+
+    def get(self, key):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))['Body'].read()
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        return True
+
+    def keys(self):
+        prefix = f'{self.prefix}/' if self.prefix else ''
+        keys, kwargs = [], {'Bucket': self.bucket, 'Prefix': prefix}
+        while True:
+            listing = self.client.list_objects_v2(**kwargs)
+            keys.extend(obj['Key'][len(prefix):] for obj in listing.get('Contents', []))
+            if not listing.get('IsTruncated'):
+                return keys
+            kwargs['ContinuationToken'] = listing['NextContinuationToken']
+
+
+def object_client(config):
+    """boto3 S3 client when an endpoint/bucket is configured and boto3 is installed, else the local stand-in"""
+    root = config.get('FACE_STORAGE_OBJECT_ROOT')
+    if root:
+        return LocalObjectClient(root)
+    try:
+        import boto3
+    except ImportError:
+        raise RuntimeError('FACE_STORAGE_BACKEND=object needs boto3 (pip install boto3) '
+                           'or FACE_STORAGE_OBJECT_ROOT for the local stand-in')
+    return boto3.client('s3', endpoint_url=config.get('FACE_STORAGE_ENDPOINT'))
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(config, name=None, tenant=None):
+    """Backend instance for `name` (FACE_STORAGE_BACKEND by default) in a tenant's namespace, reused per process"""
+    name = name or config.get('FACE_STORAGE_BACKEND', 'local')
+    tenant = tenant or current_tenant()
+    namespace = '' if tenant == DEFAULT_TENANT else tenant
+    if name == 'local':
+        cache_key = (name, config['FACE_ENCODINGS_FOLDER'])
+    elif name == 'object':
+        cache_key = (name, config.get('FACE_STORAGE_BUCKET'), config.get('FACE_STORAGE_PREFIX'),
+                     config.get('FACE_STORAGE_OBJECT_ROOT'), config.get('FACE_STORAGE_ENDPOINT'))
+    elif name == 'db':
+        cache_key = (name,)
+    else:
+        raise ValueError(f'Unknown face storage backend: {name}')
+    cache_key += (namespace,)
+    with _stores_lock:
+        store = _stores.get(cache_key)
+        if store is None:
+            if name == 'local':
+                folder = config['FACE_ENCODINGS_FOLDER']
+                store = LocalStore(os.path.join(folder, 'tenants', namespace) if namespace else folder)
+            elif name == 'object':
+                prefix = config.get('FACE_STORAGE_PREFIX', 'face-encodings').strip('/')
+                store = ObjectStore(object_client(config), config.get('FACE_STORAGE_BUCKET') or 'voting',
+                                    f'{prefix}/tenants/{namespace}' if namespace else prefix)
+            else:
+                store = DatabaseStore()
+            store.namespace = namespace
+            _stores[cache_key] = store
+        return store
+
+
+class EncodingCache:
+    """Thread-safe LRU of decoded encodings keyed by (backend, key), validated by version"""
+
+    def __init__(self, max_entries=10000):
+        self._entries = LRUCache(max_entries)  # (backend, key) -> (version, encoding)
+
+    @property
+    def max_entries(self):
+        return self._entries.max_entries
+
+    @max_entries.setter
+    def max_entries(self, value):
+        self._entries.max_entries = value
+
+    def get(self, backend, key, version):
+        entry = self._entries.get((backend, key))
+        if entry is None or entry[0] != version:
+            return None
+        return entry[1]
+
+    def set(self, backend, key, version, encoding):
+        self._entries.set((backend, key), (version, encoding))
+
+    def invalidate(self, backend, key):
+        self._entries.pop((backend, key))
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+cache = EncodingCache()
+
+
+class EncodingRepository:
+    """save/load/delete on top of a backend, with the version-checked cache"""
+
+    def __init__(self, store, resolve=None):
+        self.store = store
+        self._resolve = resolve or (lambda name: store if name == store.name else None)
+
+    def save(self, user_id, encoding):
+        """Store an encoding and return its reference"""
+        data = pack_encoding(encoding)
+        key, version = user_key(user_id), content_version(data)
+        self.store.put(key, data)
+        cache.set(self.store.cache_name, key, version, unpack_encoding(data))
+        return make_ref(self.store.name, key, version)
+
+    def load(self, ref):
+        """Encoding (numpy array) for a reference, user id or legacy pickle path; None if missing"""
+        if isinstance(ref, int):
+            return self._fetch(self.store, user_key(ref), None)
+        parsed = parse_ref(ref)
+        if parsed is None:
+            return load_legacy_pickle(ref)
+        backend, key, version = parsed
+        store = self._resolve(backend)
+        if store is None:
+            return None
+        return self._fetch(store, key, version)
+
+    def _fetch(self, store, key, version):
+        if version is not None:
+            hit = cache.get(store.cache_name, key, version)
+            if hit is not None:
+                cache_lookups.inc(result='hit')
+                return hit
+        cache_lookups.inc(result='miss')
+        data = store.get(key)
+        if data is None:
+            return None
+        current = content_version(data)
+        encoding = unpack_encoding(data)
+        cache.set(store.cache_name, key, current, encoding)
+        return encoding
+
+    def delete(self, user_id):
+        key = user_key(user_id)
+        cache.invalidate(self.store.cache_name, key)
+        return self.store.delete(key)
+
+
+def load_legacy_pickle(path):
+    """Encodings saved before storage backends: a pickled list at an absolute .pkl path"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return np.asarray(pickle.load(f), dtype=ENCODING_DTYPE)
+    except Exception:
+        return None
+
+
+def repository_from_config(config, tenant=None):
+    """
+    Repository writing to FACE_STORAGE_BACKEND and able to read refs from any
+    configured backend, in a tenant's namespace (the current tenant by default)
+    """
+    tenant = tenant or current_tenant()
+
+    def resolve(name):
+        try:
+            return get_store(config, name, tenant)
+        except (ValueError, RuntimeError):
+            return None
+    cache.max_entries = config.get('FACE_ENCODING_CACHE_SIZE', cache.max_entries)
+    return EncodingRepository(get_store(config, tenant=tenant), resolve)
@@ -0,0 +1,128 @@
+"""
+Results Export - streaming CSV/NDJSON exports of tallies and vote-level ballots
+Votes are read with a server-side cursor in yield_per chunks and serialised
+chunk by chunk, so memory stays flat regardless of election size.
+
+Ballots are secret: the vote export carries only what was chosen - no vote
+id, no time and no insertion order (rows are sorted by choice), since the
+audit log records who attempted a vote and when. Who voted is a separate
+roll (student id, name, department) in name order, so the two files cannot
+be joined.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+import numpy as np
+
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from app import db
+from app.models.election import Candidate, Vote, RANKING_DTYPE
+from app.models.user import User
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+VOTE_COLUMNS = ['election_id', 'candidate_id', 'candidate_name']
+RANKED_COLUMNS = ['preferences']  # space-separated candidate ids, first preference first
+ROLL_COLUMNS = ['student_id', 'name', 'department']
+TALLY_COLUMNS = ['candidate_user_id', 'candidate_name', 'votes', 'percentage']
+
+
+def vote_columns(ranked=False):
+    return VOTE_COLUMNS + (RANKED_COLUMNS if ranked else [])
+
+
+def iter_vote_chunks(election_id, chunk_size=1000, ranked=False):
+    """Yield lists of anonymous vote rows (tuples in vote_columns() order), ordered by choice"""
+    candidate_user = aliased(User)
+    columns = [Vote.election_id, Vote.candidate_id, candidate_user.name]
+    order = [Vote.candidate_id]
+    if ranked:
+        columns.append(Vote.rankings)
+        order.append(Vote.rankings)
+    stmt = (
+        select(*columns)
+        .join(Candidate, Candidate.id == Vote.candidate_id)
+        .join(candidate_user, candidate_user.id == Candidate.user_id)
+        .where(Vote.election_id == election_id)
+        .order_by(*order)
+        .execution_options(yield_per=chunk_size)
+    )
+    return _chunks(stmt, ranked)
+
+
+def iter_roll_chunks(election_id, chunk_size=1000):
+    """Yield lists of (student_id, name, department) of everyone who voted, in name order"""
+    voted = select(Vote.user_id).where(Vote.election_id == election_id)
+    stmt = (
+        select(User.student_id, User.name, User.department)
+        .where(User.id.in_(voted))
+        .order_by(User.name, User.student_id)
+        .execution_options(yield_per=chunk_size)
+    )
+    return _chunks(stmt)
+
+
+def _chunks(stmt, ranked=False):
+    result = db.session.execute(stmt)
+    try:
+        for partition in result.partitions():
+            if ranked:
+                yield [tuple(row[:-1]) + (_preferences(row[-1], row[1]),) for row in partition]
+            else:
+                yield [tuple(row) for row in partition]
+    finally:
+        result.close()
+
+
+def tally_rows(election):
+    """Per-candidate totals built on Election.get_results()"""
+    results = election.get_results()
+    total = sum(count for _, count in results)
+    names = dict(db.session.query(User.id, User.name).filter(User.id.in_([uid for uid, _ in results])))
+    rows = [
+        (user_id, names.get(user_id, ''), count, round(100.0 * count / total, 2) if total else 0.0)
+        for user_id, count in results
+    ]
+    rows.sort(key=lambda r: r[2], reverse=True)
+    return rows
+
+
+def stream(fmt, columns, chunks):
+    """Serialise an iterable of row chunks as CSV or NDJSON text chunks"""
+    if fmt == 'ndjson':
+        for chunk in chunks:
+            yield ''.join(json.dumps(dict(zip(columns, map(_jsonable, row)))) + '\n' for row in chunk)
+        return
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for chunk in chunks:
+        writer.writerows([[_csv_value(v) for v in row] for row in chunk])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def _preferences(rankings, candidate_id):
+    if not rankings:
+        return str(candidate_id)
+    return ' '.join(map(str, np.frombuffer(rankings, dtype=RANKING_DTYPE).tolist()))
+
+
+def _jsonable(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return '' if value is None else value
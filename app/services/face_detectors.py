@@ -0,0 +1,146 @@
+"""
+Face detector backends - pluggable face localisation for the face pipeline
+All detectors take an RGB numpy array and return face boxes in the
+face_recognition (top, right, bottom, left) convention.
+"""
+import os
+import threading
+
+try:
+    import face_recognition
+    FACE_RECOGNITION_AVAILABLE = True
+except ImportError:
+    FACE_RECOGNITION_AVAILABLE = False
+
+try:
+    import cv2
+    OPENCV_AVAILABLE = True
+except ImportError:
+    OPENCV_AVAILABLE = False
+
+
+class FaceDetector:
+    """Base class for face detector backends"""
+
+    name = 'base'
+
+    @property
+    def available(self):
+        return True
+
+    def detect(self, rgb):
+        """Return list of (top, right, bottom, left) boxes found in RGB image"""
+        raise NotImplementedError
+
+
+class HogFaceDetector(FaceDetector):
+    """dlib HOG detector (via face_recognition) - accurate but slow"""
+
+    name = 'hog'
+
+    def __init__(self, upsample=1):
+        self.upsample = upsample
+
+    @property
+    def available(self):
+        return FACE_RECOGNITION_AVAILABLE
+
+    def detect(self, rgb):
+        return face_recognition.face_locations(
+            rgb, number_of_times_to_upsample=self.upsample, model='hog'
+        )
+
+
+class CascadeFaceDetector(FaceDetector):
+    """
+    OpenCV Haar/LBP cascade detector - much faster than HOG, used as a
+    fast path for face counting and to supply locations to the encoder.
+    """
+
+    name = 'haar'
+
+    # One classifier per thread: CascadeClassifier is not safe to share
+    _local = threading.local()
+
+    def __init__(self, cascade_file='haarcascade_frontalface_default.xml',
+                 scale_factor=1.1, min_neighbors=5, min_size=60):
+        self.cascade_path = self._resolve_cascade(cascade_file)
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    @staticmethod
+    def _resolve_cascade(cascade_file):
+        """Accept an absolute path or a file name bundled with opencv-python"""
+        if os.path.isabs(cascade_file) or not OPENCV_AVAILABLE:
+            return cascade_file
+        return os.path.join(cv2.data.haarcascades, cascade_file)
+
+    @property
+    def available(self):
+        return (OPENCV_AVAILABLE and hasattr(cv2, 'CascadeClassifier')
+                and os.path.exists(self.cascade_path))
+
+    def _classifier(self):
+        cache = getattr(self._local, 'classifiers', None)
+        if cache is None:
+            cache = self._local.classifiers = {}
+        classifier = cache.get(self.cascade_path)
+        if classifier is None:
+            classifier = cv2.CascadeClassifier(self.cascade_path)
+            if classifier.empty():
+                raise RuntimeError(f'Could not load cascade {self.cascade_path}')
+            cache[self.cascade_path] = classifier
+        return classifier
+
+    def detect(self, rgb):
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        gray = cv2.equalizeHist(gray)
+        boxes = self._classifier().detectMultiScale(
+            gray,
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=(self.min_size, self.min_size),
+        )
+        h, w = gray.shape[:2]
+        locations = []
+        for (x, y, bw, bh) in boxes:
+            top, left = max(0, int(y)), max(0, int(x))
+            bottom, right = min(h, int(y + bh)), min(w, int(x + bw))
+            locations.append((top, right, bottom, left))
+        return locations
+
+
+DETECTORS = {
+    'hog': HogFaceDetector,
+    'haar': CascadeFaceDetector,
+}
+
+
+def get_detector(name='hog', **options):
+    """Build a detector backend by name (see DETECTORS)"""
+    try:
+        cls = DETECTORS[name]
+    except KeyError:
+        raise ValueError(f'Unknown face detector backend: {name}')
+    return cls(**options)
+
+
+def detector_from_config(config, registration=False, name=None):
+    """
+    Build the detector configured by FACE_DETECTOR_BACKEND (registration=True: the
+    registration pass). name picks another backend, still with its configured settings.
+    """
+    name = name or config.get('FACE_DETECTOR_BACKEND', 'hog')
+    if name == 'haar':
+        return get_detector(
+            'haar',
+            cascade_file=config.get('FACE_CASCADE_FILE', 'haarcascade_frontalface_default.xml'),
+            scale_factor=config.get('FACE_CASCADE_SCALE_FACTOR', 1.1),
+            min_neighbors=config.get('FACE_CASCADE_MIN_NEIGHBORS', 5),
+            min_size=config.get('FACE_CASCADE_MIN_SIZE', 60),
+        )
+    if name == 'hog':
+        key = 'FACE_HOG_REGISTER_UPSAMPLE' if registration else 'FACE_HOG_UPSAMPLE'
+        return get_detector('hog', upsample=config.get(key, 1))
+    return get_detector(name)
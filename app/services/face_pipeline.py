@@ -0,0 +1,265 @@
+"""
+Face Pipeline - the steps behind /api/face/* and /api/vote/*
+Shared by the Flask blueprints and the asyncio app (app/asgi.py) so both
+return identical JSON. Steps are split by the resource they use: request and
+database checks (I/O), image decode + encode (CPU; the async app dispatches
+these to a bounded executor, and resubmitted frames are served from the frame
+cache) and the final database write.
+
+Steps raise PipelineError for client-facing failures; callers turn it into
+({'success': False, 'error': message}, status).
+"""
+import base64
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from app import db
+from app.models.election import Election, Candidate, Vote
+from app.services import audit, frame_cache, metrics, rollups, tenancy
+
+VERIFICATION_TOKEN_SALT = 'face-verification'
+
+
+class PipelineError(Exception):
+    """A request the endpoint rejects with a JSON error"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+    def payload(self):
+        return {'success': False, 'error': self.message}
+
+
+def image_bytes(form, files):
+    """Raw image bytes from a base64 (data URL) form field or a file upload; None if absent"""
+    if form.get('image'):
+        data = form['image']
+        if ',' in data:
+            data = data.split(',')[1]
+        with metrics.stage('b64decode'):
+            return base64.b64decode(data)
+    if files.get('image'):
+        return files['image'].read()
+    return None
+
+
+def decode_image(img_bytes):
+    """BGR image array, or None if the bytes are not a decodable image"""
+    if img_bytes is None:
+        return None
+    with metrics.stage('imdecode'):
+        nparr = np.frombuffer(img_bytes, np.uint8)
+        return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+
+def cached_frame_result(kind, service, user_id, img_bytes, compute):
+    """
+    compute(decoded image) through the service's frame cache, keyed by user and
+    the uploaded bytes (or a near-identical frame when perceptual matching is on).
+    PipelineErrors are cached too and re-raised on a hit.
+    """
+    cache = service.frame_cache
+    if cache is None or img_bytes is None:
+        return compute(decode_image(img_bytes))
+    scope = (tenancy.current_tenant(), user_id, kind, service.cache_scope)
+    with metrics.stage('frame_cache'):
+        digest = frame_cache.content_digest(img_bytes)
+        entry = cache.get(scope, digest)
+    if entry is not None:
+        return _cache_hit(kind, entry, 'hit', 0.0)[0]
+    start = time.perf_counter()
+    img = decode_image(img_bytes)
+    phash = None
+    if cache.perceptual and img is not None:
+        phash = frame_cache.dhash(img)
+        entry = cache.get_similar(scope, phash)
+        if entry is not None:
+            cache.put(scope, digest, entry.outcome, entry.seconds, phash)
+            return _cache_hit(kind, entry, 'perceptual_hit', time.perf_counter() - start)[0]
+    frame_cache.lookups.inc(kind=kind, result='miss')
+    try:
+        outcome = (True, compute(img))
+    except PipelineError as e:
+        outcome = (False, e)
+    cache.put(scope, digest, outcome, time.perf_counter() - start, phash)
+    if not outcome[0]:
+        raise outcome[1]
+    return outcome[1]
+
+
+def frame_cache_hit(kind, service, user_id, img_bytes):
+    """(result,) if these exact bytes are cached for the user, else None - lets callers skip the encode queue"""
+    cache = service.frame_cache
+    if cache is None or img_bytes is None:
+        return None
+    scope = (tenancy.current_tenant(), user_id, kind, service.cache_scope)
+    entry = cache.get(scope, frame_cache.content_digest(img_bytes))
+    return _cache_hit(kind, entry, 'hit', 0.0) if entry is not None else None
+
+
+def _cache_hit(kind, entry, result, spent):
+    frame_cache.lookups.inc(kind=kind, result=result)
+    frame_cache.saved_seconds.inc(max(0.0, entry.seconds - spent), kind=kind)
+    ok, value = entry.outcome
+    if not ok:
+        raise value
+    return (value,)
+
+
+def parse_rankings(form):
+    """Candidate ids in preference order from `rankings` ("3,1,2" or repeated fields)"""
+    values = form.getlist('rankings')
+    if len(values) == 1:
+        values = values[0].split(',')
+    try:
+        return [int(v) for v in values if v.strip()]
+    except ValueError:
+        return None
+
+
+def require_student(user):
+    if not user.is_student():
+        raise PipelineError('Students only', 403)
+
+
+# --- Registration ---
+
+def registration_encoding(service, img):
+    """Encoding for a registration frame (exactly one face required)"""
+    if img is None:
+        raise PipelineError('No image provided')
+    # One detection pass; its face box goes straight to the encoder
+    encoding, error = service.register_face_from_image(img)
+    if encoding is None:
+        raise PipelineError(error)
+    return encoding
+
+
+def registration_encoding_for(service, user_id, img_bytes):
+    """registration_encoding from raw upload bytes, via the frame cache"""
+    return cached_frame_result('register', service, user_id, img_bytes,
+                               lambda img: registration_encoding(service, img))
+
+
+def save_registration(service, user, encoding):
+    user.face_encoding_path = service.save_encoding(user.id, encoding)
+    with metrics.stage('db_commit'):
+        db.session.commit()
+    return {'success': True, 'message': 'Face registered successfully'}
+
+
+# --- Verification ---
+
+def require_registered_face(user, message='No face registered'):
+    if not user.face_encoding_path:
+        raise PipelineError(message)
+
+
+def probe_encoding(service, img):
+    """Encoding of the presented face (None if no single face was found)"""
+    if img is None:
+        raise PipelineError('No image provided')
+    return service.encode_face_from_image(img)
+
+
+def probe_encoding_for(service, user_id, img_bytes):
+    """probe_encoding from raw upload bytes, via the frame cache"""
+    return cached_frame_result('probe', service, user_id, img_bytes,
+                               lambda img: probe_encoding(service, img))
+
+
+def match_face(service, user, encoding, operation, election_id=None):
+    """Compare against the stored encoding and count the outcome. Returns (match, distance)."""
+    if encoding is None:
+        rollups.verifications.record(operation, 'no_face', user.department, election_id)
+        audit.note(outcome='no_face')
+        raise PipelineError('Could not detect face')
+    match, distance = service.verify_face(encoding, user.face_encoding_path)
+    rollups.verifications.record(operation, 'verified' if match else 'mismatch', user.department, election_id)
+    audit.note(outcome='verified' if match else 'mismatch', distance=distance)
+    return match, distance
+
+
+def verification_payload(match, distance):
+    return {'success': match, 'verified': match, 'distance': distance}
+
+
+def _token_serializer(config):
+    from itsdangerous import URLSafeTimedSerializer
+    return URLSafeTimedSerializer(config['SECRET_KEY'], salt=VERIFICATION_TOKEN_SALT)
+
+
+def issue_verification_token(config, user_id, election_id):
+    """Signed proof that this user just passed face verification for this election"""
+    return _token_serializer(config).dumps({'u': user_id, 'e': election_id})
+
+
+def check_verification_token(config, token, user, election_id):
+    """Accept a verification token in place of a frame when casting a vote"""
+    from itsdangerous import BadSignature, SignatureExpired
+    try:
+        data = _token_serializer(config).loads(token, max_age=config.get('FACE_VERIFICATION_TOKEN_TTL', 120))
+    except SignatureExpired:
+        raise PipelineError('Face verification expired, please verify again', 403)
+    except BadSignature:
+        raise PipelineError('Face verification failed', 403)
+    if data.get('u') != user.id or data.get('e') != election_id:
+        raise PipelineError('Face verification failed', 403)
+
+
+# --- Voting ---
+
+def prepare_ballot(user, form):
+    """Validate a vote request up to (not including) face verification. Returns the ballot dict."""
+    require_student(user)
+    require_registered_face(user, 'Register your face first')
+
+    election_id = form.get('election_id', type=int)
+    if not election_id:
+        raise PipelineError('election_id required')
+
+    election = db.session.get(Election, election_id)
+    if not election or not election.accepting_votes:
+        raise PipelineError('Election not active')
+
+    rankings = None
+    if election.is_ranked:
+        preferences = parse_rankings(form)
+        if not preferences:
+            raise PipelineError('rankings required (candidate ids in order of preference)')
+        if len(set(preferences)) != len(preferences):
+            raise PipelineError('Each candidate can be ranked only once')
+        approved = {cid for (cid,) in db.session.query(Candidate.id).filter(
+            Candidate.election_id == election_id, Candidate.status == 'approved',
+            Candidate.id.in_(preferences))}
+        if len(approved) != len(preferences):
+            raise PipelineError('Invalid candidate')
+        candidate_id = preferences[0]
+        rankings = Vote.pack_rankings(preferences)
+    else:
+        candidate_id = form.get('candidate_id', type=int)
+        if not candidate_id:
+            raise PipelineError('election_id and candidate_id required')
+        candidate = Candidate.query.filter_by(id=candidate_id, election_id=election_id, status='approved').first()
+        if not candidate:
+            raise PipelineError('Invalid candidate')
+
+    if Vote.query.filter_by(election_id=election_id, user_id=user.id).first():
+        raise PipelineError('You have already voted')
+
+    return {'election_id': election_id, 'candidate_id': candidate_id, 'rankings': rankings}
+
+
+def save_vote(user, ballot):
+    vote = Vote(election_id=ballot['election_id'], candidate_id=ballot['candidate_id'], user_id=user.id,
+                rankings=ballot['rankings'], voted_at=datetime.utcnow())
+    db.session.add(vote)
+    rollups.record_vote(ballot['election_id'], user.department, vote.voted_at)
+    with metrics.stage('db_commit'):
+        db.session.commit()
+    return {'success': True, 'message': 'Vote cast successfully'}
@@ -2,44 +2,85 @@
 Face Recognition Service - Registration and verification for voting
 Uses face_recognition library (dlib-based) for face encoding and matching
 """
-import os
-import pickle
 import numpy as np
+import cv2
+
+from app.services import metrics
+from app.services.encoding_storage import EncodingRepository, LocalStore, repository_from_config
+from app.services.face_detectors import HogFaceDetector, detector_from_config
+from app.services.frame_cache import frame_cache_from_config
 
 try:
     import face_recognition
-    import cv2
     FACE_RECOGNITION_AVAILABLE = True
 except ImportError:
     FACE_RECOGNITION_AVAILABLE = False
 
+# Matches the historical encode_face_from_image settings
+DEFAULT_ENCODING_PROFILE = {'num_jitters': 2, 'model': 'small'}
+
+
+def prepare_image(image_array):
+    """Resize image if too large/small for better face detection. Returns RGB array."""
+    rgb = cv2.cvtColor(image_array, cv2.COLOR_BGR2RGB)
+    h, w = rgb.shape[:2]
+    # face_recognition works best with faces 100-500px
+    max_dim, min_dim = 800, 250
+    if max(h, w) > max_dim:
+        scale = max_dim / max(h, w)
+    elif min(h, w) < min_dim:
+        scale = min_dim / min(h, w)
+    else:
+        return rgb
+    new_w, new_h = int(w * scale), int(h * scale)
+    return cv2.resize(rgb, (new_w, new_h), interpolation=cv2.INTER_AREA)
+
 
 class FaceRecognitionService:
     """Handle face encoding, storage, and verification"""
     
-    def __init__(self, encodings_folder, tolerance=0.5):
+    def __init__(self, encodings_folder, tolerance=0.5, detector=None, encoding_profile=None, storage=None,
+                 frame_cache=None, registration_detector=None):
         self.encodings_folder = encodings_folder
         self.tolerance = tolerance
-        os.makedirs(encodings_folder, exist_ok=True)
+        self.detector = detector or HogFaceDetector()
+        # Registration can afford a more thorough pass (e.g. HOG at 2x upsample); verify stays on detector
+        self.registration_detector = registration_detector or self.detector
+        profile = encoding_profile or DEFAULT_ENCODING_PROFILE
+        self.num_jitters = profile.get('num_jitters', 1)
+        self.encoding_model = profile.get('model', 'small')  # "small" is faster, "large" more accurate
+        # Where encodings live (see encoding_storage); defaults to files in encodings_folder
+        self.storage = storage or EncodingRepository(LocalStore(encodings_folder))
+        # Per-user results for resubmitted frames (see frame_cache); None disables it
+        self.frame_cache = frame_cache
     
-    def _get_encoding_path(self, user_id):
-        """Get file path for user's face encoding"""
-        return os.path.join(self.encodings_folder, f"user_{user_id}.pkl")
+    @property
+    def cache_scope(self):
+        """Settings that change an encoding; frame cache entries are only shared within one scope"""
+        return (type(self.detector).__name__, self.num_jitters, self.encoding_model)
     
     def _prepare_image(self, image_array):
         """Resize image if too large/small for better face detection. Returns RGB array."""
-        rgb = cv2.cvtColor(image_array, cv2.COLOR_BGR2RGB)
-        h, w = rgb.shape[:2]
-        # face_recognition works best with faces 100-500px
-        max_dim, min_dim = 800, 250
-        if max(h, w) > max_dim:
-            scale = max_dim / max(h, w)
-        elif min(h, w) < min_dim:
-            scale = min_dim / min(h, w)
-        else:
-            return rgb
-        new_w, new_h = int(w * scale), int(h * scale)
-        return cv2.resize(rgb, (new_w, new_h), interpolation=cv2.INTER_AREA)
+        return prepare_image(image_array)
+
+    def _locate_faces(self, image_array, detector=None):
+        """(prepared RGB image, face locations) - the single detection pass per frame"""
+        with metrics.stage('prepare'):
+            rgb = self._prepare_image(image_array)
+        with metrics.stage('detect'):
+            locations = (detector or self.detector).detect(rgb)
+        return rgb, locations
+
+    def _encode_located(self, rgb, locations):
+        """Encoding of the one face at `locations` (already detected), or None"""
+        with metrics.stage('encode'):
+            encodings = face_recognition.face_encodings(
+                rgb, known_face_locations=locations,
+                num_jitters=self.num_jitters, model=self.encoding_model
+            )
+        if len(encodings) == 1:
+            return encodings[0].tolist()
+        return None
 
     def encode_face_from_image(self, image_array):
         """
@@ -49,16 +90,29 @@ class FaceRecognitionService:
         if not FACE_RECOGNITION_AVAILABLE:
             return None
         try:
-            rgb = self._prepare_image(image_array)
-            encodings = face_recognition.face_encodings(
-                rgb, num_jitters=2,
-                model="small"  # "small" is faster, "large" more accurate
-            )
-            if len(encodings) == 1:
-                return encodings[0].tolist()
-            return None
+            rgb, locations = self._locate_faces(image_array)
+            if len(locations) != 1:
+                return None
+            return self._encode_located(rgb, locations)
         except Exception:
             return None
+
+    def register_face_from_image(self, image_array):
+        """
+        Registration: check for exactly one face with the registration detector and
+        encode it from the same detection. Returns (encoding, None) or (None, error message).
+        """
+        if not FACE_RECOGNITION_AVAILABLE:
+            return None, "Face recognition not available"
+        try:
+            rgb, locations = self._locate_faces(image_array, self.registration_detector)
+            error = self._count_error(len(locations))
+            if error:
+                return None, error
+            encoding = self._encode_located(rgb, locations)
+            return (encoding, None) if encoding is not None else (None, 'Could not extract face encoding')
+        except Exception as e:
+            return None, str(e)
     
     def encode_face_from_file(self, file_path):
         """Extract face encoding from image file path"""
@@ -66,7 +120,13 @@ class FaceRecognitionService:
             return None
         try:
             image = face_recognition.load_image_file(file_path)
-            encodings = face_recognition.face_encodings(image)
+            locations = self.detector.detect(image)
+            if len(locations) != 1:
+                return None
+            encodings = face_recognition.face_encodings(
+                image, known_face_locations=locations,
+                num_jitters=self.num_jitters, model=self.encoding_model
+            )
             if len(encodings) == 1:
                 return encodings[0].tolist()
             return None
@@ -74,23 +134,13 @@ class FaceRecognitionService:
             return None
     
     def save_encoding(self, user_id, encoding):
-        """Save face encoding to disk"""
-        path = self._get_encoding_path(user_id)
-        with open(path, 'wb') as f:
-            pickle.dump(encoding, f)
-        return path
+        """Save face encoding to the storage backend. Returns the reference to keep on the user."""
+        return self.storage.save(user_id, encoding)
     
-    def load_encoding(self, user_id_or_path):
-        """Load face encoding - accepts user_id (int) or file path (str)"""
-        if isinstance(user_id_or_path, str) and user_id_or_path.endswith('.pkl'):
-            path = user_id_or_path
-        else:
-            path = self._get_encoding_path(user_id_or_path)
-        if not os.path.exists(path):
-            return None
+    def load_encoding(self, user_id_or_ref):
+        """Load face encoding - accepts user_id (int), a storage reference or a legacy .pkl path"""
         try:
-            with open(path, 'rb') as f:
-                return pickle.load(f)
+            return self.storage.load(user_id_or_ref)
         except Exception:
             return None
     
@@ -101,15 +151,17 @@ class FaceRecognitionService:
         """
         if not FACE_RECOGNITION_AVAILABLE:
             return False, None
-        stored = self.load_encoding(user_id_or_path)
+        with metrics.stage('load_encoding'):
+            stored = self.load_encoding(user_id_or_path)
         if stored is None or unknown_encoding is None:
             return False, None
         try:
-            unknown = np.array(unknown_encoding)
-            stored_arr = np.array(stored)
-            # face_recognition.face_distance returns array of distances
-            distance = face_recognition.face_distance([stored_arr], unknown)[0]
-            match = distance <= self.tolerance
+            with metrics.stage('distance'):
+                unknown = np.array(unknown_encoding)
+                stored_arr = np.array(stored)
+                # face_recognition.face_distance returns array of distances
+                distance = face_recognition.face_distance([stored_arr], unknown)[0]
+            match = bool(distance <= self.tolerance)
             return match, float(distance)
         except Exception:
             return False, None
@@ -119,24 +171,42 @@ class FaceRecognitionService:
         if not FACE_RECOGNITION_AVAILABLE:
             return False, "Face recognition not available"
         try:
-            rgb = self._prepare_image(image_array)
-            # Higher upsampling helps detect faces (especially smaller/distant ones)
-            face_locations = face_recognition.face_locations(
-                rgb, number_of_times_to_upsample=2, model="hog"
-            )
-            n = len(face_locations)
-            if n == 1:
-                return True, 1
-            if n == 0:
-                return False, "No face detected. Try moving closer, ensure good lighting, and face the camera directly."
-            return False, "Multiple faces detected. Ensure only you are in the frame."
+            _, face_locations = self._locate_faces(image_array, self.registration_detector)
+            error = self._count_error(len(face_locations))
+            return (False, error) if error else (True, 1)
         except Exception as e:
             return False, str(e)
+
+    @staticmethod
+    def _count_error(n):
+        if n == 1:
+            return None
+        if n == 0:
+            return "No face detected. Try moving closer, ensure good lighting, and face the camera directly."
+        return "Multiple faces detected. Ensure only you are in the frame."
     
     def delete_encoding(self, user_id):
         """Remove stored face encoding for user"""
-        path = self._get_encoding_path(user_id)
-        if os.path.exists(path):
-            os.remove(path)
-            return True
-        return False
+        return self.storage.delete(user_id)
+
+
+def create_face_service(config):
+    """Build a FaceRecognitionService from app config"""
+    return FaceRecognitionService(
+        config['FACE_ENCODINGS_FOLDER'],
+        tolerance=config.get('FACE_ENCODING_TOLERANCE', 0.5),
+        detector=detector_from_config(config),
+        registration_detector=detector_from_config(config, registration=True),
+        encoding_profile=encoding_profile_from_config(config),
+        storage=repository_from_config(config),
+        frame_cache=frame_cache_from_config(config)
+    )
+
+
+def encoding_profile_from_config(config, name=None):
+    """Look up an encoding profile (FACE_ENCODING_PROFILE by default) in FACE_ENCODING_PROFILES"""
+    profiles = config.get('FACE_ENCODING_PROFILES') or {}
+    name = name or config.get('FACE_ENCODING_PROFILE', 'balanced')
+    if name not in profiles:
+        raise ValueError(f'Unknown face encoding profile: {name}')
+    return profiles[name]
@@ -0,0 +1,87 @@
+"""
+Fragment Cache - rendered dashboard blocks reused until their elections change
+The election lists and candidate tables on the admin, college and student
+dashboards are rendered from partial templates (templates/*/_*.html) and kept
+in a small in-process LRU. A block's key holds the (id, version) of every
+election it shows, read with one narrow query; on a hit the page skips
+loading the rows and rendering the block.
+
+Election.version is bumped in the same transaction as every change to an
+election or its candidates (admin edits, nominations and approvals, lifecycle
+status transitions). Blocks that show vote counts add each election's vote
+total from the rollup table, which the vote's own transaction already
+upserts, so casting a vote never writes to the election row. Keys therefore
+change the moment the data does, in every worker, and nothing is ever
+invalidated by hand; superseded entries simply age out of the LRU.
+"""
+from markupsafe import Markup
+from sqlalchemy import update
+
+from app import db
+from app.models.election import Election
+from app.services import metrics, rollups, tenancy
+from app.services.lru import LRUCache
+
+lookups = metrics.registry.counter(
+    'fragment_cache_lookups_total', 'Rendered fragment lookups by result (hit, miss)',
+    labels=('fragment', 'result'))
+
+
+def bump(*election_ids):
+    """Retire every cached block showing these elections; call inside the mutation's transaction"""
+    ids = [eid for eid in election_ids if eid is not None]
+    if ids:
+        db.session.execute(
+            update(Election).where(Election.id.in_(ids)).values(version=Election.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def versions(query, votes=False):
+    """[(id, version[, vote total])] of the elections an Election query returns, in its order"""
+    rows = [tuple(row) for row in query.with_entities(Election.id, Election.version).all()]
+    if not votes:
+        return rows
+    totals = rollups.vote_totals([eid for eid, _ in rows])
+    return [(eid, version, totals.get(eid, 0)) for eid, version in rows]
+
+
+class FragmentCache(LRUCache):
+    """Thread-safe LRU of rendered template fragments"""
+
+    def __init__(self, max_entries=512):
+        super().__init__(max_entries)
+        self.enabled = True
+
+    def configure(self, config):
+        self.enabled = config.get('FRAGMENT_CACHE_ENABLED', True)
+        self.max_entries = config.get('FRAGMENT_CACHE_SIZE', self.max_entries)
+        return self
+
+
+fragment_cache = FragmentCache()
+
+
+def render(name, key, template, load):
+    """
+    Markup of `template` rendered with the context returned by load(), reused
+    while `key` is unchanged. The block must not depend on the signed-in user.
+    """
+    from flask import render_template, request
+    if not fragment_cache.enabled:
+        return Markup(render_template(template, **load()))
+    full_key = (tenancy.current_tenant(), request.script_root, name, key)
+    html = fragment_cache.get(full_key)
+    if html is not None:
+        lookups.inc(fragment=name, result='hit')
+        return html
+    lookups.inc(fragment=name, result='miss')
+    html = Markup(render_template(template, **load()))
+    fragment_cache.set(full_key, html)
+    return html
+
+
+def init_app(app):
+    fragment_cache.configure(app.config)
+    metrics.registry.gauge('fragment_cache_entries', 'Rendered fragments held in memory',
+                           callback=lambda: len(fragment_cache))
@@ -0,0 +1,131 @@
+"""
+Frame Cache - reuse encodings for frames a user submits again
+Retries after a lock timeout, a network error or a double click resend the
+very same image, and each one used to pay decode + detect + encode again.
+Results are cached per user under a BLAKE2b digest of the uploaded bytes and,
+optionally, a 64-bit difference hash (dHash) of the decoded frame, so a
+re-compressed copy of the same capture also hits.
+
+Entries hold the encoding (or the detection failure), never a match result:
+comparisons always run against the user's current stored encoding. Entries
+live at most FACE_FRAME_CACHE_TTL seconds and are scoped by user and encoding
+profile, so they are never reused across users or settings.
+"""
+import hashlib
+import threading
+import time
+
+import cv2
+
+from app.services import metrics
+from app.services.lru import LRUCache
+
+lookups = metrics.registry.counter(
+    'face_frame_cache_lookups_total', 'Frame cache lookups by result (hit, perceptual_hit, miss)',
+    labels=('kind', 'result'))
+saved_seconds = metrics.registry.counter(
+    'face_frame_cache_saved_seconds_total', 'Decode/detect/encode time skipped by frame cache hits',
+    labels=('kind',))
+
+
+def content_digest(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def dhash(image):
+    """64-bit difference hash of a BGR frame: robust to re-compression and small resizes"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(''.join('1' if b else '0' for b in bits), 2)
+
+
+class _Entry:
+    __slots__ = ('outcome', 'seconds', 'expires', 'phash')
+
+    def __init__(self, outcome, seconds, expires, phash):
+        self.outcome = outcome
+        self.seconds = seconds
+        self.expires = expires
+        self.phash = phash
+
+
+class FrameCache:
+    """Thread-safe LRU + TTL of per-user frame results"""
+
+    def __init__(self, max_entries=2048, ttl=120.0, perceptual=False, max_distance=2):
+        self.ttl = ttl
+        self.perceptual = perceptual
+        self.max_distance = max_distance
+        # Guards the entries and the perceptual index together; evictions drop the index entry too
+        self._lock = threading.Lock()
+        self._entries = LRUCache(max_entries, on_evict=lambda key, _: self._forget(*key))  # (scope, digest) -> _Entry
+        self._by_scope = {}  # scope -> {digest: phash} for perceptual lookups
+
+    @property
+    def max_entries(self):
+        return self._entries.max_entries
+
+    @max_entries.setter
+    def max_entries(self, value):
+        self._entries.max_entries = value
+
+    def configure(self, config):
+        self.max_entries = config.get('FACE_FRAME_CACHE_SIZE', self.max_entries)
+        self.ttl = config.get('FACE_FRAME_CACHE_TTL', self.ttl)
+        self.perceptual = config.get('FACE_FRAME_CACHE_PERCEPTUAL', self.perceptual)
+        self.max_distance = config.get('FACE_FRAME_CACHE_MAX_DISTANCE', self.max_distance)
+        return self
+
+    def get(self, scope, digest):
+        with self._lock:
+            return self._live(scope, digest)
+
+    def get_similar(self, scope, phash):
+        """Entry whose dHash is within max_distance bits of phash, if any"""
+        with self._lock:
+            for digest, other in list(self._by_scope.get(scope, {}).items()):
+                if other is not None and bin(phash ^ other).count('1') <= self.max_distance:
+                    entry = self._live(scope, digest)
+                    if entry is not None:
+                        return entry
+            return None
+
+    def put(self, scope, digest, outcome, seconds, phash=None):
+        with self._lock:
+            self._by_scope.setdefault(scope, {})[digest] = phash
+            self._entries.set((scope, digest), _Entry(outcome, seconds, time.monotonic() + self.ttl, phash))
+
+    def _live(self, scope, digest):
+        entry = self._entries.get((scope, digest))
+        if entry is not None and entry.expires < time.monotonic():
+            self._entries.pop((scope, digest))
+            self._forget(scope, digest)
+            return None
+        return entry
+
+    def _forget(self, scope, digest):
+        digests = self._by_scope.get(scope)
+        if digests is not None:
+            digests.pop(digest, None)
+            if not digests:
+                del self._by_scope[scope]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_scope.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+cache = FrameCache()
+metrics.registry.gauge('face_frame_cache_entries', 'Entries in the frame cache', callback=lambda: len(cache))
+
+
+def frame_cache_from_config(config):
+    """The process-wide frame cache with settings from config, or None if disabled"""
+    if not config.get('FACE_FRAME_CACHE_ENABLED', True):
+        return None
+    return cache.configure(config)
@@ -0,0 +1,258 @@
+"""
+Election Lifecycle - scheduled open/close transitions and their side effects
+Election.status ('scheduled' -> 'open' -> 'closed') is precomputed here, so
+request paths read one column instead of comparing dates on every access.
+
+Transitions are conditional UPDATEs (... WHERE id = :id AND status = <old>), so
+any number of workers or a sidecar (scripts/run_scheduler.py) can tick
+concurrently: exactly one wins each transition and runs its global work.
+On close that is draining buffered counters and storing the final results
+snapshot, SCHEDULER_CLOSE_GRACE_SECONDS after end_date so in-flight votes have
+committed (the vote path itself stops at end_date).
+
+The new status and status_changed_at are the published state change. Every
+process watches status_changed_at and runs its local work: warming its
+candidate list and face encoding caches when an election opens, and finishing
+the close work if a closed election still has no snapshot.
+
+With several tenant databases (services/tenancy.py) each tick runs once per
+tenant, with its own watcher.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import joinedload
+
+from app import db
+from app.models.election import Election, Candidate
+from app.models.user import User
+from app.services import metrics, rollups, tenancy
+
+transitions_total = metrics.registry.counter(
+    'election_transitions_total', 'Election status transitions won by this process', labels=('status',))
+
+
+class CandidateLists:
+    """Process-local approved candidate lists for the ballot page, as plain dicts"""
+
+    def __init__(self, ttl=30.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}  # (tenant, election id) -> (loaded at, [candidate dicts])
+
+    def get(self, election_id):
+        with self._lock:
+            entry = self._entries.get((tenancy.current_tenant(), election_id))
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+        return self.load(election_id)
+
+    def load(self, election_id):
+        candidates = (
+            Candidate.query.options(joinedload(Candidate.user))
+            .filter_by(election_id=election_id, status='approved')
+            .order_by(Candidate.id)
+            .all()
+        )
+        rows = [{'id': c.id, 'user_id': c.user_id, 'manifesto': c.manifesto,
+                 'user': {'name': c.user.name, 'department': c.user.department}}
+                for c in candidates]
+        with self._lock:
+            self._entries[(tenancy.current_tenant(), election_id)] = (time.monotonic(), rows)
+        return rows
+
+    def invalidate(self, election_id):
+        with self._lock:
+            self._entries.pop((tenancy.current_tenant(), election_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+candidate_lists = CandidateLists()
+
+
+# --- Transitions (one winner per election across all processes) ---
+
+def due_transitions(now, grace_seconds=0):
+    """[(election, new status)] for elections whose status lags their dates"""
+    close_before = now - timedelta(seconds=grace_seconds)
+    elections = Election.query.filter(or_(
+        and_(Election.status == 'scheduled', Election.start_date <= now),
+        and_(Election.status != 'closed', Election.end_date < close_before),
+    )).all()
+    due = []
+    for election in elections:
+        target = 'closed' if election.end_date < close_before else 'open'
+        if target != election.status:
+            due.append((election, target))
+    return due
+
+
+def transition(election, new_status, now):
+    """Move one election to new_status if nobody else has; True if this call did it"""
+    result = db.session.execute(
+        update(Election)
+        .where(Election.id == election.id, Election.status == election.status)
+        .values(status=new_status, status_changed_at=now, version=Election.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    if result.rowcount != 1:
+        return False
+    transitions_total.inc(status=new_status)
+    return True
+
+
+def tick(now=None, grace_seconds=0, hooks=True):
+    """Apply every due transition; returns [(election id, status)] won by this call"""
+    now = now or datetime.utcnow()
+    won = []
+    for election, new_status in due_transitions(now, grace_seconds):
+        election_id = election.id
+        if not transition(election, new_status, now):
+            continue
+        won.append((election_id, new_status))
+        if hooks and new_status == 'closed':
+            on_closed(db.session.get(Election, election_id))
+    return won
+
+
+def on_closed(election):
+    """Global close work: flush buffered counters, then materialize the final results"""
+    from app.services.results import get_snapshot
+    rollups.verifications.flush()
+    db.session.refresh(election)
+    get_snapshot(election)
+
+
+def _has_snapshot(election_id):
+    from app.models.election import ElectionResultSnapshot
+    return db.session.query(
+        select(ElectionResultSnapshot.id).where(ElectionResultSnapshot.election_id == election_id).exists()
+    ).scalar()
+
+
+# --- Local reactions to published state changes (every process) ---
+
+class StatusWatcher:
+    """Runs per-process work for elections whose status changed since the last look"""
+
+    def __init__(self):
+        self.last_seen = None
+
+    def poll(self, warm_encodings=True):
+        """Warm or drop local caches for changed elections; returns [(id, status)] handled"""
+        query = db.session.query(Election.id, Election.status, Election.status_changed_at)
+        if self.last_seen is None:
+            # First look in this process: everything open counts as just opened, and closed
+            # elections are checked for missing close work
+            self.last_seen = db.session.query(func.max(Election.status_changed_at)).scalar() or datetime.min
+            changed = query.filter(or_(Election.status == 'open', Election.status_changed_at.isnot(None))).all()
+        else:
+            changed = query.filter(Election.status_changed_at > self.last_seen).all()
+        opened = False
+        for election_id, status, changed_at in changed:
+            if changed_at is not None and changed_at > self.last_seen:
+                self.last_seen = changed_at
+            if status == 'open':
+                candidate_lists.load(election_id)
+                opened = True
+            else:
+                candidate_lists.invalidate(election_id)
+            if status == 'closed' and not _has_snapshot(election_id):
+                # Closed without its close work (e.g. by the startup sync, or the winner crashed)
+                on_closed(db.session.get(Election, election_id))
+        if opened and warm_encodings:
+            warm_encoding_cache()
+        return [(election_id, status) for election_id, status, _ in changed]
+
+
+def warm_encoding_cache(chunk_size=1000):
+    """Load registered students' encodings into this process's cache (up to its size). Returns count."""
+    from flask import current_app
+    from app.services.encoding_storage import cache, repository_from_config
+    repository = repository_from_config(current_app.config)
+    stmt = (
+        select(User.face_encoding_path)
+        .where(User.role == 'student', User.is_active.is_(True), User.face_encoding_path.isnot(None))
+        .order_by(User.id)
+        .limit(cache.max_entries)
+        .execution_options(yield_per=chunk_size)
+    )
+    loaded = 0
+    result = db.session.execute(stmt)
+    try:
+        for partition in result.partitions():
+            for (ref,) in partition:
+                if repository.load(ref) is not None:
+                    loaded += 1
+    finally:
+        result.close()
+    return loaded
+
+
+class Scheduler:
+    """Background thread: tick transitions and watch for changes every SCHEDULER_INTERVAL seconds"""
+
+    def __init__(self):
+        self.watchers = {}  # tenant -> StatusWatcher
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def run_once(self, app):
+        """Tick every tenant; returns [(election id, status)] won (ids are per tenant)"""
+        won = []
+        for tenant in tenancy.tenant_names(app.config):
+            won.extend(self.run_tenant(app, tenant))
+        return won
+
+    def run_tenant(self, app, tenant):
+        config = app.config
+        watcher = self.watchers.setdefault(tenant, StatusWatcher())
+        with app.app_context(), tenancy.use_tenant(tenant):
+            try:
+                won = tick(grace_seconds=config.get('SCHEDULER_CLOSE_GRACE_SECONDS', 5))
+                watcher.poll(warm_encodings=config.get('SCHEDULER_WARM_ENCODINGS', True))
+                return won
+            except Exception:
+                db.session.rollback()
+                metrics.record_error()
+                app.logger.exception('Election scheduler tick failed for tenant %s', tenant)
+                return []
+            finally:
+                db.session.remove()
+
+    def run(self, app):
+        interval = app.config.get('SCHEDULER_INTERVAL', 5.0)
+        while not self._stop.is_set():
+            self.run_once(app)
+            self._stop.wait(interval)
+
+    def start(self, app):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self.run, args=(app,), name='election-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+scheduler = Scheduler()
+
+
+def init_app(app):
+    """Start the in-process scheduler with the first request (not for CLI scripts)"""
+    candidate_lists.ttl = app.config.get('SCHEDULER_CANDIDATE_TTL', 30.0)
+    if not app.config.get('SCHEDULER_ENABLED', True):
+        return
+
+    @app.before_request
+    def _start_scheduler():
+        scheduler.start(app)
@@ -0,0 +1,47 @@
+"""
+LRU - the bounded in-process cache behind the app's memory caches
+Rendered results pages, dashboard fragments, decoded face encodings and
+frame results are all kept per worker in a thread-safe mapping that drops its
+least recently used entry once it holds more than max_entries. Caches that
+need more (version checks, TTLs, secondary indexes) wrap one of these rather
+than keeping their own OrderedDict.
+"""
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe mapping that evicts the least recently used entry beyond max_entries"""
+
+    def __init__(self, max_entries, on_evict=None):
+        self.max_entries = max_entries
+        self.on_evict = on_evict  # called with (key, value) for every entry pushed out by set()
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._entries.get(key, default)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                old_key, old_value = self._entries.popitem(last=False)
+                if self.on_evict is not None:
+                    self.on_evict(old_key, old_value)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._entries.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
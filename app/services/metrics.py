@@ -0,0 +1,414 @@
+"""
+Metrics Service - low-overhead in-process metrics with a Prometheus text exporter
+Records per-stage timings of the face pipeline, request latency per route,
+DB queries per request and pool/queue gauges.
+
+Each worker aggregates in memory (one lock per metric). When METRICS_DIR is
+set, workers periodically dump their state to metrics-<pid>.json there so any
+worker answering /metrics can merge the whole fleet. A worker removes its file
+at exit; files of processes that are no longer running (killed or replaced
+workers, earlier deployments) are removed at startup and skipped by scrapes,
+so their counts are not merged forever.
+"""
+import atexit
+import bisect
+import contextvars
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds - covers cheap DB work up to slow dlib encodes
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# Per-request state: current face operation, stage timings, DB query count
+_operation = contextvars.ContextVar('metrics_operation', default=None)
+_request_state = contextvars.ContextVar('metrics_request_state', default=None)
+
+
+class _Metric:
+    type_name = 'untyped'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, '')) for n in self.label_names)
+
+    def snapshot(self):
+        with self._lock:
+            return {json.dumps(k): self._copy(v) for k, v in self._values.items()}
+
+    def _copy(self, value):
+        return value
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Gauge set directly or computed at scrape time from a callback"""
+    type_name = 'gauge'
+
+    def __init__(self, name, help_text, labels=(), callback=None):
+        super().__init__(name, help_text, labels)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def snapshot(self):
+        if self.callback is not None:
+            try:
+                values = self.callback()
+            except Exception:
+                values = {}
+            if not isinstance(values, dict):
+                values = {(): values}
+            with self._lock:
+                self._values = {tuple(k): v for k, v in values.items()}
+        return super().snapshot()
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][idx] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _copy(self, value):
+        return [list(value[0]), value[1], value[2]]
+
+
+class MetricsRegistry:
+    """Holds metrics for one process and renders the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self.export_dir = None
+        self.export_interval = 5.0
+        self._last_export = 0.0
+
+    def _get_or_create(self, cls, name, help_text, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._get_or_create(Counter, name, help_text, labels=labels)
+
+    def gauge(self, name, help_text, labels=(), callback=None):
+        gauge = self._get_or_create(Gauge, name, help_text, labels=labels)
+        if callback is not None:
+            gauge.callback = callback
+        return gauge
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, labels=labels, buckets=buckets)
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            m.name: {
+                'type': m.type_name,
+                'help': m.help,
+                'labels': list(m.label_names),
+                'buckets': list(getattr(m, 'buckets', ())),
+                'samples': m.snapshot(),
+            }
+            for m in metrics
+        }
+
+    # -- multi-worker export -------------------------------------------------
+
+    def _export_path(self, pid=None):
+        return os.path.join(self.export_dir, f'metrics-{pid or os.getpid()}.json')
+
+    def maybe_export(self, force=False):
+        """Dump this worker's state to METRICS_DIR (rate limited)"""
+        if not self.export_dir:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_export < self.export_interval:
+            return
+        self._last_export = now
+        path = self._export_path()
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+
+    def remove_export(self):
+        """Delete this worker's export file (at exit)"""
+        if self.export_dir:
+            try:
+                os.remove(self._export_path())
+            except OSError:
+                pass
+
+    def _export_files(self):
+        """{path: pid} of export files written by processes that are still running; removes the rest"""
+        files = {}
+        for path in glob.glob(os.path.join(self.export_dir, 'metrics-*.json')):
+            pid = os.path.basename(path)[len('metrics-'):-len('.json')]
+            if pid.isdigit() and _pid_alive(int(pid)):
+                files[path] = int(pid)
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return files
+
+    def prune_exports(self):
+        """Remove export files left by processes that are no longer running"""
+        if self.export_dir:
+            self._export_files()
+
+    def collect(self):
+        """Merged snapshot of this worker plus the other live workers' exports"""
+        merged = self.snapshot()
+        if not self.export_dir:
+            return merged
+        own = self._export_path()
+        for path in self._export_files():
+            if path == own:
+                continue
+            try:
+                with open(path) as f:
+                    other = json.load(f)
+            except (OSError, ValueError):
+                continue
+            _merge_into(merged, other)
+        return merged
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        for name, metric in sorted(self.collect().items()):
+            lines.append(f'# HELP {name} {metric["help"]}')
+            lines.append(f'# TYPE {name} {metric["type"]}')
+            label_names = metric['labels']
+            for key, value in sorted(metric['samples'].items()):
+                label_values = json.loads(key)
+                if metric['type'] == 'histogram':
+                    counts, total, count = value
+                    cumulative = 0
+                    for bound, n in zip(metric['buckets'] + ['+Inf'], counts):
+                        cumulative += n
+                        le = bound if bound == '+Inf' else repr(float(bound))
+                        lines.append(f'{name}_bucket{_labels(label_names, label_values, le=le)} {cumulative}')
+                    lines.append(f'{name}_sum{_labels(label_names, label_values)} {total}')
+                    lines.append(f'{name}_count{_labels(label_names, label_values)} {count}')
+                else:
+                    lines.append(f'{name}{_labels(label_names, label_values)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _pid_alive(pid):
+    if os.name == 'nt':
+        return True  # os.kill would terminate the process; stale files are only removed at exit there
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # exists, owned by another user
+    return True
+
+
+def _merge_into(merged, other):
+    for name, metric in other.items():
+        target = merged.setdefault(name, dict(metric, samples={}))
+        samples = target['samples']
+        for key, value in metric['samples'].items():
+            if key not in samples:
+                samples[key] = value
+            elif metric['type'] == 'histogram':
+                mine = samples[key]
+                samples[key] = [[a + b for a, b in zip(mine[0], value[0])],
+                                mine[1] + value[1], mine[2] + value[2]]
+            else:
+                samples[key] = samples[key] + value
+
+
+def _labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ''
+    body = ','.join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return '{' + body + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    'face_pipeline_stage_seconds', 'Time spent in each face pipeline stage',
+    labels=('operation', 'stage'))
+request_seconds = registry.histogram(
+    'http_request_duration_seconds', 'Request latency by route',
+    labels=('endpoint', 'method', 'status'))
+request_queries = registry.histogram(
+    'http_request_db_queries', 'DB queries issued per request',
+    labels=('endpoint',), buckets=COUNT_BUCKETS)
+db_queries_total = registry.counter('db_queries_total', 'DB queries issued')
+errors_total = registry.counter(
+    'face_pipeline_errors_total', 'Unhandled errors in face/vote API handlers',
+    labels=('operation',))
+
+
+@contextmanager
+def operation(name):
+    """Label stage timings recorded inside the block with an operation name"""
+    token = _operation.set(name)
+    try:
+        yield
+    finally:
+        _operation.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage under the current operation"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        op = _operation.get() or 'other'
+        stage_seconds.observe(elapsed, operation=op, stage=name)
+        state = _request_state.get()
+        if state is not None:
+            state['stages'].append((op, name, elapsed))
+
+
+def record_error():
+    """Count an unhandled error against the current operation"""
+    errors_total.inc(operation=_operation.get() or 'other')
+
+
+def request_stages():
+    """Stage timings recorded so far in the current request: [(operation, stage, seconds)]"""
+    state = _request_state.get()
+    return list(state['stages']) if state is not None else []
+
+
+def server_timing(stages):
+    """Server-Timing header value for [(operation, stage, seconds)], summed per stage"""
+    totals = {}
+    for _, name, seconds in stages:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ', '.join(f'{name};dur={1000 * seconds:.2f}' for name, seconds in totals.items())
+
+
+@contextmanager
+def request_scope():
+    """Collect stage timings and query counts for one request outside Flask's hooks (app/asgi.py)"""
+    token = _request_state.set({'stages': [], 'queries': 0})
+    try:
+        yield
+    finally:
+        _request_state.reset(token)
+
+
+def _count_query(*args, **kwargs):
+    db_queries_total.inc()
+    state = _request_state.get()
+    if state is not None:
+        state['queries'] += 1
+
+
+def init_app(app):
+    """Install request hooks, the DB query counter and pool gauges"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    from flask import g, request
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from app import db
+
+    registry.export_dir = app.config.get('METRICS_DIR')
+    registry.export_interval = app.config.get('METRICS_EXPORT_INTERVAL', 5.0)
+    if registry.export_dir:
+        os.makedirs(registry.export_dir, exist_ok=True)
+        registry.prune_exports()
+        atexit.register(registry.remove_export)
+
+    if not event.contains(Engine, 'before_cursor_execute', _count_query):
+        event.listen(Engine, 'before_cursor_execute', _count_query)
+
+    def pool_stats(attr):
+        def read():
+            with app.app_context():
+                pool = db.engine.pool
+                fn = getattr(pool, attr, None)
+                return fn() if callable(fn) else 0
+        return read
+
+    registry.gauge('db_pool_checked_out', 'Connections checked out of the pool',
+                   callback=pool_stats('checkedout'))
+    registry.gauge('db_pool_size', 'Configured pool size', callback=pool_stats('size'))
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_start = time.perf_counter()
+        g._metrics_token = _request_state.set({'stages': [], 'queries': 0})
+
+    @app.after_request
+    def _metrics_finish(response):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            endpoint = request.endpoint or 'unmatched'
+            request_seconds.observe(time.perf_counter() - start, endpoint=endpoint,
+                                    method=request.method, status=response.status_code)
+            state = _request_state.get()
+            if state is not None:
+                request_queries.observe(state['queries'], endpoint=endpoint)
+                if app.config.get('METRICS_SERVER_TIMING') and state['stages']:
+                    response.headers['Server-Timing'] = server_timing(state['stages'])
+        registry.maybe_export()
+        return response
+
+    @app.teardown_request
+    def _metrics_reset(exc=None):
+        token = g.pop('_metrics_token', None)
+        if token is not None:
+            try:
+                _request_state.reset(token)
+            except ValueError:
+                _request_state.set(None)
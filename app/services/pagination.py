@@ -0,0 +1,81 @@
+"""
+Keyset pagination - stable, index-friendly paging for large listings
+Pages are addressed by an opaque cursor holding the sort key of the last row
+seen, so page N costs the same as page 1 (no OFFSET scans).
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+
+def encode_cursor(values):
+    """Opaque URL-safe cursor from a row's sort key values"""
+    payload = [{'dt': v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor. Returns None for a missing or malformed cursor."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list):
+            return None
+        return [_decode_value(v) for v in payload]
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return datetime.fromisoformat(value['dt'])
+    if value is not None and not isinstance(value, (str, int, float)):
+        raise ValueError(f'Unexpected cursor value {value!r}')
+    return value
+
+
+class Page:
+    """One page of results plus the cursor for the next page"""
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def keyset_page(query, columns, cursor=None, per_page=50, descending=False, key=None):
+    """
+    Fetch one page of `query` ordered by `columns` (which must end in a unique
+    column, e.g. the primary key). `key(row)` returns the sort key of a row.
+    """
+    after = decode_cursor(cursor)
+    if after is not None and len(after) == len(columns):
+        if descending:
+            query = query.filter(tuple_(*columns) < tuple_(*after))
+        else:
+            query = query.filter(tuple_(*columns) > tuple_(*after))
+    order = [c.desc() for c in columns] if descending else list(columns)
+    rows = query.order_by(*order).limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(key(rows[-1]))
+    return Page(rows, next_cursor)
+
+
+def prefix_range(column, prefix, lower=True):
+    """
+    Index-friendly prefix match (a range scan instead of LIKE). With lower=True
+    `column` should be a lower()-indexed expression and the match is case-insensitive.
+    """
+    if lower:
+        prefix = prefix.lower()
+    return column.between(prefix, prefix + '\uffff')
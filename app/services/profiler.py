@@ -0,0 +1,211 @@
+"""
+Request Profiler - opt-in capture of slow or sampled requests
+A sampled fraction of requests runs under cProfile; every in-flight request is
+stack-sampled by a background thread so requests that turn out slow (over
+PROFILER_SLOW_MS) can still be explained. Captures are written as JSON to a
+rotating directory together with route, user role and stage timings.
+
+Nothing is installed when PROFILER_ENABLED is off.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from app.services import metrics
+
+
+class StackSampler:
+    """Background thread sampling the stacks of registered request threads"""
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='request-stack-sampler', daemon=True)
+        self._thread.start()
+
+    def register(self, ident):
+        samples = Counter()
+        with self._lock:
+            self._active[ident] = samples
+        return samples
+
+    def unregister(self, ident):
+        with self._lock:
+            return self._active.pop(ident, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = list(self._active.items())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for ident, samples in active:
+                frame = frames.get(ident)
+                if frame is not None:
+                    samples[self._collapse(frame)] += 1
+
+    def _collapse(self, frame):
+        """Folded stack (root first) as used by flamegraph tools"""
+        parts = []
+        while frame is not None and len(parts) < self.max_depth:
+            code = frame.f_code
+            parts.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+            frame = frame.f_back
+        return ';'.join(reversed(parts))
+
+
+class RequestProfiler:
+    """Flask integration: decides what to profile and writes captures"""
+
+    def __init__(self):
+        self.capture_dir = None
+        self.sample_rate = 0.0
+        self.slow_seconds = 1.0
+        self.max_captures = 200
+        self.sampler = None
+
+    def init_app(self, app):
+        if not app.config.get('PROFILER_ENABLED'):
+            return
+        from flask import g, request
+        from flask_login import current_user
+
+        self.capture_dir = app.config['PROFILER_DIR']
+        self.sample_rate = app.config.get('PROFILER_SAMPLE_RATE', 0.0)
+        self.slow_seconds = app.config.get('PROFILER_SLOW_MS', 1000) / 1000.0
+        self.max_captures = app.config.get('PROFILER_MAX_CAPTURES', 200)
+        os.makedirs(self.capture_dir, exist_ok=True)
+        self.sampler = StackSampler(interval=app.config.get('PROFILER_STACK_INTERVAL_MS', 5) / 1000.0)
+        self.sampler.start()
+
+        @app.before_request
+        def _profiler_start():
+            g._profile_start = time.perf_counter()
+            g._profile_stacks = self.sampler.register(threading.get_ident())
+            if self.sample_rate and random.random() < self.sample_rate:
+                profile = cProfile.Profile()
+                try:
+                    profile.enable()
+                    g._profile = profile
+                except ValueError:
+                    # Another profiler is already active on this thread
+                    pass
+
+        @app.after_request
+        def _profiler_status(response):
+            g._profile_status = response.status_code
+            return response
+
+        @app.teardown_request
+        def _profiler_finish(exc=None):
+            start = g.pop('_profile_start', None)
+            if start is None:
+                return
+            duration = time.perf_counter() - start
+            profile = g.pop('_profile', None)
+            if profile is not None:
+                profile.disable()
+            stacks = self.sampler.unregister(threading.get_ident())
+            g.pop('_profile_stacks', None)
+            if profile is None and duration < self.slow_seconds:
+                return
+            user = current_user if current_user and current_user.is_authenticated else None
+            self.write_capture({
+                'reason': 'sampled' if profile is not None else 'slow',
+                'endpoint': request.endpoint or 'unmatched',
+                'path': request.path,
+                'method': request.method,
+                'status': g.pop('_profile_status', 500 if exc else None),
+                'role': user.role if user else 'anonymous',
+                'user_id': user.id if user else None,
+                'duration_ms': round(duration * 1000, 2),
+                'stages': [
+                    {'operation': op, 'stage': name, 'ms': round(sec * 1000, 3)}
+                    for op, name, sec in metrics.request_stages()
+                ],
+                'profile': _format_profile(profile) if profile is not None else None,
+                'stacks': (stacks or Counter()).most_common(50),
+            })
+
+    # -- capture storage -----------------------------------------------------
+
+    def write_capture(self, capture):
+        capture['captured_at'] = time.time()
+        name = '{:.0f}-{}-{:.0f}ms.json'.format(
+            capture['captured_at'] * 1000, capture['endpoint'].replace('.', '_'), capture['duration_ms'])
+        try:
+            with open(os.path.join(self.capture_dir, name), 'w') as f:
+                json.dump(capture, f)
+            self._rotate()
+        except OSError:
+            pass
+
+    def _rotate(self):
+        files = sorted(_capture_files(self.capture_dir))
+        for old in files[:max(0, len(files) - self.max_captures)]:
+            try:
+                os.remove(os.path.join(self.capture_dir, old))
+            except OSError:
+                pass
+
+
+def _capture_files(capture_dir):
+    try:
+        return [f for f in os.listdir(capture_dir) if f.endswith('.json')]
+    except OSError:
+        return []
+
+
+def _format_profile(profile, limit=40):
+    out = io.StringIO()
+    stats = pstats.Stats(profile, stream=out)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
+
+
+def list_captures(capture_dir, limit=50):
+    """Captured requests, slowest first (without the bulky profile/stack data)"""
+    captures = []
+    for name in _capture_files(capture_dir):
+        try:
+            with open(os.path.join(capture_dir, name)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        data.pop('profile', None)
+        data.pop('stacks', None)
+        data['name'] = name
+        data['captured'] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(data.get('captured_at', 0)))
+        captures.append(data)
+    captures.sort(key=lambda c: c.get('duration_ms') or 0, reverse=True)
+    return captures[:limit]
+
+
+def load_capture(capture_dir, name):
+    """Load one capture by file name (None if missing or not a capture file)"""
+    if os.path.basename(name) != name or name not in _capture_files(capture_dir):
+        return None
+    try:
+        with open(os.path.join(capture_dir, name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+profiler = RequestProfiler()
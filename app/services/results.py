@@ -0,0 +1,128 @@
+"""
+Election Results - immutable snapshots of completed elections
+Once an election has ended its results are materialized into a single row
+(counts, percentages, turnout and a SHA-256 checksum over the ballots), so
+results pages stop re-aggregating the votes table. Rendered pages are kept in
+a small in-process LRU keyed by the snapshot's ETag.
+
+A snapshot is final, so it is only taken SCHEDULER_CLOSE_GRACE_SECONDS after
+end_date, when no in-flight vote can still commit: by the lifecycle close hook,
+or by the first view or script run after that. Until then results pages
+tabulate the votes live.
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.election import ElectionResultSnapshot, Vote
+from app.models.user import User
+from app.services import tenancy
+from app.services.export import tally_rows
+from app.services.lru import LRUCache
+from app.services.tabulation import tabulate_election
+
+
+def ballot_checksum(election_id, chunk_size=1000):
+    """SHA-256 over every ballot (vote id, candidate, voter, time, rankings) in vote id order"""
+    digest = hashlib.sha256()
+    stmt = (
+        select(Vote.id, Vote.candidate_id, Vote.user_id, Vote.voted_at, Vote.rankings)
+        .where(Vote.election_id == election_id)
+        .order_by(Vote.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    result = db.session.execute(stmt)
+    try:
+        for partition in result.partitions():
+            digest.update(''.join(
+                f'{vid},{cid},{uid},{voted.isoformat() if voted else ""}'
+                + (f',{rankings.hex()}\n' if rankings else '\n')
+                for vid, cid, uid, voted, rankings in partition
+            ).encode('utf-8'))
+    finally:
+        result.close()
+    return digest.hexdigest()
+
+
+def build_snapshot(election):
+    """Aggregate an election's results into a new (unsaved) snapshot"""
+    rows = tally_rows(election)
+    eligible = db.session.query(User.id).filter(User.role == 'student', User.is_active.is_(True)).count()
+    return ElectionResultSnapshot(
+        election_id=election.id,
+        total_votes=sum(votes for _, _, votes, _ in rows),
+        eligible_voters=eligible,
+        results_json=json.dumps([
+            {'candidate_user_id': uid, 'name': name, 'votes': votes, 'percentage': pct}
+            for uid, name, votes, pct in rows
+        ]),
+        ballot_checksum=ballot_checksum(election.id),
+        rounds_json=json.dumps(tabulate_election(election)) if needs_tabulation(election) else None,
+    )
+
+
+def needs_tabulation(election):
+    """Ranked and multi-seat elections are decided by the tabulation engine, not raw counts"""
+    return election.is_ranked or (election.seats or 1) > 1
+
+
+def is_settled(election, now=None):
+    """True once a closed election is past its close grace period, so its ballots can no longer change"""
+    from flask import current_app
+    if not election.is_completed:
+        return False
+    grace = timedelta(seconds=current_app.config.get('SCHEDULER_CLOSE_GRACE_SECONDS', 5))
+    return election.end_date + grace <= (now or datetime.utcnow())
+
+
+def get_snapshot(election, create=True):
+    """Stored snapshot for a completed election, materializing it on first use once settled"""
+    if not election.is_completed:
+        return None
+    snapshot = ElectionResultSnapshot.query.filter_by(election_id=election.id).first()
+    if snapshot is not None or not create or not is_settled(election):
+        return snapshot
+    snapshot = build_snapshot(election)
+    db.session.add(snapshot)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker materialized it first
+        db.session.rollback()
+        snapshot = ElectionResultSnapshot.query.filter_by(election_id=election.id).first()
+    return snapshot
+
+
+def regenerate_snapshot(election):
+    """Replace any stored snapshot with a freshly aggregated one"""
+    ElectionResultSnapshot.query.filter_by(election_id=election.id).delete()
+    snapshot = build_snapshot(election)
+    db.session.add(snapshot)
+    db.session.commit()
+    return snapshot
+
+
+def verify_snapshot(snapshot):
+    """True if the ballots still hash to the stored checksum"""
+    return ballot_checksum(snapshot.election_id) == snapshot.ballot_checksum
+
+
+def snapshot_etag(snapshot, *vary):
+    """Strong ETag for a snapshot, varied by anything else the response depends on"""
+    parts = [tenancy.current_tenant(), snapshot.ballot_checksum, str(snapshot.id), snapshot.created_at.isoformat()]
+    parts += [str(v) for v in vary]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()[:32]
+
+
+class RenderedCache(LRUCache):
+    """Thread-safe LRU of rendered pages keyed by ETag"""
+
+    def __init__(self, max_entries=128):
+        super().__init__(max_entries)
+
+
+rendered_pages = RenderedCache()
@@ -0,0 +1,252 @@
+"""
+Turnout Rollups - incremental analytics counters for the turnout dashboards
+Each vote upserts a (election, time bucket, department) counter inside the
+vote's own transaction, so rollups can never disagree with the votes table.
+Face verification outcomes are buffered in memory per election and flushed
+every ROLLUP_FLUSH_INTERVAL seconds, keeping verification requests write-free.
+Dashboards read only these small tables; backfill() rebuilds them from votes.
+"""
+import atexit
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select, update
+
+from app import db
+from app.models.election import Vote
+from app.models.rollup import VoteRollup, VerificationRollup
+from app.models.user import User
+from app.services import metrics, tenancy
+
+EPOCH = datetime(1970, 1, 1)
+BUCKET_SECONDS = 300
+
+
+def bucket_start(moment, seconds=None):
+    """Start of the time bucket containing `moment` (naive UTC)"""
+    seconds = seconds or BUCKET_SECONDS
+    offset = int((moment - EPOCH).total_seconds()) // seconds * seconds
+    return EPOCH + timedelta(seconds=offset)
+
+
+def upsert_increment(conn, model, keys, increments):
+    """INSERT the row or add `increments` to the existing one, atomically where the dialect allows"""
+    table = model.__table__
+    dialect = (conn.get_bind() if hasattr(conn, 'get_bind') else conn).dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table).values(**keys, **increments)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={c: table.c[c] + stmt.excluded[c] for c in increments},
+        )
+        conn.execute(stmt)
+        return
+    if dialect in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(table).values(**keys, **increments)
+        conn.execute(stmt.on_duplicate_key_update({c: table.c[c] + stmt.inserted[c] for c in increments}))
+        return
+    where = [table.c[k] == v for k, v in keys.items()]
+    result = conn.execute(update(table).where(*where).values({c: table.c[c] + v for c, v in increments.items()}))
+    if result.rowcount == 0:
+        conn.execute(insert(table).values(**keys, **increments))
+
+
+def record_vote(election_id, department, voted_at):
+    """Count one vote; call inside the transaction that inserts the Vote"""
+    upsert_increment(db.session, VoteRollup,
+                     {'election_id': election_id, 'bucket_start': bucket_start(voted_at),
+                      'department': department or ''},
+                     {'votes': 1})
+
+
+class VerificationCounters:
+    """Thread-safe in-memory buffer of verification outcomes, flushed in batches"""
+
+    OUTCOMES = ('verified', 'mismatch', 'no_face')
+
+    def __init__(self, flush_interval=10.0):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = time.monotonic()
+
+    def record(self, operation, outcome, department=None, election_id=None):
+        key = (tenancy.current_tenant(), election_id or 0, bucket_start(datetime.utcnow()), operation,
+               department or '')
+        with self._lock:
+            counts = self._pending.setdefault(key, [0, 0, 0])
+            counts[0] += 1
+            if outcome == 'mismatch':
+                counts[1] += 1
+            elif outcome == 'no_face':
+                counts[2] += 1
+
+    @property
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    @property
+    def flush_due(self):
+        return time.monotonic() - self._last_flush >= self.flush_interval
+
+    def maybe_flush(self):
+        if self.flush_due:
+            self.flush()
+
+    def flush(self):
+        """Write buffered counters on a separate connection per tenant (never the request's session)"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        by_tenant = {}
+        for key, counts in pending.items():
+            by_tenant.setdefault(key[0], {})[key] = counts
+        for tenant, tenant_pending in by_tenant.items():
+            try:
+                with tenancy.engine(tenant).begin() as conn:
+                    for key, (attempts, failures, no_face) in tenant_pending.items():
+                        _, election_id, bucket, operation, department = key
+                        upsert_increment(conn, VerificationRollup,
+                                         {'election_id': election_id, 'bucket_start': bucket,
+                                          'operation': operation, 'department': department},
+                                         {'attempts': attempts, 'failures': failures, 'no_face': no_face})
+            except Exception:
+                # Keep the counts for the next attempt rather than losing them
+                with self._lock:
+                    for key, counts in tenant_pending.items():
+                        merged = self._pending.setdefault(key, [0, 0, 0])
+                        for i, value in enumerate(counts):
+                            merged[i] += value
+                metrics.record_error()
+
+
+verifications = VerificationCounters()
+
+
+def init_app(app):
+    """Configure bucketing and flush buffered verification counters after requests and at exit"""
+    global BUCKET_SECONDS
+    BUCKET_SECONDS = app.config.get('ROLLUP_BUCKET_SECONDS', 300)
+    verifications.flush_interval = app.config.get('ROLLUP_FLUSH_INTERVAL', 10.0)
+    metrics.registry.gauge('rollup_pending_verification_keys',
+                           'Verification counter keys buffered in memory', callback=lambda: verifications.pending)
+
+    @app.after_request
+    def _flush_verifications(response):
+        verifications.maybe_flush()
+        return response
+
+    def _flush_at_exit():
+        with app.app_context():
+            verifications.flush()
+
+    atexit.register(_flush_at_exit)
+
+
+def ensure_backfilled():
+    """Backfill once if votes exist but the rollup table is still empty (e.g. after an upgrade)"""
+    has_rollups = db.session.query(select(VoteRollup.election_id).limit(1).exists()).scalar()
+    has_votes = db.session.query(select(Vote.id).limit(1).exists()).scalar()
+    if has_votes and not has_rollups:
+        backfill()
+
+
+def backfill(election_id=None, chunk_size=5000):
+    """Rebuild vote rollups from the votes table (one election or all). Returns rows written."""
+    counts = Counter()
+    stmt = (
+        select(Vote.election_id, Vote.voted_at, User.department)
+        .join(User, User.id == Vote.user_id)
+        .execution_options(yield_per=chunk_size)
+    )
+    if election_id is not None:
+        stmt = stmt.where(Vote.election_id == election_id)
+    result = db.session.execute(stmt)
+    try:
+        for partition in result.partitions():
+            counts.update(
+                (eid, bucket_start(voted_at or EPOCH), department or '')
+                for eid, voted_at, department in partition
+            )
+    finally:
+        result.close()
+
+    clear = delete(VoteRollup)
+    if election_id is not None:
+        clear = clear.where(VoteRollup.election_id == election_id)
+    db.session.execute(clear)
+    rows = [{'election_id': eid, 'bucket_start': bucket, 'department': dept, 'votes': votes}
+            for (eid, bucket, dept), votes in counts.items()]
+    for i in range(0, len(rows), chunk_size):
+        db.session.execute(insert(VoteRollup), rows[i:i + chunk_size])
+    db.session.commit()
+    return len(rows)
+
+
+# --- Dashboard queries (rollup tables only, plus one grouped count of students) ---
+
+def vote_totals(election_ids=None):
+    """{election_id: votes}"""
+    query = db.session.query(VoteRollup.election_id, func.sum(VoteRollup.votes)).group_by(VoteRollup.election_id)
+    if election_ids is not None:
+        query = query.filter(VoteRollup.election_id.in_(election_ids))
+    return {eid: int(total) for eid, total in query}
+
+
+def votes_over_time(election_id):
+    """[(bucket_start, votes)] in time order"""
+    return [
+        (bucket, int(votes)) for bucket, votes in
+        db.session.query(VoteRollup.bucket_start, func.sum(VoteRollup.votes))
+        .filter(VoteRollup.election_id == election_id)
+        .group_by(VoteRollup.bucket_start)
+        .order_by(VoteRollup.bucket_start)
+    ]
+
+
+def eligible_by_department():
+    """{department: active students}"""
+    return {
+        dept or '': count for dept, count in
+        db.session.query(User.department, func.count(User.id))
+        .filter(User.role == 'student', User.is_active.is_(True))
+        .group_by(User.department)
+    }
+
+
+def turnout_by_department(election_id):
+    """[{department, votes, eligible, turnout}] sorted by department"""
+    votes = dict(
+        db.session.query(VoteRollup.department, func.sum(VoteRollup.votes))
+        .filter(VoteRollup.election_id == election_id)
+        .group_by(VoteRollup.department)
+    )
+    eligible = eligible_by_department()
+    rows = []
+    for dept in sorted(set(votes) | set(eligible)):
+        cast, total = int(votes.get(dept, 0)), eligible.get(dept, 0)
+        rows.append({'department': dept or 'Unassigned', 'votes': cast, 'eligible': total,
+                     'turnout': round(100.0 * cast / total, 1) if total else None})
+    return rows
+
+
+def verification_over_time(election_id):
+    """[(bucket_start, attempts, failures, no_face)] of one election, across operations and departments"""
+    query = db.session.query(
+        VerificationRollup.bucket_start,
+        func.sum(VerificationRollup.attempts),
+        func.sum(VerificationRollup.failures),
+        func.sum(VerificationRollup.no_face),
+    ).filter(VerificationRollup.election_id == election_id)
+    return [
+        (bucket, int(a), int(f), int(n)) for bucket, a, f, n in
+        query.group_by(VerificationRollup.bucket_start).order_by(VerificationRollup.bucket_start)
+    ]
@@ -0,0 +1,214 @@
+"""
+Tabulation Engine - plurality, instant-runoff (IRV) and single transferable vote (STV)
+Ballots are loaded into an (n_ballots x n_ranks) int32 matrix of candidate
+column indexes (-1 = no preference). Each round finds every ballot's highest
+continuing preference with a handful of array operations, so the cost per
+round is O(ballots x ranks) in NumPy rather than a Python loop per ballot.
+
+STV uses the Droop quota with inclusive Gregory surplus transfers: when a
+candidate is elected, every ballot currently counting for them continues at
+weight * surplus / tally. IRV is the single-seat case with a majority of the
+continuing ballots as the threshold.
+"""
+import math
+
+import numpy as np
+from sqlalchemy import select
+
+from app import db
+from app.models.election import Candidate, Vote, RANKING_DTYPE
+from app.models.user import User
+
+
+class Tabulation:
+    """Outcome of a count: elected candidates plus a round-by-round record"""
+
+    def __init__(self, method, seats, candidate_ids, total_ballots):
+        self.method = method
+        self.seats = seats
+        self.candidate_ids = candidate_ids
+        self.total_ballots = total_ballots
+        self.quota = None
+        self.elected = []  # candidate column indexes in order of election
+        self.rounds = []
+
+    def to_dict(self, names=None):
+        """JSON-ready form with candidate ids (and names when given)"""
+        names = names or {}
+
+        def ref(index):
+            cid = self.candidate_ids[index]
+            return {'candidate_id': cid, 'name': names.get(cid, '')}
+
+        return {
+            'method': self.method,
+            'seats': self.seats,
+            'quota': self.quota,
+            'total_ballots': self.total_ballots,
+            'elected': [ref(i) for i in self.elected],
+            'rounds': [
+                {
+                    'round': r['round'],
+                    'quota': r['quota'],
+                    'exhausted': r['exhausted'],
+                    'tally': [dict(ref(i), votes=v) for i, v in r['tally']],
+                    'elected': [ref(i) for i in r['elected']],
+                    'eliminated': [ref(i) for i in r['eliminated']],
+                }
+                for r in self.rounds
+            ],
+        }
+
+
+def tabulate(matrix, n_candidates, seats=1, method='irv'):
+    """
+    Count a ballot matrix. `matrix[i, r]` is the column index (0..n_candidates-1)
+    of ballot i's r-th preference, or -1. Returns a Tabulation whose
+    candidate_ids are the column indexes themselves.
+    """
+    matrix = np.asarray(matrix, dtype=np.int32)
+    if matrix.ndim != 2:
+        matrix = matrix.reshape(-1, 1)
+    result = Tabulation(method, seats, list(range(n_candidates)), int(matrix.shape[0]))
+    if n_candidates == 0 or matrix.shape[0] == 0:
+        return result
+    valid = matrix >= 0
+    safe = np.where(valid, matrix, 0)
+
+    if method == 'plurality':
+        first = valid[:, 0]
+        tally = np.bincount(safe[first, 0], minlength=n_candidates).astype(float)
+        order = np.lexsort((np.arange(n_candidates), -tally))
+        result.elected = [int(i) for i in order[:seats] if tally[i] > 0]
+        result.rounds.append(_round(1, tally, np.ones(n_candidates, bool), None,
+                                    float((~first).sum()), result.elected, []))
+        return result
+
+    rows = np.arange(matrix.shape[0])
+    weights = np.ones(matrix.shape[0])
+    hopeful = np.ones(n_candidates, dtype=bool)
+    history = []
+    if method == 'stv':
+        result.quota = math.floor(int(valid.any(axis=1).sum()) / (seats + 1)) + 1
+
+    while len(result.elected) < seats and hopeful.any():
+        standing = hopeful.copy()
+        # Highest-ranked preference on each ballot that is still in the count
+        live = valid & hopeful[safe]
+        counting = live.any(axis=1)
+        top = safe[rows, live.argmax(axis=1)]
+        tally = np.bincount(top[counting], weights=weights[counting], minlength=n_candidates)
+        history.append(tally)
+        quota = result.quota if method == 'stv' else math.floor(weights[counting].sum() / 2) + 1
+        exhausted = float(weights[~counting].sum())
+        candidates = np.flatnonzero(hopeful)
+        remaining = seats - len(result.elected)
+
+        if candidates.size <= remaining:
+            # As many seats left as candidates: the rest are elected in tally order
+            winners = sorted(candidates.tolist(), key=lambda i: (-tally[i], i))
+            result.elected.extend(winners)
+            result.rounds.append(_round(len(history), tally, standing, quota, exhausted, winners, []))
+            break
+
+        reached = candidates[tally[candidates] >= quota]
+        if reached.size:
+            winner = int(reached[np.argmax(tally[reached])])
+            hopeful[winner] = False
+            result.elected.append(winner)
+            if tally[winner] > 0 and method == 'stv':
+                at_winner = counting & (top == winner)
+                weights[at_winner] *= (tally[winner] - quota) / tally[winner]
+            result.rounds.append(_round(len(history), tally, standing, quota, exhausted, [winner], []))
+        else:
+            loser = _lowest(candidates, history)
+            hopeful[loser] = False
+            result.rounds.append(_round(len(history), tally, standing, quota, exhausted, [], [loser]))
+    return result
+
+
+def _lowest(candidates, history):
+    """Candidate to eliminate: lowest tally, ties broken by earlier rounds, then the later nominee"""
+    tied = candidates[history[-1][candidates] == history[-1][candidates].min()]
+    for tally in reversed(history[:-1]):
+        if tied.size == 1:
+            break
+        tied = tied[tally[tied] == tally[tied].min()]
+    return int(tied.max())
+
+
+def _round(number, tally, mask, quota, exhausted, elected, eliminated):
+    shown = np.flatnonzero(mask)
+    order = sorted(shown.tolist(), key=lambda i: (-tally[i], i))
+    return {
+        'round': number,
+        'quota': quota,
+        'exhausted': round(exhausted, 4),
+        'tally': [(i, round(float(tally[i]), 4)) for i in order],
+        'elected': [int(i) for i in elected],
+        'eliminated': [int(i) for i in eliminated],
+    }
+
+
+def load_ballots(election, chunk_size=5000):
+    """
+    Ballot matrix for an election, streamed from the votes table.
+    Returns (candidate_ids, matrix) where matrix columns index candidate_ids.
+    """
+    candidate_ids = np.array(
+        [cid for (cid,) in db.session.query(Candidate.id)
+         .filter(Candidate.election_id == election.id, Candidate.status == 'approved')
+         .order_by(Candidate.id)],
+        dtype=np.int64,
+    )
+    width = max(1, len(candidate_ids))
+    chunks = []
+    stmt = (
+        select(Vote.candidate_id, Vote.rankings)
+        .where(Vote.election_id == election.id)
+        .order_by(Vote.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    result = db.session.execute(stmt)
+    try:
+        for partition in result.partitions():
+            chunks.append(_ballot_rows(partition, candidate_ids, width))
+    finally:
+        result.close()
+    matrix = np.concatenate(chunks) if chunks else np.empty((0, width), dtype=np.int32)
+    return candidate_ids.tolist(), matrix
+
+
+def _ballot_rows(partition, candidate_ids, width):
+    """Unpack one chunk of (candidate_id, rankings) rows into matrix rows"""
+    itemsize = RANKING_DTYPE.itemsize
+    packed = [r if r else int(cid).to_bytes(itemsize, 'little') for cid, r in partition]
+    lengths = np.fromiter((len(p) // itemsize for p in packed), dtype=np.int64, count=len(packed))
+    flat = np.frombuffer(b''.join(packed), dtype=RANKING_DTYPE).astype(np.int64)
+    rows = np.repeat(np.arange(len(packed)), lengths)
+    cols = np.arange(flat.size) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    # Map candidate ids to column indexes; unknown or unapproved candidates become -1
+    if len(candidate_ids):
+        pos = np.minimum(np.searchsorted(candidate_ids, flat), len(candidate_ids) - 1)
+        index = np.where(candidate_ids[pos] == flat, pos, -1)
+    else:
+        index = np.full(flat.size, -1)
+    keep = cols < width
+    out = np.full((len(packed), width), -1, dtype=np.int32)
+    out[rows[keep], cols[keep]] = index[keep]
+    return out
+
+
+def tabulate_election(election):
+    """Count an election by its ballot type. Returns the JSON-ready result dict."""
+    candidate_ids, matrix = load_ballots(election)
+    method = election.ballot_type if election.ballot_type in ('irv', 'stv') else 'plurality'
+    seats = 1 if method == 'irv' else max(1, election.seats or 1)
+    counted = tabulate(matrix, len(candidate_ids), seats=seats, method=method)
+    counted.candidate_ids = candidate_ids
+    names = dict(
+        db.session.query(Candidate.id, User.name)
+        .join(User, User.id == Candidate.user_id)
+        .filter(Candidate.election_id == election.id)
+    )
+    return counted.to_dict(names)
@@ -0,0 +1,153 @@
+"""
+Tenancy - one database and encoding namespace per college
+A multi-college deployment lists its colleges in TENANT_DATABASES
+({tenant: database URI}); the default tenant stays on SQLALCHEMY_DATABASE_URI.
+Each tenant database holds the full schema for that college's users and
+elections, so an election rush at one college only locks its own SQLite file.
+
+A request's tenant comes from its host (TENANT_HOSTS) or else from the session
+(chosen at login). db.session is a RoutingSession that sends every statement
+to the current tenant's engine, so models and queries are unchanged.
+Background work (scheduler, buffered rollup and audit writes) loops over the
+tenants or carries the tenant with each buffered item.
+
+Row ids are only unique within one tenant database, so anything cached in
+process memory by id is keyed by tenant as well.
+"""
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from flask_sqlalchemy.session import Session
+
+DEFAULT_TENANT = 'default'
+
+_current = contextvars.ContextVar('tenant', default=None)
+
+log = logging.getLogger(__name__)
+
+
+def bind_key(tenant):
+    return f'tenant:{tenant}'
+
+
+def configure_binds(config):
+    """Register every tenant database as a Flask-SQLAlchemy bind (before db.init_app)"""
+    binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+    for tenant, uri in (config.get('TENANT_DATABASES') or {}).items():
+        if tenant != DEFAULT_TENANT:
+            binds[bind_key(tenant)] = uri
+    config['SQLALCHEMY_BINDS'] = binds
+
+
+def tenant_names(config):
+    """Every tenant, default first"""
+    return [DEFAULT_TENANT] + sorted(t for t in (config.get('TENANT_DATABASES') or {}) if t != DEFAULT_TENANT)
+
+
+def current_tenant():
+    return _current.get() or DEFAULT_TENANT
+
+
+@contextmanager
+def use_tenant(tenant):
+    """Route db.session (and tenant-keyed caches) to `tenant` inside the block"""
+    token = _current.set(tenant)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def engine(tenant=None):
+    """Engine of a tenant (the current one by default); needs an app context"""
+    from app import db
+    tenant = tenant or current_tenant()
+    if tenant == DEFAULT_TENANT:
+        return db.engine
+    try:
+        return db.engines[bind_key(tenant)]
+    except KeyError:
+        raise ValueError(f'Unknown tenant: {tenant}')
+
+
+class RoutingSession(Session):
+    """db.session class: statements go to the current tenant's engine"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            tenant = _current.get()
+            if tenant is not None and tenant != DEFAULT_TENANT:
+                try:
+                    return self._db.engines[bind_key(tenant)]
+                except KeyError:
+                    raise ValueError(f'Unknown tenant: {tenant}')
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def host_tenant(config, host):
+    """Tenant mapped to a request host in TENANT_HOSTS, or None"""
+    hosts = config.get('TENANT_HOSTS') or {}
+    return hosts.get((host or '').split(':')[0].lower())
+
+
+def resolve(config, host=None, session_tenant=None):
+    """Tenant of a request: its host if mapped, else the one chosen at login, else the default"""
+    tenant = host_tenant(config, host)
+    if tenant is not None:
+        return tenant
+    if session_tenant and session_tenant in tenant_names(config):
+        return session_tenant
+    return DEFAULT_TENANT
+
+
+def session_matches(session_tenant, tenant):
+    """A login only counts for the tenant it was made in (user ids differ per tenant)"""
+    return (session_tenant or DEFAULT_TENANT) == tenant
+
+
+def fan_out(app, fn, tenants=None, workers=8):
+    """
+    {tenant: fn()} with fn run against each tenant database in parallel, each in
+    its own app context. A tenant whose query fails maps to None (and is logged).
+    """
+    from app import db
+    from app.services import metrics
+    tenants = tenants or tenant_names(app.config)
+
+    def run(tenant):
+        with app.app_context(), use_tenant(tenant):
+            try:
+                return fn()
+            except Exception:
+                metrics.record_error()
+                log.exception('Fan-out query failed for tenant %s', tenant)
+                return None
+            finally:
+                db.session.remove()
+
+    with ThreadPoolExecutor(max_workers=max(1, min(len(tenants), workers))) as pool:
+        return dict(zip(tenants, pool.map(run, tenants)))
+
+
+def init_app(app):
+    """Select the tenant for each request (registered first, so user loading sees it)"""
+    from flask import g, request, session
+
+    @app.before_request
+    def _select_tenant():
+        g._tenant_token = _current.set(resolve(app.config, request.host, session.get('tenant')))
+
+    @app.teardown_request
+    def _reset_tenant(exc=None):
+        token = g.pop('_tenant_token', None)
+        if token is not None:
+            try:
+                _current.reset(token)
+            except ValueError:
+                _current.set(None)
+
+    @app.context_processor
+    def _tenant_context():
+        return {'current_tenant': current_tenant(), 'tenants': tenant_names(app.config)}
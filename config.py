@@ -15,10 +15,128 @@ class Config:
     FACE_ENCODINGS_FOLDER = os.path.join(os.path.dirname(__file__), 'face_encodings')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload
     
+    # Face encoding storage: local (FACE_ENCODINGS_FOLDER), db (face_encodings table) or object (S3 API)
+    FACE_STORAGE_BACKEND = os.environ.get('FACE_STORAGE_BACKEND', 'local')
+    FACE_STORAGE_BUCKET = os.environ.get('FACE_STORAGE_BUCKET', 'voting')
+    FACE_STORAGE_PREFIX = os.environ.get('FACE_STORAGE_PREFIX', 'face-encodings')
+    FACE_STORAGE_ENDPOINT = os.environ.get('FACE_STORAGE_ENDPOINT')  # e.g. MinIO URL; None = AWS
+    FACE_STORAGE_OBJECT_ROOT = os.environ.get('FACE_STORAGE_OBJECT_ROOT')  # directory stand-in instead of boto3
+    FACE_ENCODING_CACHE_SIZE = 10000  # decoded encodings kept per process (~1 KB each)
+    # Resubmitted frames: per-user cache of encodings keyed by a hash of the uploaded bytes
+    FACE_FRAME_CACHE_ENABLED = os.environ.get('FACE_FRAME_CACHE_ENABLED', '1') == '1'
+    FACE_FRAME_CACHE_SIZE = 2048
+    FACE_FRAME_CACHE_TTL = 120.0  # seconds
+    FACE_FRAME_CACHE_PERCEPTUAL = False  # also match re-compressed copies by 64-bit dHash
+    FACE_FRAME_CACHE_MAX_DISTANCE = 2  # dHash bits that may differ for a perceptual hit
+    
+    ADMIN_PAGE_SIZE = 50  # rows per page in admin student/candidate listings
+    BULK_IMPORT_BATCH_SIZE = 500  # rows per insert transaction
+    BULK_IMPORT_WORKERS = None  # bcrypt hashing threads (None = CPU count)
+    BULK_IMPORT_MAX_WEB_ROWS = 200  # admin upload limit; larger intakes go through scripts/import_students.py
+    EXPORT_CHUNK_SIZE = 1000  # rows fetched per server-side cursor round trip
+    
+    # Dashboard fragments (election lists, candidate tables) cached per process by election version
+    FRAGMENT_CACHE_ENABLED = os.environ.get('FRAGMENT_CACHE_ENABLED', '1') == '1'
+    FRAGMENT_CACHE_SIZE = 512
+    # On-the-fly compression of large responses (brotli needs the optional brotli package)
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', '1') == '1'
+    COMPRESS_MIN_SIZE = 1024  # bytes; smaller bodies are not worth the CPU
+    COMPRESS_MIMETYPES = ('text/html', 'application/json', 'text/plain', 'text/css', 'application/javascript')
+    COMPRESS_ENCODINGS = ('br', 'gzip')  # in order of preference
+    COMPRESS_LEVEL = 6  # gzip
+    COMPRESS_BROTLI_QUALITY = 4  # 0-11; low levels are fast enough for per-request use
+    STATIC_MAX_AGE = 365 * 24 * 3600  # seconds; static URLs carry ?v=<mtime> so changes still show
+    
     # Face recognition settings
     FACE_MATCH_THRESHOLD = 0.6  # Lower = stricter match
     FACE_ENCODING_TOLERANCE = 0.5
 
+    # Face detector backend: 'hog' (dlib, accurate) or 'haar' (OpenCV cascade, fast)
+    FACE_DETECTOR_BACKEND = os.environ.get('FACE_DETECTOR_BACKEND', 'hog')
+    FACE_HOG_UPSAMPLE = 1  # verify/vote path; each doubling costs ~4x detection time
+    FACE_HOG_REGISTER_UPSAMPLE = 2  # registration only, to find faces further from the camera
+    # Bundled cascade name (cv2.data.haarcascades) or absolute path, e.g. an LBP cascade
+    FACE_CASCADE_FILE = os.environ.get('FACE_CASCADE_FILE', 'haarcascade_frontalface_default.xml')
+    FACE_CASCADE_SCALE_FACTOR = 1.1  # image pyramid step; larger is faster but misses more faces
+    FACE_CASCADE_MIN_NEIGHBORS = 5
+    FACE_CASCADE_MIN_SIZE = 60
+
+    # Face encoding profiles: num_jitters re-samples the face N times (N x CPU),
+    # model 'large' uses the 68-point landmark model instead of the 5-point one.
+    # Compare them with: python -m scripts.benchmark_encoding LABELLED_DIR
+    FACE_ENCODING_PROFILES = {
+        'fast': {'num_jitters': 1, 'model': 'small'},
+        'balanced': {'num_jitters': 2, 'model': 'small'},
+        'accurate': {'num_jitters': 5, 'model': 'large'},
+    }
+    FACE_ENCODING_PROFILE = os.environ.get('FACE_ENCODING_PROFILE', 'balanced')
+
+    # Metrics (/metrics, Prometheus text format)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    # Scrapers send "Authorization: Bearer <token>"; without a token only admins can read /metrics
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Shared directory for multi-worker deployments (each worker dumps its state here)
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_EXPORT_INTERVAL = 5.0
+    # Send each face/vote request's stage timings in a Server-Timing header (load tests, debugging).
+    # Off by default: it shows clients how long detection and encoding took.
+    METRICS_SERVER_TIMING = os.environ.get('METRICS_SERVER_TIMING', '0') == '1'
+
+    # Admission control for face endpoints: concurrency limit + FIFO waiting room
+    # Off by default. Admission state is in process memory, so enabling it means serving with ONE worker
+    # process (threads or the ASGI app for concurrency); startup then fails if WEB_CONCURRENCY or
+    # --workers/-w asks for more.
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', '0') == '1'
+    ADMISSION_MAX_CONCURRENT = None  # encodes running at once per process (None = CPU count)
+    ADMISSION_RESERVATION_SECONDS = 15.0  # how long an admitted ticket holds its slot
+    ADMISSION_TICKET_TTL = 30.0  # drop queued tickets not polled for this long
+    ADMISSION_USER_RATE = 0.5  # new attempts per second per user (token bucket)
+    ADMISSION_USER_BURST = 5
+    ADMISSION_IP_RATE = 20.0  # per client IP; campus NAT puts many students behind one address
+    ADMISSION_IP_BURST = 100
+
+    # Async face/vote API (uvicorn app.asgi:application)
+    FACE_ASYNC_ENCODE_WORKERS = None  # encode threads = CPU parallelism (None = CPU count)
+    FACE_ASYNC_DB_WORKERS = 16  # threads running database steps
+    FACE_ASYNC_MAX_PENDING = 500  # requests waiting for an encode before answering 503
+    # Streaming verification (/ws/face/verify): newest frame only, stop at the first match
+    FACE_STREAM_MAX_ENCODES = 10  # encodes per session before giving up
+    FACE_STREAM_TIMEOUT = 30.0  # seconds per session
+    FACE_STREAM_ALLOWED_ORIGINS = ()  # extra origins (e.g. 'https://vote.college.edu') besides the request host
+    FACE_VERIFICATION_TOKEN_TTL = 120  # seconds a streamed verification can be used to cast a vote
+
+    # Election lifecycle scheduler (in-process thread; scripts/run_scheduler.py runs it as a sidecar)
+    SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', '1') == '1'
+    SCHEDULER_INTERVAL = 5.0  # seconds between ticks
+    SCHEDULER_CLOSE_GRACE_SECONDS = 5  # wait after end_date before storing final results
+    SCHEDULER_WARM_ENCODINGS = True  # load registered encodings into the cache when an election opens
+    SCHEDULER_CANDIDATE_TTL = 30.0  # seconds a cached ballot candidate list is reused
+
+    # Turnout analytics rollups
+    ROLLUP_BUCKET_SECONDS = 300  # votes-per-bucket granularity (5 minutes)
+    ROLLUP_FLUSH_INTERVAL = 10.0  # seconds between writes of buffered verification counters
+
+    # Tenants (colleges), each with its own database and encoding namespace. The default tenant uses
+    # SQLALCHEMY_DATABASE_URI; e.g. TENANT_DATABASES = {'north': 'sqlite:///north.db'}
+    TENANT_DATABASES = {}
+    TENANT_HOSTS = {}  # host -> tenant, e.g. {'vote.north.edu': 'north'}; otherwise chosen at login
+    TENANT_FANOUT_WORKERS = 8  # parallel queries for cross-tenant admin pages
+
+    # Audit log of face/vote attempts (admin: /admin/audit)
+    AUDIT_ENABLED = os.environ.get('AUDIT_ENABLED', '1') == '1'
+    AUDIT_BUFFER_SIZE = 10000  # events held in memory; beyond this the oldest are dropped (and counted)
+    AUDIT_BATCH_SIZE = 500  # rows per INSERT; a full batch wakes the flusher early
+    AUDIT_FLUSH_INTERVAL = 2.0  # seconds between flushes when traffic is light
+    AUDIT_BLOCK_SECONDS = 0.0  # how long a WSGI request may wait for buffer room before dropping (0 = never)
+
+    # Request profiler (admin: /admin/profiles). Off by default: zero overhead.
+    PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', '0') == '1'
+    PROFILER_DIR = os.environ.get('PROFILER_DIR') or os.path.join(os.path.dirname(__file__), 'profiles')
+    PROFILER_SAMPLE_RATE = float(os.environ.get('PROFILER_SAMPLE_RATE', '0.01'))  # fraction run under cProfile
+    PROFILER_SLOW_MS = int(os.environ.get('PROFILER_SLOW_MS', '1000'))  # always capture slower requests
+    PROFILER_STACK_INTERVAL_MS = 5
+    PROFILER_MAX_CAPTURES = 200
+
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -34,8 +152,20 @@ class ProductionConfig(Config):
         'sqlite:///voting_system.db'
 
 
+class TestingConfig(Config):
+    """Test configuration: callers pass their own database; no background threads"""
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SCHEDULER_ENABLED = False
+    AUDIT_ENABLED = False
+    METRICS_DIR = None
+    METRICS_TOKEN = None
+    PROFILER_ENABLED = False
+
+
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
@@ -5,10 +5,16 @@ Run with: python run.py
 import os
 
 from app import create_app
+from app.services.admission import require_single_process
 
-# Load environment
-config_name = os.environ.get('FLASK_ENV', 'development')
-app = create_app(config_name)
 
-if __name__ == '__main__':
+def main():
+    # Load environment
+    config_name = os.environ.get('FLASK_ENV', 'development')
+    app = create_app(config_name)
+    require_single_process(app.config)
     app.run(host='0.0.0.0', port=5000, debug=True)
+
+
+if __name__ == '__main__':
+    main()
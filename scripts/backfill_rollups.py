@@ -0,0 +1,37 @@
+"""
+Rebuild turnout rollups from the votes table
+Run from project root: python -m scripts.backfill_rollups [--election ID]
+
+Votes are streamed in chunks and aggregated per (election, time bucket,
+department); the election's existing rollup rows are replaced in one
+transaction. Verification rollups have no source table and are not rebuilt.
+"""
+import argparse
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.services.tenancy import DEFAULT_TENANT, use_tenant
+from app.services import rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--election', type=int, help='only this election (default: all)')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--tenant', default=DEFAULT_TENANT, help='tenant database to work in')
+    parser.add_argument('--config', default=os.environ.get('FLASK_ENV', 'development'))
+    args = parser.parse_args()
+
+    app = create_app(args.config)
+    with app.app_context(), use_tenant(args.tenant):
+        start = time.perf_counter()
+        rows = rollups.backfill(args.election, chunk_size=args.chunk_size)
+        print(f'{rows} rollup rows written in {time.perf_counter() - start:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
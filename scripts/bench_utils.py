@@ -0,0 +1,68 @@
+"""
+Shared helpers for the offline benchmark scripts
+"""
+import json
+import math
+import os
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def iter_images(root):
+    """Yield image paths under root (recursively, sorted for reproducibility)"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(dirpath, name)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None if empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def latency_summary(seconds):
+    """Summarise a list of durations (seconds) as milliseconds"""
+    if not seconds:
+        return {'count': 0}
+    return {
+        'count': len(seconds),
+        'mean_ms': 1000 * sum(seconds) / len(seconds),
+        'p50_ms': 1000 * percentile(seconds, 50),
+        'p95_ms': 1000 * percentile(seconds, 95),
+        'p99_ms': 1000 * percentile(seconds, 99),
+        'max_ms': 1000 * max(seconds),
+    }
+
+
+def print_table(headers, rows):
+    """Print a plain-text table"""
+    cells = [[str(h) for h in headers]] + [[_fmt(v) for v in row] for row in rows]
+    widths = [max(len(r[i]) for r in cells) for i in range(len(headers))]
+    for n, row in enumerate(cells):
+        print('  '.join(c.ljust(w) for c, w in zip(row, widths)))
+        if n == 0:
+            print('  '.join('-' * w for w in widths))
+
+
+def write_json(path, data):
+    """Write benchmark results as JSON ('-' for stdout)"""
+    text = json.dumps(data, indent=2, sort_keys=True)
+    if path == '-':
+        print(text)
+        return
+    with open(path, 'w') as f:
+        f.write(text + '\n')
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        return f'{value:.2f}'
+    if value is None:
+        return '-'
+    return str(value)
@@ -0,0 +1,115 @@
+"""
+Benchmark face detector backends on a local image set
+Run from project root: python -m scripts.benchmark_detectors IMAGE_DIR [--json out.json]
+
+Reports per-frame latency for each backend and how often each backend
+agrees with the reference backend (same face count, and boxes that overlap).
+Each backend is built with the app's settings (FACE_HOG_UPSAMPLE, or
+FACE_HOG_REGISTER_UPSAMPLE with --registration, and the FACE_CASCADE_*
+options), so the numbers match what verification actually runs.
+"""
+import argparse
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+
+from config import Config
+from app.services.face_detectors import DETECTORS, detector_from_config
+from app.services.face_recognition_service import prepare_image
+from scripts.bench_utils import iter_images, latency_summary, print_table, write_json
+
+
+def box_iou(a, b):
+    """Intersection-over-union of two (top, right, bottom, left) boxes"""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    union = area_a + area_b - inter
+    return inter / union if union else 0.0
+
+
+def boxes_agree(ref, other, min_iou):
+    """True when both found the same number of faces and every face is matched"""
+    if len(ref) != len(other):
+        return False
+    return all(any(box_iou(r, o) >= min_iou for o in other) for r in ref)
+
+
+def run(image_dir, backends, reference, min_iou, repeat, settings, registration=False):
+    frames = []
+    for path in iter_images(image_dir):
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is not None:
+            frames.append((path, prepare_image(img)))
+    if not frames:
+        raise SystemExit(f'No readable images in {image_dir}')
+
+    detectors = {name: detector_from_config(settings, registration, name) for name in backends}
+    for name, det in detectors.items():
+        if not det.available:
+            raise SystemExit(f'Detector backend "{name}" is not available here')
+
+    timings = {name: [] for name in backends}
+    found = {name: {} for name in backends}
+    for path, rgb in frames:
+        for name, det in detectors.items():
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                boxes = det.detect(rgb)
+                timings[name].append(time.perf_counter() - t0)
+            found[name][path] = boxes
+
+    results = {'images': len(frames), 'reference': reference, 'backends': {}}
+    for name in backends:
+        ref_boxes = found[reference]
+        count_agree = sum(len(found[name][p]) == len(ref_boxes[p]) for p, _ in frames)
+        box_agree = sum(boxes_agree(ref_boxes[p], found[name][p], min_iou) for p, _ in frames)
+        single = sum(len(found[name][p]) == 1 for p, _ in frames)
+        results['backends'][name] = dict(
+            latency_summary(timings[name]),
+            single_face_frames=single,
+            count_agreement=count_agree / len(frames),
+            box_agreement=box_agree / len(frames),
+        )
+    return results
+
+
+def main():
+    settings = {k: getattr(Config, k) for k in dir(Config) if k.isupper()}
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('image_dir')
+    parser.add_argument('--backends', default=','.join(DETECTORS),
+                        help='comma separated backends (default: all)')
+    parser.add_argument('--reference', default='hog', help='backend treated as ground truth')
+    parser.add_argument('--min-iou', type=float, default=0.3)
+    parser.add_argument('--repeat', type=int, default=1, help='timed runs per frame')
+    parser.add_argument('--registration', action='store_true',
+                        help='use the registration pass settings (FACE_HOG_REGISTER_UPSAMPLE)')
+    parser.add_argument('--json', help="write results as JSON ('-' for stdout)")
+    args = parser.parse_args()
+
+    backends = [b.strip() for b in args.backends.split(',') if b.strip()]
+    if args.reference not in backends:
+        backends.insert(0, args.reference)
+    results = run(args.image_dir, backends, args.reference, args.min_iou, args.repeat, settings,
+                  args.registration)
+
+    print(f"{results['images']} images, reference backend: {args.reference}")
+    print_table(
+        ['backend', 'mean ms', 'p50 ms', 'p95 ms', 'single-face', 'count agree', 'box agree'],
+        [[name, r['mean_ms'], r['p50_ms'], r['p95_ms'], r['single_face_frames'],
+          r['count_agreement'], r['box_agreement']]
+         for name, r in results['backends'].items()]
+    )
+    if args.json:
+        write_json(args.json, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Benchmark face encoding profiles on a labelled local image set
+Run from project root: python -m scripts.benchmark_encoding LABELLED_DIR [--json out.json]
+
+LABELLED_DIR holds one sub-directory per person (LABELLED_DIR/<person>/*.jpg).
+For every profile in FACE_ENCODING_PROFILES this reports encodes/second,
+p50/p95 encode latency, and genuine (same person) vs impostor (different
+people) distance distributions against FACE_ENCODING_TOLERANCE.
+"""
+import argparse
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from config import Config
+from app.services.face_detectors import detector_from_config
+from app.services.face_recognition_service import (
+    FACE_RECOGNITION_AVAILABLE, encoding_profile_from_config, prepare_image
+)
+from scripts.bench_utils import iter_images, latency_summary, percentile, print_table, write_json
+
+if FACE_RECOGNITION_AVAILABLE:
+    import face_recognition
+
+
+def load_labelled_faces(root, detector):
+    """Return [(label, rgb, location)] for images with exactly one detected face"""
+    faces, skipped = [], 0
+    for path in iter_images(root):
+        label = os.path.relpath(path, root).split(os.sep)[0]
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is None or label == os.path.basename(path):
+            skipped += 1
+            continue
+        rgb = prepare_image(img)
+        locations = detector.detect(rgb)
+        if len(locations) != 1:
+            skipped += 1
+            continue
+        faces.append((label, rgb, locations[0]))
+    return faces, skipped
+
+
+def distance_split(labels, encodings, chunk_rows=1024):
+    """
+    Pairwise distances split into genuine and impostor pairs. Uses
+    ||a - b||^2 = ||a||^2 + ||b||^2 - 2 a.b over blocks of rows, so memory is
+    chunk_rows x n rather than n x n x 128.
+    """
+    enc = np.asarray(encodings, dtype=np.float64)
+    labels = np.asarray(labels)
+    sq = np.einsum('ij,ij->i', enc, enc)
+    cols = np.arange(len(enc))
+    genuine, impostor = [], []
+    for start in range(0, len(enc), chunk_rows):
+        block = enc[start:start + chunk_rows]
+        d2 = sq[start:start + chunk_rows, None] + sq[None, :] - 2.0 * (block @ enc.T)
+        dists = np.sqrt(np.maximum(d2, 0.0))  # rounding can leave tiny negatives
+        rows = np.arange(start, start + len(block))
+        upper = cols[None, :] > rows[:, None]
+        same = labels[start:start + chunk_rows, None] == labels[None, :]
+        genuine.extend(dists[same & upper].tolist())
+        impostor.extend(dists[~same & upper].tolist())
+    return genuine, impostor
+
+
+def distribution(values):
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'min': min(values),
+        'p5': percentile(values, 5),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'max': max(values),
+    }
+
+
+def run_profile(profile, faces, tolerance):
+    timings, encodings = [], []
+    for _, rgb, location in faces:
+        t0 = time.perf_counter()
+        enc = face_recognition.face_encodings(
+            rgb, known_face_locations=[location],
+            num_jitters=profile['num_jitters'], model=profile['model']
+        )[0]
+        timings.append(time.perf_counter() - t0)
+        encodings.append(enc)
+    genuine, impostor = distance_split([f[0] for f in faces], encodings)
+    return dict(
+        latency_summary(timings),
+        encodes_per_second=len(timings) / sum(timings) if sum(timings) else None,
+        genuine=distribution(genuine),
+        impostor=distribution(impostor),
+        # Rates at the configured tolerance
+        false_reject_rate=sum(d > tolerance for d in genuine) / len(genuine) if genuine else None,
+        false_accept_rate=sum(d <= tolerance for d in impostor) / len(impostor) if impostor else None,
+    )
+
+
+def main():
+    settings = {k: getattr(Config, k) for k in dir(Config) if k.isupper()}
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('image_dir')
+    parser.add_argument('--profiles', default=','.join(settings['FACE_ENCODING_PROFILES']),
+                        help='comma separated profile names (default: all)')
+    parser.add_argument('--tolerance', type=float, default=settings['FACE_ENCODING_TOLERANCE'])
+    parser.add_argument('--json', help="write results as JSON ('-' for stdout)")
+    args = parser.parse_args()
+
+    if not FACE_RECOGNITION_AVAILABLE:
+        raise SystemExit('face_recognition is not installed')
+    faces, skipped = load_labelled_faces(args.image_dir, detector_from_config(settings))
+    if not faces:
+        raise SystemExit(f'No single-face images found under {args.image_dir}')
+
+    results = {
+        'images': len(faces),
+        'skipped': skipped,
+        'people': len({f[0] for f in faces}),
+        'tolerance': args.tolerance,
+        'profiles': {},
+    }
+    for name in [p.strip() for p in args.profiles.split(',') if p.strip()]:
+        profile = encoding_profile_from_config(settings, name)
+        results['profiles'][name] = dict(run_profile(profile, faces, args.tolerance), **profile)
+
+    print(f"{results['images']} faces of {results['people']} people "
+          f"({skipped} images skipped), tolerance {args.tolerance}")
+    print_table(
+        ['profile', 'enc/s', 'p50 ms', 'p95 ms', 'genuine p95', 'impostor p5', 'FRR', 'FAR'],
+        [[name, r['encodes_per_second'], r['p50_ms'], r['p95_ms'],
+          r['genuine'].get('p95'), r['impostor'].get('p5'),
+          r['false_reject_rate'], r['false_accept_rate']]
+         for name, r in results['profiles'].items()]
+    )
+    if args.json:
+        write_json(args.json, results)
+
+
+if __name__ == '__main__':
+    main()
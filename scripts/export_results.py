@@ -0,0 +1,56 @@
+"""
+Export election tallies, vote-level ballots or the roll of who voted
+Run from project root: python -m scripts.export_results ELECTION_ID [--kind votes|tally|roll] [--format csv|ndjson] [--output file]
+
+Votes are streamed from a server-side cursor in --chunk-size batches, so
+memory use stays constant however many ballots the election has. Ballots
+carry no voter identity; the roll lists voters without their ballots.
+"""
+import argparse
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.services.tenancy import DEFAULT_TENANT, use_tenant
+from app.models.election import Election
+from app.services import export
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('election_id', type=int)
+    parser.add_argument('--kind', choices=['votes', 'tally', 'roll'], default='votes')
+    parser.add_argument('--format', choices=sorted(export.FORMATS), default='csv')
+    parser.add_argument('--output', default='-', help="output file ('-' for stdout)")
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--tenant', default=DEFAULT_TENANT, help='tenant database to work in')
+    parser.add_argument('--config', default=os.environ.get('FLASK_ENV', 'development'))
+    args = parser.parse_args()
+
+    app = create_app(args.config)
+    with app.app_context(), use_tenant(args.tenant):
+        election = Election.query.get(args.election_id)
+        if election is None:
+            sys.exit(f'Election {args.election_id} not found')
+        if args.kind == 'tally':
+            body = export.stream(args.format, export.TALLY_COLUMNS, [export.tally_rows(election)])
+        elif args.kind == 'roll':
+            body = export.stream(args.format, export.ROLL_COLUMNS,
+                                 export.iter_roll_chunks(election.id, chunk_size=args.chunk_size))
+        else:
+            chunks = export.iter_vote_chunks(election.id, chunk_size=args.chunk_size, ranked=election.is_ranked)
+            body = export.stream(args.format, export.vote_columns(election.is_ranked), chunks)
+
+        out = sys.stdout if args.output == '-' else open(args.output, 'w', newline='', encoding='utf-8')
+        try:
+            for part in body:
+                out.write(part)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Bulk import students from CSV/XLSX
+Run from project root: python -m scripts.import_students students.csv [--errors errors.csv]
+
+Columns: email, name, password (required), student_id, department (optional).
+"""
+import argparse
+import csv
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.services.tenancy import DEFAULT_TENANT, use_tenant
+from app.services.bulk_import import StudentImporter, read_rows
+
+
+def print_progress(report):
+    rate = report.total / max(1e-9, time.perf_counter() - report.started)
+    sys.stderr.write(f'\r{report.total} rows read, {report.created} created, '
+                     f'{len(report.errors)} rejected ({rate:.0f} rows/s)')
+    sys.stderr.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('file')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--workers', type=int, help='hashing threads (default: CPU count)')
+    parser.add_argument('--errors', help='write rejected rows to this CSV')
+    parser.add_argument('--dry-run', action='store_true', help='validate and hash without inserting')
+    parser.add_argument('--tenant', default=DEFAULT_TENANT, help='tenant database to work in')
+    parser.add_argument('--config', default=os.environ.get('FLASK_ENV', 'development'))
+    args = parser.parse_args()
+
+    app = create_app(args.config)
+    with app.app_context(), use_tenant(args.tenant), open(args.file, 'rb') as f:
+        importer = StudentImporter(batch_size=args.batch_size, workers=args.workers,
+                                   progress=print_progress, dry_run=args.dry_run)
+        report = importer.run(read_rows(f, args.file))
+    sys.stderr.write('\n')
+
+    print(f'{report.created} created, {len(report.errors)} rejected, {report.total} rows '
+          f'in {report.seconds:.1f}s ({report.rows_per_second:.0f} rows/s)'
+          + (' [dry run]' if args.dry_run else ''))
+    if args.errors and report.errors:
+        with open(args.errors, 'w', newline='') as out:
+            writer = csv.writer(out)
+            writer.writerow(['row', 'error'])
+            writer.writerows(report.errors)
+        print(f'Rejected rows written to {args.errors}')
+    elif report.errors:
+        for number, message in report.errors[:20]:
+            print(f'  row {number}: {message}')
+        if len(report.errors) > 20:
+            print(f'  ... {len(report.errors) - 20} more (use --errors FILE)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,359 @@
+"""
+Election-day load simulation
+Run from project root: python -m scripts.loadtest [--students 500] [--concurrency 16] [--output bench.json]
+
+Seeds a throwaway SQLite database with students, elections and candidates,
+swaps dlib for a deterministic synthetic face backend, then drives concurrent
+login -> election_view -> verify -> cast_vote flows while poller threads hit
+the admin/college dashboards and results pages. Runs fully offline on CPU.
+
+Every verify and vote uploads a freshly captured frame (seeded sensor noise,
+--frame-noise), so the frame cache only answers the resubmissions a real
+client makes; --frame-noise 0 resends one identical frame per voter. When
+any frame was answered from the cache, verify and vote latency is also
+reported separately for frame-cache hits and cold encodes (steps suffixed
+_cache_hit and _cold), told apart by each response's Server-Timing stages.
+
+Reports throughput, per-step latency percentiles, error rates and DB lock
+waits as JSON. With --baseline, exits non-zero if any step's p95 regressed
+by more than --max-regression.
+"""
+import argparse
+import json
+import os
+import queue
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts import synthetic_faces
+from scripts.bench_utils import latency_summary, print_table, write_json
+
+PASSWORD = 'loadtest'
+
+
+class Recorder:
+    """Thread-safe per-step latency and error accounting"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings = {}
+        self.errors = {}
+        self.locked = 0
+
+    def record(self, step, seconds, ok, body=None):
+        with self._lock:
+            self.timings.setdefault(step, []).append(seconds)
+            if not ok:
+                self.errors[step] = self.errors.get(step, 0) + 1
+                if body and 'locked' in str(body.get('error', '')):
+                    self.locked += 1
+
+    def summary(self):
+        with self._lock:
+            return {
+                step: dict(latency_summary(times),
+                           errors=self.errors.get(step, 0),
+                           error_rate=self.errors.get(step, 0) / len(times))
+                for step, times in sorted(self.timings.items())
+            }
+
+
+def seed(app, db, students, elections, candidates_per_election, rng):
+    """Create users, elections, candidates and registered face encodings"""
+    from app.models.user import User
+    from app.models.election import Election, Candidate
+    from app.services.face_recognition_service import create_face_service
+
+    with app.app_context():
+        template = User(email='x', name='x', role='student')
+        template.set_password(PASSWORD)  # hash once: bcrypt is not what we measure
+        service = create_face_service(app.config)
+
+        for email, name, role in [('admin@load.test', 'Load Admin', 'admin'),
+                                  ('college@load.test', 'Load College', 'college')]:
+            db.session.add(User(email=email, name=name, role=role, password_hash=template.password_hash))
+
+        departments = ['CSE', 'ECE', 'MECH', 'CIVIL', 'EEE', 'MBA']
+        users = []
+        for i in range(students):
+            users.append(User(
+                email=f'student{i}@load.test', name=f'Student {i:05d}', role='student',
+                student_id=f'L{i:06d}', department=rng.choice(departments),
+                password_hash=template.password_hash,
+            ))
+        db.session.add_all(users)
+        db.session.flush()
+        for u in users:
+            u.face_encoding_path = service.save_encoding(u.id, synthetic_faces.encoding_for(u.id).tolist())
+
+        now = datetime.utcnow()
+        for e in range(elections):
+            election = Election(title=f'Load Election {e + 1}', start_date=now - timedelta(hours=1),
+                                end_date=now + timedelta(days=1))
+            db.session.add(election)
+            db.session.flush()
+            for u in rng.sample(users, min(candidates_per_election, len(users))):
+                db.session.add(Candidate(election_id=election.id, user_id=u.id,
+                                         status='approved', approved_at=now))
+        db.session.commit()
+
+        ballots = [(e.id, [c.id for c in e.candidates]) for e in Election.query.all()]
+        return [(u.id, u.email) for u in users], ballots
+
+
+def timed(recorder, step, fn):
+    start = time.perf_counter()
+    response = fn()
+    elapsed = time.perf_counter() - start
+    body = response.get_json(silent=True) if response.is_json else None
+    ok = response.status_code < 400 and (body is None or body.get('success', True))
+    recorder.record(step, elapsed, ok, body)
+    return response, body
+
+
+def voter_flow(app, recorder, student, ballots, impostor, rng, frame_noise):
+    """One student: log in, open each election, verify, and vote"""
+    user_id, email = student
+    client = app.test_client()
+    # Distinct address per student so per-IP admission limits apply as in production
+    client.environ_base['REMOTE_ADDR'] = f'10.{user_id >> 16 & 255}.{user_id >> 8 & 255}.{user_id & 255}'
+    timed(recorder, 'login', lambda: client.post('/auth/login', data={'email': email, 'password': PASSWORD}))
+    face = synthetic_faces.encoding_for(impostor if impostor is not None else user_id)
+    still = None if frame_noise else synthetic_faces.render_face(face)
+
+    def capture():
+        return still or synthetic_faces.render_face(face, noise=frame_noise, seed=rng.getrandbits(32))
+
+    for election_id, candidate_ids in ballots:
+        timed(recorder, 'election_view', lambda: client.get(f'/student/election/{election_id}'))
+        # One capture per attempt; waiting-room resubmissions resend it, like the voting page
+        frame = capture()
+        _, body = admitted_post(recorder, 'verify', client, '/api/face/verify',
+                                lambda: {'election_id': election_id, 'image': (_as_file(frame), 'frame.jpg')})
+        if not body or not body.get('verified'):
+            continue
+        candidate_id = rng.choice(candidate_ids)
+        frame = capture()
+        admitted_post(recorder, 'cast_vote', client, '/api/vote/cast',
+                      lambda: {'election_id': election_id, 'candidate_id': candidate_id,
+                               'image': (_as_file(frame), 'frame.jpg')})
+
+
+def admitted_post(recorder, step, client, url, form, poll_interval=0.02):
+    """POST through the admission waiting room: wait out a queued ticket, then resubmit with it"""
+    ticket, queued_at = None, None
+    while True:
+        data = form()
+        if ticket:
+            data['ticket'] = ticket
+        start = time.perf_counter()
+        response = client.post(url, data=data, content_type='multipart/form-data')
+        elapsed = time.perf_counter() - start
+        body = response.get_json(silent=True) if response.is_json else None
+        if not (body and body.get('queued')):
+            break
+        ticket, queued_at = body['ticket'], queued_at or time.perf_counter()
+        while True:
+            time.sleep(poll_interval)
+            status = client.get(f'/api/admission/status?ticket={ticket}')
+            if status.status_code == 404:
+                ticket = None
+                break
+            if status.get_json().get('admitted'):
+                break
+    if queued_at is not None:
+        recorder.record('waiting_room', start - queued_at, True)
+    ok = response.status_code < 400 and (body is None or body.get('success', True))
+    recorder.record(step, elapsed, ok, body)
+    stages = timed_stages(response)
+    if 'frame_cache' in stages:  # the frame reached the cache; a cold encode also ran detection
+        recorder.record(f'{step}_{"cold" if "detect" in stages else "cache_hit"}', elapsed, ok, body)
+    return response, body
+
+
+def timed_stages(response):
+    """Stage names in the response's Server-Timing header (METRICS_SERVER_TIMING)"""
+    header = response.headers.get('Server-Timing', '')
+    return {part.split(';')[0].strip() for part in header.split(',') if part.strip()}
+
+
+def _as_file(data):
+    import io
+    return io.BytesIO(data)
+
+
+def poller(app, recorder, ballots, stop, interval):
+    """Admins and college staff refreshing dashboards and results"""
+    admin, college = app.test_client(), app.test_client()
+    admin.post('/auth/login', data={'email': 'admin@load.test', 'password': PASSWORD})
+    college.post('/auth/login', data={'email': 'college@load.test', 'password': PASSWORD})
+    while not stop.is_set():
+        timed(recorder, 'admin_dashboard', lambda: admin.get('/admin/'))
+        timed(recorder, 'college_dashboard', lambda: college.get('/college/dashboard'))
+        for election_id, _ in ballots:
+            timed(recorder, 'results', lambda: college.get(f'/college/election/{election_id}/results'))
+        stop.wait(interval)
+
+
+def commit_waits():
+    """db_commit stage timings from the metrics registry (includes SQLite lock waits)"""
+    from app.services import metrics
+    samples = metrics.stage_seconds.snapshot()
+    count = total = 0
+    for key, (_, stage_sum, stage_count) in samples.items():
+        if json.loads(key)[1] == 'db_commit':
+            count += stage_count
+            total += stage_sum
+    return {'commits': count, 'mean_ms': 1000 * total / count if count else None}
+
+
+def frame_cache_stats():
+    """Frame cache hit rate and encode time saved, from the metrics registry"""
+    from app.services import frame_cache
+    counts = {}
+    for key, value in frame_cache.lookups.snapshot().items():
+        result = json.loads(key)[1]
+        counts[result] = counts.get(result, 0) + value
+    hits = counts.get('hit', 0) + counts.get('perceptual_hit', 0)
+    total = hits + counts.get('miss', 0)
+    saved = sum(frame_cache.saved_seconds.snapshot().values())
+    return {'lookups': total, 'hit_rate': hits / total if total else None, 'saved_seconds': saved}
+
+
+def compare(results, baseline, max_regression):
+    """Steps whose p95 regressed beyond the allowed fraction"""
+    regressions = []
+    for step, current in results['steps'].items():
+        before = baseline.get('steps', {}).get(step, {}).get('p95_ms')
+        after = current.get('p95_ms')
+        if before and after and after > before * (1 + max_regression):
+            regressions.append({'step': step, 'baseline_p95_ms': before, 'p95_ms': after})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--elections', type=int, default=2)
+    parser.add_argument('--candidates', type=int, default=5, help='candidates per election')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent voters')
+    parser.add_argument('--pollers', type=int, default=2, help='dashboard/results polling threads')
+    parser.add_argument('--poll-interval', type=float, default=0.5)
+    parser.add_argument('--impostor-rate', type=float, default=0.02,
+                        help='fraction of voters presenting someone else\'s face')
+    parser.add_argument('--encode-ms', type=float, default=0.0,
+                        help='simulated CPU cost per synthetic encode')
+    parser.add_argument('--frame-noise', type=float, default=3.0,
+                        help='sensor noise per captured frame in grey levels (0 = resend one identical frame)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="write results as JSON ('-' for stdout)")
+    parser.add_argument('--baseline', help='previous JSON output to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.25)
+    parser.add_argument('--keep', action='store_true', help='keep the temporary database directory')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='voting-loadtest-')
+    # Must be set before config is imported
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'loadtest.db')
+    os.environ.setdefault('FACE_DETECTOR_BACKEND', 'hog')
+    # One process, so the waiting room can be exercised as a single-worker deployment would use it
+    os.environ.setdefault('ADMISSION_ENABLED', '1')
+    os.environ['METRICS_SERVER_TIMING'] = '1'  # per-request stages split cache hits from cold encodes
+
+    from app import create_app, db
+    synthetic_faces.install(args.encode_ms / 1000.0)
+    app = create_app('production')
+    app.config['FACE_ENCODINGS_FOLDER'] = os.path.join(workdir, 'face_encodings')
+
+    rng = random.Random(args.seed)
+    try:
+        t0 = time.perf_counter()
+        students, ballots = seed(app, db, args.students, args.elections, args.candidates, rng)
+        seed_seconds = time.perf_counter() - t0
+
+        recorder = Recorder()
+        work = queue.Queue()
+        for student in students:
+            impostor = rng.choice(students)[0] if rng.random() < args.impostor_rate else None
+            work.put((student, impostor, rng.random()))
+
+        def voter_worker():
+            while True:
+                try:
+                    student, impostor, flow_seed = work.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    voter_flow(app, recorder, student, ballots, impostor, random.Random(flow_seed),
+                               args.frame_noise)
+                except Exception as e:
+                    recorder.record('flow_exception', 0.0, False, {'error': str(e)})
+
+        stop = threading.Event()
+        pollers = [threading.Thread(target=poller, args=(app, recorder, ballots, stop, args.poll_interval))
+                   for _ in range(args.pollers)]
+        voters = [threading.Thread(target=voter_worker) for _ in range(args.concurrency)]
+        start = time.perf_counter()
+        for t in pollers + voters:
+            t.start()
+        for t in voters:
+            t.join()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        for t in pollers:
+            t.join()
+
+        steps = recorder.summary()
+        if not any(step.endswith('_cache_hit') for step in steps):
+            # Every request was cold: the _cold rows would only repeat verify and cast_vote
+            steps = {step: s for step, s in steps.items() if not step.endswith('_cold')}
+        total_requests = sum(s['count'] for s in steps.values())
+        votes = steps.get('cast_vote', {})
+        results = {
+            'config': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline', 'keep')},
+            'seed_seconds': seed_seconds,
+            'elapsed_seconds': elapsed,
+            'requests_per_second': total_requests / elapsed if elapsed else None,
+            'votes_per_second': (votes.get('count', 0) - votes.get('errors', 0)) / elapsed if elapsed else None,
+            'steps': steps,
+            'db': dict(commit_waits(), locked_errors=recorder.locked),
+            'frame_cache': frame_cache_stats(),
+        }
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{args.students} students, {args.elections} elections, {args.concurrency} voters, "
+          f"{args.pollers} pollers: {elapsed:.1f}s, {results['requests_per_second']:.1f} req/s, "
+          f"{results['votes_per_second']:.1f} votes/s")
+    print_table(
+        ['step', 'count', 'p50 ms', 'p95 ms', 'p99 ms', 'error rate'],
+        [[step, s['count'], s.get('p50_ms'), s.get('p95_ms'), s.get('p99_ms'), s['error_rate']]
+         for step, s in steps.items()]
+    )
+    print(f"db commits: {results['db']['commits']}, mean {results['db']['mean_ms'] or 0:.2f} ms, "
+          f"'database is locked' errors: {results['db']['locked_errors']}")
+    cache = results['frame_cache']
+    print(f"frame cache: {cache['lookups']} lookups, hit rate {100 * (cache['hit_rate'] or 0):.1f}%, "
+          f"{cache['saved_seconds']:.2f}s of decode/encode saved")
+    if args.output:
+        write_json(args.output, results)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        for r in regressions:
+            print(f"REGRESSION {r['step']}: p95 {r['baseline_p95_ms']:.1f} -> {r['p95_ms']:.1f} ms")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Move stored face encodings into another storage backend
+Run from project root: python -m scripts.migrate_encodings --to db [--tenant T] [--delete-source] [--dry-run]
+
+Reads each registered student's encoding from wherever User.face_encoding_path
+points (legacy .pkl path or any backend reference), writes it to the target
+backend and updates the reference in batches. Re-running is safe: users whose
+reference already points at the target backend are skipped.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.models.user import User
+from app.services import encoding_storage, tenancy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--to', required=True, choices=['local', 'db', 'object'], help='target backend')
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--delete-source', action='store_true', help='remove the old copy once migrated')
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--tenant', default=tenancy.DEFAULT_TENANT, help='tenant database and encoding namespace')
+    parser.add_argument('--config', default=os.environ.get('FLASK_ENV', 'development'))
+    args = parser.parse_args()
+
+    app = create_app(args.config)
+    with app.app_context(), tenancy.use_tenant(args.tenant):
+        source = encoding_storage.repository_from_config(app.config)
+        target = encoding_storage.EncodingRepository(encoding_storage.get_store(app.config, args.to))
+        migrated = skipped = missing = 0
+        last_id = 0
+        while True:
+            users = (User.query.filter(User.id > last_id, User.face_encoding_path.isnot(None))
+                     .order_by(User.id).limit(args.batch_size).all())
+            if not users:
+                break
+            old_refs = []
+            for user in users:
+                last_id = user.id
+                parsed = encoding_storage.parse_ref(user.face_encoding_path)
+                if parsed is not None and parsed[0] == args.to:
+                    skipped += 1
+                    continue
+                encoding = source.load(user.face_encoding_path)
+                if encoding is None:
+                    missing += 1
+                    print(f'user {user.id}: encoding not found at {user.face_encoding_path}', file=sys.stderr)
+                    continue
+                if not args.dry_run:
+                    old_refs.append(user.face_encoding_path)
+                    user.face_encoding_path = target.save(user.id, encoding)
+                migrated += 1
+            if not args.dry_run:
+                db.session.commit()
+                if args.delete_source:
+                    for ref in old_refs:
+                        delete_source(app.config, ref)
+            print(f'{migrated} migrated, {skipped} already on {args.to}, {missing} missing', file=sys.stderr)
+    if missing:
+        sys.exit(1)
+
+
+def delete_source(config, ref):
+    """Remove a migrated encoding from its old location"""
+    parsed = encoding_storage.parse_ref(ref)
+    if parsed is None:
+        if os.path.exists(ref):
+            os.remove(ref)
+        return
+    backend, key, _ = parsed
+    store = encoding_storage.get_store(config, backend)
+    store.delete(key)
+    encoding_storage.cache.invalidate(store.cache_name, key)
+    if backend == 'db':
+        db.session.commit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Run the election lifecycle scheduler as a sidecar process
+Run from project root: python -m scripts.run_scheduler [--interval 5] [--once]
+
+Opens and closes elections at their start/end dates and stores final results
+on close, in every tenant database. Safe to run next to web workers that also
+schedule: each transition is a conditional UPDATE, so only one process applies it.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.services.lifecycle import scheduler
+from app.services.tenancy import tenant_names
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--interval', type=float, help='seconds between ticks (default SCHEDULER_INTERVAL)')
+    parser.add_argument('--once', action='store_true', help='apply due transitions and exit')
+    parser.add_argument('--config', default=os.environ.get('FLASK_ENV', 'development'))
+    args = parser.parse_args()
+
+    app = create_app(args.config)
+    # Warming this process's caches would not help the web workers
+    app.config['SCHEDULER_WARM_ENCODINGS'] = False
+    if args.interval:
+        app.config['SCHEDULER_INTERVAL'] = args.interval
+    if args.once:
+        for tenant in tenant_names(app.config):
+            for election_id, status in scheduler.run_tenant(app, tenant):
+                print(f'{tenant}: election {election_id}: {status}')
+        return
+    print(f"Scheduling elections every {app.config['SCHEDULER_INTERVAL']}s (Ctrl+C to stop)")
+    try:
+        scheduler.run(app)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Materialize, regenerate or verify result snapshots of completed elections
+Run from project root: python -m scripts.snapshot_results [--election ID] [--force] [--verify]
+
+Without --election every completed election is processed. Missing snapshots
+are created; --force rebuilds existing ones from the votes table, and
+--verify re-hashes the ballots and reports any checksum mismatch.
+"""
+import argparse
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.services.tenancy import DEFAULT_TENANT, use_tenant
+from app.models.election import Election
+from app.services import results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--election', type=int, help='only this election')
+    parser.add_argument('--force', action='store_true', help='rebuild existing snapshots')
+    parser.add_argument('--verify', action='store_true', help='check stored checksums against the ballots')
+    parser.add_argument('--tenant', default=DEFAULT_TENANT, help='tenant database to work in')
+    parser.add_argument('--config', default=os.environ.get('FLASK_ENV', 'development'))
+    args = parser.parse_args()
+
+    app = create_app(args.config)
+    mismatches = 0
+    with app.app_context(), use_tenant(args.tenant):
+        query = Election.query.order_by(Election.id)
+        if args.election:
+            query = query.filter(Election.id == args.election)
+        for election in query:
+            if not election.is_completed:
+                print(f'{election.id}: {election.title} - not completed, skipped')
+                continue
+            if args.verify:
+                snapshot = results.get_snapshot(election, create=False)
+                if snapshot is None:
+                    print(f'{election.id}: {election.title} - no snapshot')
+                elif results.verify_snapshot(snapshot):
+                    print(f'{election.id}: {election.title} - OK')
+                else:
+                    mismatches += 1
+                    print(f'{election.id}: {election.title} - CHECKSUM MISMATCH')
+                continue
+            if not results.is_settled(election):
+                print(f'{election.id}: {election.title} - close grace period not over, skipped')
+                continue
+            snapshot = results.regenerate_snapshot(election) if args.force else results.get_snapshot(election)
+            print(f'{election.id}: {election.title} - {snapshot.total_votes} votes, '
+                  f'turnout {snapshot.turnout}%, sha256 {snapshot.ballot_checksum[:16]}')
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""
+Split the single default database into per-tenant databases
+Run from project root: python -m scripts.split_shards [--assign-department DEPT=TENANT ...]
+                       [--assign-election ID=TENANT ...] [--delete-source] [--dry-run]
+
+Rows move by their tenant column: users and elections whose tenant is listed
+in TENANT_DATABASES are copied from the default database into that tenant's
+database with their ids, together with their candidates, votes, result
+snapshots, vote and verification rollups, stored face encodings and audit
+events. The --assign-* options set the tenant column first (users by
+department, elections by id). Candidates and votes cannot point across
+tenants, so the split stops before copying anything if they would.
+
+Re-running is safe: rows already present in a tenant database are skipped.
+With --delete-source, source encoding files and objects are removed only
+after the default database has committed, so a failed split leaves every
+user's encoding where their row still points.
+Verification counts not tied to an election stay in the default database.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, select, tuple_, update
+from sqlalchemy.orm import aliased
+
+from app import create_app
+from app.models.audit import AuditEvent
+from app.models.election import Election, Candidate, Vote, ElectionResultSnapshot
+from app.models.face_encoding import FaceEncoding
+from app.models.rollup import VoteRollup, VerificationRollup
+from app.models.user import User
+from app.services import encoding_storage, tenancy
+
+CHUNK = 500
+
+
+def parse_pairs(values, key_type=str):
+    pairs = {}
+    for value in values or []:
+        key, sep, tenant = value.partition('=')
+        if not sep or not key or not tenant:
+            raise SystemExit(f'Expected KEY=TENANT, got {value!r}')
+        pairs[key_type(key)] = tenant
+    return pairs
+
+
+def chunks(values, size=CHUNK):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def cross_tenant_rows(conn):
+    """(candidates, votes) whose user and election are assigned to different tenants"""
+    voter, ballot_election = aliased(User), aliased(Election)
+    candidates = conn.execute(
+        select(Candidate.id).join(User, User.id == Candidate.user_id)
+        .join(Election, Election.id == Candidate.election_id).where(User.tenant != Election.tenant)
+    ).scalars().all()
+    votes = conn.execute(
+        select(Vote.id).join(voter, voter.id == Vote.user_id)
+        .join(ballot_election, ballot_election.id == Vote.election_id).where(voter.tenant != ballot_election.tenant)
+    ).scalars().all()
+    return candidates, votes
+
+
+def copy_rows(source, target, model, column, ids):
+    """Copy rows of `model` whose `column` is in ids, skipping rows the target already has. Returns count."""
+    table = model.__table__
+    pk = list(table.primary_key.columns)
+    copied = 0
+    for part in chunks(ids):
+        rows = [dict(r) for r in source.execute(select(table).where(column.in_(part))).mappings()]
+        if not rows:
+            continue
+        keys = [tuple(r[c.name] for c in pk) for r in rows]
+        present = set(target.execute(select(*pk).where(tuple_(*pk).in_(keys))).all())
+        rows = [r for r, k in zip(rows, keys) if k not in present]
+        if rows:
+            target.execute(table.insert(), rows)
+            copied += len(rows)
+    return copied
+
+
+def delete_rows(conn, model, column, ids):
+    deleted = 0
+    for part in chunks(ids):
+        deleted += conn.execute(delete(model.__table__).where(column.in_(part))).rowcount
+    return deleted
+
+
+def copy_encodings(config, refs, tenant, dry_run):
+    """
+    Copy file/object encodings of moved users into the tenant's namespace (db
+    rows move with the tables). Returns the number copied and the (store, key)
+    of each source copy, for delete_encodings() once the split has committed.
+    """
+    copied, moved = 0, []
+    for ref in refs:
+        parsed = encoding_storage.parse_ref(ref)
+        if parsed is None or parsed[0] == 'db':
+            continue  # legacy absolute .pkl paths stay valid from any tenant
+        backend, key, _ = parsed
+        source = encoding_storage.get_store(config, backend, tenancy.DEFAULT_TENANT)
+        data = source.get(key)
+        if data is None:
+            print(f'{tenant}: encoding {ref} not found', file=sys.stderr)
+            continue
+        if not dry_run:
+            encoding_storage.get_store(config, backend, tenant).put(key, data)
+            moved.append((source, key))
+        copied += 1
+    return copied, moved
+
+
+def delete_encodings(moved):
+    """Remove source encodings copied by copy_encodings(); only after the default database has committed"""
+    for source, key in moved:
+        source.delete(key)
+        encoding_storage.cache.invalidate(source.cache_name, key)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--assign-department', action='append', metavar='DEPT=TENANT',
+                        help='move students and staff of a department to a tenant (repeatable)')
+    parser.add_argument('--assign-election', action='append', metavar='ID=TENANT',
+                        help='move an election to a tenant (repeatable)')
+    parser.add_argument('--delete-source', action='store_true', help='remove moved rows from the default database')
+    parser.add_argument('--dry-run', action='store_true', help='report what would move, change nothing')
+    parser.add_argument('--config', default=os.environ.get('FLASK_ENV', 'development'))
+    args = parser.parse_args()
+
+    departments = parse_pairs(args.assign_department)
+    elections = parse_pairs(args.assign_election, int)
+    app = create_app(args.config)
+    targets = [t for t in tenancy.tenant_names(app.config) if t != tenancy.DEFAULT_TENANT]
+    unknown = set(departments.values()) | set(elections.values())
+    unknown -= set(targets)
+    if not targets or unknown:
+        raise SystemExit(f'Unknown tenants {sorted(unknown)}' if unknown else 'No tenants in TENANT_DATABASES')
+
+    with app.app_context():
+        source_engine = tenancy.engine(tenancy.DEFAULT_TENANT)
+        conn = source_engine.connect()
+        trans = conn.begin()
+        moved = []
+        try:
+            for department, tenant in departments.items():
+                conn.execute(update(User).where(User.department == department, User.role != 'admin')
+                             .values(tenant=tenant))
+            for election_id, tenant in elections.items():
+                conn.execute(update(Election).where(Election.id == election_id).values(tenant=tenant))
+
+            candidates, votes = cross_tenant_rows(conn)
+            if candidates or votes:
+                print(f'Refusing to split: {len(candidates)} candidacies and {len(votes)} votes link a user '
+                      f'and an election of different tenants (e.g. candidates {candidates[:5]}, votes {votes[:5]})',
+                      file=sys.stderr)
+                trans.rollback()
+                sys.exit(1)
+
+            for tenant in targets:
+                user_ids = conn.execute(select(User.id).where(User.tenant == tenant)).scalars().all()
+                election_ids = conn.execute(select(Election.id).where(Election.tenant == tenant)).scalars().all()
+                refs = conn.execute(select(User.face_encoding_path).where(
+                    User.tenant == tenant, User.face_encoding_path.isnot(None))).scalars().all()
+                keys = [encoding_storage.user_key(uid) for uid in user_ids]
+                plan = [
+                    (User, User.id, user_ids),
+                    (Election, Election.id, election_ids),
+                    (Candidate, Candidate.election_id, election_ids),
+                    (Vote, Vote.election_id, election_ids),
+                    (ElectionResultSnapshot, ElectionResultSnapshot.election_id, election_ids),
+                    (VoteRollup, VoteRollup.election_id, election_ids),
+                    (VerificationRollup, VerificationRollup.election_id, election_ids),
+                    (FaceEncoding, FaceEncoding.key, keys),
+                    (AuditEvent, AuditEvent.user_id, user_ids),
+                ]
+                counts = {}
+                if args.dry_run:
+                    for model, column, ids in plan:
+                        counts[model.__tablename__] = sum(
+                            len(conn.execute(select(column).where(column.in_(part))).all()) for part in chunks(ids))
+                else:
+                    with tenancy.engine(tenant).begin() as target:
+                        for model, column, ids in plan:
+                            counts[model.__tablename__] = copy_rows(conn, target, model, column, ids)
+                        # Creators that stayed behind would point at unrelated users of the new database
+                        target.execute(update(Election).where(Election.id.in_(election_ids),
+                                                              Election.created_by.notin_(user_ids))
+                                       .values(created_by=None))
+                counts['encoding files'], tenant_moved = copy_encodings(app.config, refs, tenant, args.dry_run)
+                if args.delete_source and not args.dry_run:
+                    # Children first, in case foreign keys are enforced
+                    for model, column, ids in reversed(plan):
+                        delete_rows(conn, model, column, ids)
+                    moved.extend(tenant_moved)
+                summary = ', '.join(f'{n} {name}' for name, n in counts.items())
+                print(f'{tenant}: {"would copy" if args.dry_run else "copied"} {summary}')
+
+            if args.dry_run:
+                trans.rollback()
+            else:
+                trans.commit()
+                # A rolled-back split must still find every encoding where its users' rows are
+                delete_encodings(moved)
+        except BaseException:
+            if trans.is_active:
+                trans.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Deterministic stand-in for the face_recognition library (benchmarks only)
+
+Every synthetic "face" is a 128-d encoding rendered as a 16x8 grid of grey
+blocks; the stand-in encoder reads the blocks back, so the real decode,
+prepare and distance code paths run on real JPEG bytes without dlib.
+Seeded sensor noise makes each capture of a face unique byte for byte, as
+consecutive camera frames are, while averaging out of the encoding.
+"""
+import time
+
+import cv2
+import numpy as np
+
+GRID_W, GRID_H = 16, 8
+BLOCK = 40
+SCALE = 400.0
+
+
+def encoding_for(seed):
+    """Reproducible 128-d encoding for a synthetic person"""
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-0.25, 0.25, GRID_W * GRID_H)
+
+
+def render_face(encoding, quality=90, noise=0.0, seed=None):
+    """JPEG bytes whose block means encode the given encoding, plus `noise` grey levels of Gaussian pixel noise"""
+    grid = np.clip(128 + np.asarray(encoding).reshape(GRID_H, GRID_W) * SCALE, 0, 255).astype(np.uint8)
+    img = cv2.resize(grid, (GRID_W * BLOCK, GRID_H * BLOCK), interpolation=cv2.INTER_NEAREST)
+    if noise:
+        jitter = np.random.default_rng(seed).normal(0.0, noise, img.shape)
+        img = np.clip(img + jitter, 0, 255).astype(np.uint8)
+    img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buf.tobytes()
+
+
+class SyntheticFaceRecognition:
+    """Implements the subset of the face_recognition API the app uses"""
+
+    def __init__(self, encode_seconds=0.0):
+        # Optional busy-wait per encode to mimic dlib's CPU cost
+        self.encode_seconds = encode_seconds
+
+    def face_locations(self, rgb, number_of_times_to_upsample=1, model='hog'):
+        h, w = rgb.shape[:2]
+        if float(rgb.std()) < 1.0:
+            return []
+        return [(0, w, h, 0)]
+
+    def face_encodings(self, rgb, known_face_locations=None, num_jitters=1, model='small'):
+        if self.encode_seconds:
+            deadline = time.perf_counter() + self.encode_seconds * num_jitters
+            while time.perf_counter() < deadline:
+                pass
+        locations = known_face_locations or self.face_locations(rgb)
+        if not locations:
+            return []
+        gray = rgb[:, :, 0].astype(np.float64)
+        small = cv2.resize(gray, (GRID_W, GRID_H), interpolation=cv2.INTER_AREA)
+        return [(small.flatten() - 128) / SCALE]
+
+    def face_distance(self, known, unknown):
+        known = np.asarray(known)
+        if len(known) == 0:
+            return np.empty(0)
+        return np.linalg.norm(known - np.asarray(unknown), axis=1)
+
+    def load_image_file(self, path):
+        return cv2.cvtColor(cv2.imread(path, cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+
+
+def install(encode_seconds=0.0):
+    """Swap the face_recognition module used by the app for the stand-in"""
+    from app.services import face_detectors, face_recognition_service
+    fake = SyntheticFaceRecognition(encode_seconds)
+    for module in (face_detectors, face_recognition_service):
+        module.face_recognition = fake
+        module.FACE_RECOGNITION_AVAILABLE = True
+    return fake
@@ -0,0 +1,65 @@
+"""
+Shared fixtures: an app on a throwaway SQLite database per test
+"""
+import functools
+
+import pytest
+
+from app import create_app, db
+
+
+@pytest.fixture
+def app(tmp_path):
+    from app.services import fragments, frame_cache, lifecycle, results, rollups
+    # Process-wide caches are keyed by election id, which every fresh database reuses
+    for cache in (fragments.fragment_cache, results.rendered_pages, frame_cache.cache, lifecycle.candidate_lists):
+        cache.clear()
+    app = create_app('testing', {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "test.db"}',
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'FACE_ENCODINGS_FOLDER': str(tmp_path / 'face_encodings'),
+    })
+    yield app
+    with app.app_context():
+        rollups.verifications.flush()
+        db.session.remove()
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield app
+
+
+@functools.lru_cache(maxsize=None)
+def password_hash():
+    from app.models.user import User
+    user = User()
+    user.set_password('pw')
+    return user.password_hash
+
+
+def make_user(email, role='student', **fields):
+    """Add and flush a user (password 'pw', hashed once per run: bcrypt is slow on purpose)"""
+    from app.models.user import User
+    user = User(email=email, name=fields.pop('name', email.split('@')[0]), role=role,
+                password_hash=password_hash(), **fields)
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+
+def make_election(title='Election', candidates=(), **fields):
+    """Add an open election with an approved candidacy for each user in `candidates`"""
+    from datetime import datetime, timedelta
+    from app.models.election import Candidate, Election
+    now = datetime.utcnow()
+    fields.setdefault('start_date', now - timedelta(hours=1))
+    fields.setdefault('end_date', now + timedelta(hours=1))
+    election = Election(title=title, **fields)
+    db.session.add(election)
+    db.session.flush()
+    for user in candidates:
+        db.session.add(Candidate(election_id=election.id, user_id=user.id, status='approved', approved_at=now))
+    db.session.flush()
+    return election
@@ -0,0 +1,126 @@
+"""
+Admission control: concurrency limit, FIFO waiting room, reservations and rate limits
+"""
+import pytest
+
+from app.services import admission
+from app.services.admission import AdmissionController, TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def controller(clock):
+    return AdmissionController(capacity=2, reservation_seconds=15, ticket_ttl=30,
+                               user_rate=0, ip_rate=0)
+
+
+def test_admits_up_to_capacity_then_queues(controller):
+    assert controller.enter('a').admitted and controller.enter('b').admitted
+    queued = controller.enter('c')
+    assert (queued.admitted, queued.status, queued.payload['position']) == (False, 202, 1)
+    assert controller.active == 2 and controller.waiting == 1
+
+
+def test_waiting_room_is_first_in_first_out(controller):
+    controller.enter('a'), controller.enter('b')
+    first, second = controller.enter('c').payload['ticket'], controller.enter('d').payload['ticket']
+    assert controller.enter('d', ticket_id=second).payload['position'] == 2
+
+    controller.leave()
+    # The freed slot is reserved for the head of the line, not the first to retry
+    assert not controller.enter('d', ticket_id=second).admitted
+    assert controller.status('c', first)[0]['admitted']
+    assert controller.enter('c', ticket_id=first).admitted
+    assert controller.active == 2
+
+
+def test_one_place_in_line_per_user(controller):
+    controller.enter('a'), controller.enter('b')
+    ticket = controller.enter('c').payload['ticket']
+    assert controller.enter('c').payload['ticket'] == ticket
+    assert controller.waiting == 1
+
+
+def test_unclaimed_reservation_passes_to_the_next_ticket(controller, clock):
+    controller.enter('a'), controller.enter('b')
+    controller.enter('c')
+    late = controller.enter('d').payload['ticket']
+    controller.leave()
+    clock.now += 16  # c never comes back for its slot
+    assert controller.status('d', late)[0]['admitted']
+
+
+def test_abandoned_tickets_expire(controller, clock):
+    controller.enter('a'), controller.enter('b')
+    ticket = controller.enter('c').payload['ticket']
+    clock.now += 31
+    assert controller.status('c', ticket)[1] == 404
+    assert controller.waiting == 0
+
+
+def test_another_users_ticket_is_refused(controller):
+    controller.enter('a'), controller.enter('b')
+    ticket = controller.enter('c').payload['ticket']
+    assert controller.status('mallory', ticket)[1] == 404
+
+
+def test_rate_limits_answer_429_with_retry_after(clock):
+    controller = AdmissionController(capacity=10, user_rate=0.5, user_burst=2, ip_rate=0)
+    assert controller.enter('a').admitted and controller.enter('a').admitted
+    limited = controller.enter('a')
+    assert limited.status == 429 and limited.headers == {'Retry-After': '2'}
+    assert controller.enter('b').admitted  # other users are unaffected
+
+
+def test_token_bucket_refills():
+    bucket = TokenBucket(rate=1.0, burst=1)
+    assert bucket.take('k', now=0.0) == (True, 0.0)
+    assert bucket.take('k', now=0.5) == (False, 0.5)
+    assert bucket.take('k', now=1.6)[0]
+
+
+@pytest.mark.parametrize('argv, environ, workers', [
+    (['gunicorn', '-w', '4', 'run:app'], {}, 4),
+    (['uvicorn', 'app.asgi:application', '--workers=3'], {}, 3),
+    (['gunicorn', 'run:app'], {'GUNICORN_CMD_ARGS': '--workers 5'}, 5),
+    (['run.py'], {'WEB_CONCURRENCY': '2'}, 2),
+    (['run.py'], {}, 1),
+])
+def test_worker_processes(argv, environ, workers):
+    assert admission.worker_processes(argv, environ) == workers
+
+
+def test_several_workers_are_refused_while_enabled():
+    with pytest.raises(RuntimeError):
+        admission.require_single_process({'ADMISSION_ENABLED': True}, ['gunicorn', '-w', '2'], {})
+    admission.require_single_process({'ADMISSION_ENABLED': False}, ['gunicorn', '-w', '2'], {})
+
+
+def test_multi_worker_deployments_are_allowed_by_default(app):
+    assert not app.config['ADMISSION_ENABLED'] and not admission.controller.enabled
+    admission.require_single_process(app.config, ['gunicorn', '-w', '4'], {'WEB_CONCURRENCY': '4'})
+
+
+def test_try_acquire_never_overtakes_the_waiting_room(controller):
+    controller.enter('a'), controller.enter('b')
+    controller.enter('c')  # queued
+    assert not controller.try_acquire()
+    controller.leave()  # the freed slot is reserved for 'c'
+    assert not controller.try_acquire()
+    assert controller.enter('c').admitted
+    controller.leave()
+    assert controller.try_acquire() and controller.active == 2
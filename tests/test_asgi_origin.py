@@ -0,0 +1,57 @@
+"""
+WebSocket /ws/face/verify refuses cross-origin handshakes (cross-site WebSocket hijacking)
+"""
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.asgi import AsyncFaceVoteApp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def asgi(app):
+    app.config['FACE_STREAM_ALLOWED_ORIGINS'] = ('https://vote.college.edu',)
+    return AsyncFaceVoteApp(app)
+
+
+def handshake(asgi, origin=None, host='localhost'):
+    """First message the server sends for a handshake with this Origin (no session cookie)"""
+    headers = [(b'host', host.encode())]
+    if origin is not None:
+        headers.append((b'origin', origin.encode()))
+    scope = {'type': 'websocket', 'path': '/ws/face/verify', 'headers': headers, 'query_string': b''}
+    sent = []
+
+    async def receive():
+        return {'type': 'websocket.connect'}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi(scope, receive, send))
+    return sent[0]
+
+
+@pytest.mark.parametrize('origin', ['https://evil.example', 'http://localhost.evil.example', 'null', None])
+def test_cross_origin_handshake_is_rejected(asgi, origin):
+    assert handshake(asgi, origin) == {'type': 'websocket.close', 'code': 4403}
+
+
+@pytest.mark.parametrize('origin', ['http://localhost', 'https://vote.college.edu'])
+def test_allowed_origin_reaches_authentication(asgi, origin):
+    # Past the Origin check; without a session cookie the handshake is closed as unauthenticated
+    assert handshake(asgi, origin) == {'type': 'websocket.close', 'code': 4401}
+
+
+def test_importing_the_module_builds_no_app(tmp_path):
+    # The app (and its database) is only created when a server asks for `application`
+    database = tmp_path / 'untouched.db'
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{database}', SCHEDULER_ENABLED='0')
+    code = "import app.asgi as m, sys; sys.exit('application' in vars(m))"
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, check=True)
+    assert not database.exists()
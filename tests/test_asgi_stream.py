@@ -0,0 +1,43 @@
+"""
+Streaming verification holds an admission slot only while a frame is encoding
+"""
+import asyncio
+from types import SimpleNamespace
+
+from app.asgi import AsyncFaceVoteApp, _StreamSlot
+from app.services.admission import AdmissionController
+
+
+def test_idle_stream_releases_its_slot(app, monkeypatch):
+    app.config.update(FACE_STREAM_TIMEOUT=0.5, FACE_STREAM_MAX_ENCODES=5)
+    asgi = AsyncFaceVoteApp(app)
+    gate = AdmissionController(capacity=1, user_rate=0, ip_rate=0)
+    assert gate.enter('student').admitted
+    slot = _StreamSlot(gate, held=True)
+    active_while_encoding, active_while_idle = [], []
+
+    async def encode_frame(kind, service, user_id, frame):
+        active_while_encoding.append(gate.active)
+        return None  # no face in the frame
+
+    monkeypatch.setattr(asgi, '_encode_frame', encode_frame)
+    monkeypatch.setattr(asgi, '_service', lambda: None)
+    frames = iter([b'frame-1', b'frame-2'])
+
+    async def receive():
+        frame = next(frames, None)
+        if frame is None:
+            await asyncio.sleep(0.2)  # the client goes quiet
+            active_while_idle.append(gate.active)
+            await asyncio.sleep(10)
+        return {'type': 'websocket.receive', 'bytes': frame}
+
+    async def send(message):
+        pass
+
+    user = SimpleNamespace(id=1, department='CS')
+    with app.app_context():
+        result = asyncio.run(asgi._stream_frames(user, None, receive, send, slot))
+    assert result['type'] == 'failed' and result['frames'] >= 1
+    assert set(active_while_encoding) == {1}
+    assert active_while_idle == [0]
@@ -0,0 +1,30 @@
+"""
+Bulk student import: validation, duplicate detection and threaded hashing
+"""
+import io
+import threading
+
+from app.models.user import User
+from app.services.bulk_import import StudentImporter, read_rows
+
+from conftest import make_user
+
+CSV = b'''Email,Name,Password,Student ID,Department
+new1@x.edu,New One,pw1,S1,CSE
+not-an-email,Bad,pw,S2,CSE
+new1@x.edu,Again,pw,S3,CSE
+taken@x.edu,Taken,pw,S4,ECE
+new2@x.edu,New Two,pw2,,ECE
+'''
+
+
+def test_import_reports_rejected_rows_and_hashes_in_process(app_context):
+    make_user('taken@x.edu')
+    threads_before = threading.active_count()
+    report = StudentImporter(batch_size=2, workers=2).run(read_rows(io.BytesIO(CSV), 'intake.csv'))
+    assert (report.total, report.created) == (5, 2)
+    assert [n for n, _ in report.errors] == [3, 4, 5]
+    student = User.query.filter_by(email='new1@x.edu').one()
+    assert student.check_password('pw1') and student.role == 'student' and student.student_id == 'S1'
+    assert User.query.filter_by(email='new2@x.edu').one().student_id is None
+    assert threading.active_count() == threads_before  # the hashing pool is shut down with the run
@@ -0,0 +1,77 @@
+"""
+Encoding storage backends, versioned references and the per-process cache
+"""
+import pickle
+
+import numpy as np
+import pytest
+
+from app import db
+from app.services import encoding_storage
+from app.services.encoding_storage import parse_ref, repository_from_config
+
+
+@pytest.fixture(params=['local', 'db', 'object'])
+def repository(request, app_context, tmp_path):
+    app_context.config['FACE_STORAGE_BACKEND'] = request.param
+    app_context.config['FACE_STORAGE_OBJECT_ROOT'] = str(tmp_path / 'objects')
+    return repository_from_config(app_context.config)
+
+
+def encoding(seed):
+    return np.random.default_rng(seed).uniform(-0.3, 0.3, 128)
+
+
+def test_round_trip(repository):
+    ref = repository.save(7, encoding(1))
+    db.session.commit()
+    backend, key, version = parse_ref(ref)
+    assert (backend, key) == (repository.store.name, 'user_7') and version
+    np.testing.assert_array_equal(repository.load(ref), encoding(1))
+    np.testing.assert_array_equal(repository.load(7), encoding(1))
+
+
+def test_reregistration_changes_the_reference(repository):
+    first = repository.save(7, encoding(1))
+    second = repository.save(7, encoding(2))
+    db.session.commit()
+    assert first != second
+    np.testing.assert_array_equal(repository.load(second), encoding(2))
+
+
+def test_cached_copy_is_not_served_after_another_node_rewrites(repository):
+    repository.save(7, encoding(1))  # cached in this process
+    data = encoding_storage.pack_encoding(encoding(2))
+    repository.store.put('user_7', data)  # as another node would
+    db.session.commit()
+    ref = encoding_storage.make_ref(repository.store.name, 'user_7', encoding_storage.content_version(data))
+    np.testing.assert_array_equal(repository.load(ref), encoding(2))
+
+
+def test_delete(repository):
+    ref = repository.save(7, encoding(1))
+    db.session.commit()
+    repository.delete(7)
+    db.session.commit()
+    assert repository.load(ref) is None
+
+
+def test_tenants_have_separate_namespaces(app_context):
+    default = repository_from_config(app_context.config, 'default')
+    north = repository_from_config(app_context.config, 'north')
+    ref = default.save(7, encoding(1))
+    north_ref = north.save(7, encoding(2))
+    assert parse_ref(ref)[1] == parse_ref(north_ref)[1] == 'user_7'
+    np.testing.assert_array_equal(default.load(ref), encoding(1))
+    np.testing.assert_array_equal(north.load(north_ref), encoding(2))
+
+
+def test_legacy_pickle_paths_still_load(app_context, tmp_path):
+    path = tmp_path / 'user_7.pkl'
+    path.write_bytes(pickle.dumps(encoding(3).tolist()))
+    assert parse_ref(str(path)) is None
+    np.testing.assert_array_equal(repository_from_config(app_context.config).load(str(path)), encoding(3))
+
+
+def test_unknown_backend_in_reference(app_context):
+    assert repository_from_config(app_context.config).load('tape:user_7@abc') is None
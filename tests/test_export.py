@@ -0,0 +1,66 @@
+"""
+Vote exports keep ballots secret: nothing in them ties a row to a voter
+"""
+import csv
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models.election import Vote
+from app.services import export
+
+from conftest import make_election, make_user
+
+T0 = datetime(2024, 3, 1, 9, 0)
+
+
+def export_votes(election, fmt='csv'):
+    chunks = export.iter_vote_chunks(election.id, chunk_size=2, ranked=election.is_ranked)
+    return ''.join(export.stream(fmt, export.vote_columns(election.is_ranked), chunks))
+
+
+def cast_all(election, voters, choices):
+    """voters[i] votes for choices[i] (a list of candidate ids, first preference first), one minute apart"""
+    Vote.query.filter_by(election_id=election.id).delete()
+    for i, (voter, prefs) in enumerate(zip(voters, choices)):
+        db.session.add(Vote(election_id=election.id, candidate_id=prefs[0], user_id=voter.id,
+                            voted_at=T0 + timedelta(minutes=i),
+                            rankings=Vote.pack_rankings(prefs) if election.is_ranked else None))
+    db.session.commit()
+
+
+@pytest.fixture
+def voters(app_context):
+    return [make_user(f'voter{i}@x') for i in range(4)]
+
+
+@pytest.mark.parametrize('ballot_type', ['plurality', 'irv'])
+def test_export_does_not_depend_on_who_chose_what(voters, ballot_type):
+    election = make_election(candidates=[make_user('ann@x'), make_user('ben@x')], ballot_type=ballot_type)
+    a, b = [c.id for c in election.candidates.order_by('id')]
+    cast_all(election, voters, [[a, b], [b, a], [a, b], [b]])
+    first = export_votes(election)
+    # Same choices, swapped between voters and cast in a different order
+    cast_all(election, list(reversed(voters)), [[b, a], [a, b], [b], [a, b]])
+    assert export_votes(election) == first
+
+
+def test_vote_rows_hold_no_ids_or_times(voters):
+    election = make_election(candidates=[make_user('ann@x'), make_user('ben@x')])
+    a, b = [c.id for c in election.candidates.order_by('id')]
+    cast_all(election, voters, [[b], [a], [b], [a]])
+    rows = list(csv.DictReader(io.StringIO(export_votes(election))))
+    assert set(rows[0]) == {'election_id', 'candidate_id', 'candidate_name'}
+    assert [int(r['candidate_id']) for r in rows] == [a, a, b, b]
+    for vote in Vote.query:
+        assert vote.voted_at.isoformat() not in export_votes(election, 'ndjson')
+
+
+def test_roll_lists_voters_without_ballots(voters):
+    election = make_election(candidates=[make_user('ann@x')])
+    cast_all(election, voters[:2], [[election.candidates.first().id]] * 2)
+    roll = [row for chunk in export.iter_roll_chunks(election.id) for row in chunk]
+    assert export.ROLL_COLUMNS == ['student_id', 'name', 'department']
+    assert [name for _, name, _ in roll] == ['voter0', 'voter1']
@@ -0,0 +1,36 @@
+"""
+The shared LRU and the caches built on it
+"""
+from app.services.encoding_storage import EncodingCache
+from app.services.frame_cache import FrameCache
+from app.services.lru import LRUCache
+
+
+def test_evicts_least_recently_used():
+    evicted = []
+    cache = LRUCache(2, on_evict=lambda key, value: evicted.append(key))
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1  # 'b' is now the oldest
+    cache.set('c', 3)
+    assert evicted == ['b']
+    assert cache.get('b') is None and len(cache) == 2
+
+
+def test_encoding_cache_rejects_other_versions():
+    cache = EncodingCache(max_entries=1)
+    cache.set('local', 'k', 'v1', 'enc')
+    assert cache.get('local', 'k', 'v1') == 'enc'
+    assert cache.get('local', 'k', 'v2') is None
+    cache.max_entries = 0
+    cache.set('local', 'other', 'v1', 'enc')
+    assert len(cache) == 0
+
+
+def test_frame_cache_eviction_drops_perceptual_index():
+    cache = FrameCache(max_entries=1, perceptual=True)
+    cache.put('u1', b'd1', 'first', 0.1, phash=0b1010)
+    cache.put('u1', b'd2', 'second', 0.1, phash=0b0101)
+    assert cache.get('u1', b'd1') is None
+    assert cache.get_similar('u1', 0b1010) is None
+    assert cache.get_similar('u1', 0b0101).outcome == 'second'
@@ -0,0 +1,97 @@
+"""
+Turnout rollups: vote counters kept in the vote transaction, buffered verification counters, backfill
+"""
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.models.election import Vote
+from app.models.rollup import VoteRollup
+from app.services import rollups
+from app.services.face_pipeline import save_vote
+
+from conftest import make_election, make_user
+
+T0 = datetime(2024, 3, 1, 9, 0)
+
+
+def cast(election, voter, at):
+    candidate = election.candidates.first()
+    db.session.add(Vote(election_id=election.id, candidate_id=candidate.id, user_id=voter.id, voted_at=at))
+    rollups.record_vote(election.id, voter.department, at)
+    db.session.commit()
+
+
+@pytest.fixture
+def election(app_context):
+    election = make_election(candidates=[make_user('cand@x', department='CSE')])
+    db.session.commit()  # counters flush on their own connection
+    return election
+
+
+def test_votes_are_bucketed_and_totalled(election):
+    voters = [make_user(f'v{i}@x', department=d) for i, d in enumerate(['CSE', 'CSE', 'ECE', None])]
+    for voter, minute in zip(voters, (0, 4, 6, 7)):
+        cast(election, voter, T0.replace(minute=minute))
+    assert rollups.vote_totals([election.id]) == {election.id: 4}
+    assert rollups.votes_over_time(election.id) == [(T0, 2), (T0.replace(minute=5), 2)]
+
+
+def test_turnout_by_department(election):
+    cse = [make_user(f'c{i}@x', department='CSE') for i in range(3)]
+    make_user('e0@x', department='ECE')
+    cast(election, cse[0], T0)
+    rows = {r['department']: r for r in rollups.turnout_by_department(election.id)}
+    assert rows['CSE']['votes'] == 1 and rows['CSE']['eligible'] == 4  # the candidate is a student too
+    assert rows['ECE'] == {'department': 'ECE', 'votes': 0, 'eligible': 1, 'turnout': 0.0}
+
+
+def test_save_vote_updates_the_rollup_in_the_same_transaction(election):
+    voter = make_user('v@x', department='CSE')
+    save_vote(voter, {'election_id': election.id, 'candidate_id': election.candidates.first().id, 'rankings': None})
+    db.session.rollback()  # nothing pending: vote and counter were committed together
+    assert Vote.query.count() == 1
+    assert rollups.vote_totals([election.id]) == {election.id: 1}
+
+
+def test_backfill_rebuilds_the_incremental_counts(election):
+    for i, minute in enumerate((1, 2, 11)):
+        cast(election, make_user(f'v{i}@x', department='ECE'), T0.replace(minute=minute))
+    incremental = sorted((r.bucket_start, r.department, r.votes) for r in VoteRollup.query)
+    VoteRollup.query.delete()
+    db.session.commit()
+    assert rollups.backfill() == 2
+    assert sorted((r.bucket_start, r.department, r.votes) for r in VoteRollup.query) == incremental
+
+
+def test_verification_counters_are_scoped_to_their_election(election):
+    other = make_election('Other')
+    db.session.commit()
+    counters = rollups.VerificationCounters()
+    counters.record('cast_vote', 'verified', 'CSE', election.id)
+    counters.record('cast_vote', 'mismatch', 'CSE', election.id)
+    counters.record('verify_face', 'no_face', 'CSE', other.id)
+    counters.record('verify_face', 'verified', 'CSE')
+    assert counters.pending == 3
+    counters.flush()
+    assert counters.pending == 0
+    [(_, attempts, failures, no_face)] = rollups.verification_over_time(election.id)
+    assert (attempts, failures, no_face) == (2, 1, 0)
+    [(_, attempts, failures, no_face)] = rollups.verification_over_time(other.id)
+    assert (attempts, failures, no_face) == (1, 0, 1)
+
+
+def test_failed_flush_keeps_the_counts(election, monkeypatch):
+    counters = rollups.VerificationCounters()
+    counters.record('cast_vote', 'verified', 'CSE', election.id)
+
+    def broken(*args, **kwargs):
+        raise RuntimeError('database unavailable')
+
+    monkeypatch.setattr(rollups, 'upsert_increment', broken)
+    counters.flush()
+    assert counters.pending == 1
+    monkeypatch.undo()
+    counters.flush()
+    assert rollups.verification_over_time(election.id)[0][1] == 1
@@ -0,0 +1,22 @@
+"""
+Per-request stage timings in the Server-Timing header
+"""
+from app.services import metrics
+
+
+def test_stages_are_summed_per_name():
+    stages = [('verify', 'detect', 0.010), ('verify', 'encode', 0.0205), ('verify', 'detect', 0.005)]
+    assert metrics.server_timing(stages) == 'detect;dur=15.00, encode;dur=20.50'
+
+
+def test_header_is_opt_in(app):
+    @app.route('/_staged')
+    def staged():
+        with metrics.operation('verify'), metrics.stage('detect'):
+            pass
+        return 'ok'
+
+    client = app.test_client()
+    assert 'Server-Timing' not in client.get('/_staged').headers
+    app.config['METRICS_SERVER_TIMING'] = True
+    assert client.get('/_staged').headers['Server-Timing'].startswith('detect;dur=')
@@ -0,0 +1,67 @@
+"""
+Plurality, instant-runoff and STV counts over ballot matrices and stored votes
+"""
+from app import db
+from app.models.election import Vote
+from app.services.tabulation import load_ballots, tabulate, tabulate_election
+
+from conftest import make_election, make_user
+
+A, B, C = 0, 1, 2
+
+
+def ballots(*groups):
+    """Matrix rows from (count, preferences) groups, padded with -1"""
+    width = max(len(prefs) for _, prefs in groups)
+    return [list(prefs) + [-1] * (width - len(prefs)) for count, prefs in groups for _ in range(count)]
+
+
+def test_plurality_counts_first_preferences():
+    result = tabulate(ballots((3, [B]), (2, [A]), (1, [C])), 3, method='plurality')
+    assert result.elected == [B]
+    assert result.rounds[0]['tally'] == [(B, 3.0), (A, 2.0), (C, 1.0)]
+
+
+def test_irv_transfers_eliminated_ballots():
+    # A leads on first preferences, but C's voters prefer B, who then has a majority
+    result = tabulate(ballots((4, [A, B]), (3, [B, A]), (2, [C, B])), 3, method='irv')
+    assert result.elected == [B]
+    assert [r['eliminated'] for r in result.rounds] == [[C], []]
+    assert result.rounds[1]['tally'] == [(B, 5.0), (A, 4.0)]
+
+
+def test_irv_exhausted_ballots_leave_the_majority():
+    result = tabulate(ballots((4, [A]), (3, [B]), (2, [C])), 3, method='irv')
+    assert result.elected == [A]
+    assert result.rounds[-1]['exhausted'] == 2.0
+
+
+def test_stv_transfers_surplus_at_reduced_weight():
+    result = tabulate(ballots((6, [A, B]), (2, [B]), (2, [C])), 3, seats=2, method='stv')
+    assert result.quota == 4  # Droop: floor(10 / 3) + 1
+    assert result.elected == [A, B]
+    # A's 2-vote surplus moves to B as six ballots at weight 1/3
+    assert result.rounds[1]['tally'][0] == (B, 4.0)
+
+
+def test_empty_count():
+    result = tabulate([], 3, method='irv')
+    assert result.elected == [] and result.rounds == []
+
+
+def test_stored_ranked_votes_ignore_unapproved_candidates(app_context):
+    alice, bob = (make_user(f'{n}@x') for n in ('alice', 'bob'))
+    election = make_election(candidates=[alice, bob], ballot_type='irv')
+    first, second = [c.id for c in election.candidates.order_by('id')]
+    voters = [make_user(f'v{i}@x') for i in range(3)]
+    unknown = first + second + 100
+    for voter, prefs in zip(voters, ([second, first], [unknown, first], [first])):
+        db.session.add(Vote(election_id=election.id, candidate_id=prefs[0] if prefs[0] != unknown else first,
+                            user_id=voter.id, rankings=Vote.pack_rankings(prefs)))
+    db.session.commit()
+
+    candidate_ids, matrix = load_ballots(election)
+    assert candidate_ids == [first, second]
+    assert matrix.tolist() == [[1, 0], [-1, 0], [0, -1]]
+    result = tabulate_election(election)
+    assert [e['name'] for e in result['elected']] == ['alice']